@@ -0,0 +1,62 @@
+"""
+Benchmark of parsing a large generated Makefile and looking up its rules.
+
+Usage: python benchmarks/bench_makefile.py [RULE_COUNT]
+"""
+
+import random
+import sys
+import timeit
+
+from grading_lib.makefile import Makefile
+
+
+def generate_makefile(rule_count: int, seed: int = 0) -> str:
+    rng = random.Random(seed)
+    lines = [
+        "# A generated Makefile.",
+        "CC = gcc",
+        "CFLAGS := -Wall -O2",
+        ".PHONY: all clean",
+        "",
+    ]
+    for idx in range(rule_count):
+        prereqs = " ".join(f"file{rng.randrange(rule_count)}.c" for _ in range(3))
+        lines.append(f"obj{idx}.o: {prereqs}")
+        lines.append("\t@echo building $@")
+        lines.append("\t$(CC) $(CFLAGS) -c $< -o $@")
+        lines.append("")
+    lines.append("all: " + " ".join(f"obj{idx}.o" for idx in range(rule_count)))
+    lines.append("")
+    lines.append("clean:")
+    lines.append("\trm -f *.o")
+    return "\n".join(lines) + "\n"
+
+
+def main() -> None:
+    rule_count = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    text = generate_makefile(rule_count)
+
+    repeat = 5
+    parse_time = min(
+        timeit.repeat(lambda: Makefile.from_text(text), number=1, repeat=repeat)
+    )
+    makefile = Makefile.from_text(text)
+    targets = [f"obj{idx}.o" for idx in range(0, rule_count, 7)]
+    lookup_time = min(
+        timeit.repeat(
+            lambda: [makefile.has_rule(target) for target in targets],
+            number=1,
+            repeat=repeat,
+        )
+    )
+
+    print(f"rules: {len(makefile.rules)}, lines: {text.count(chr(10))}")
+    print(f"parse: {parse_time * 1000:.1f} ms")
+    print(
+        f"lookup: {lookup_time / len(targets) * 1e6:.2f} us per has_rule ({len(targets)} lookups)"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,6 @@
+import importlib
 import os
+import typing as ty
 
 with open(os.path.join(os.path.dirname(__file__), "VERSION")) as version_file:
     version = version_file.read().strip()
@@ -16,13 +18,42 @@ __all__ = [
     "run_targets",
 ]
 
-from .common import (
-    COMMAND_FAILED_TEXT_TEMPLATE,
-    BaseTestCase,
-    CommandResult,
-    MinimalistTestResult,
-    get_seed_from_env,
-    is_debug_mode,
-    run_executable,
-)
-from .makefile import Makefile, run_targets
+# The public names are imported on first access, so the CLI does not pay for
+# the modules (and their dependencies) that a command does not use.
+_NAME_TO_MODULE = {
+    "COMMAND_FAILED_TEXT_TEMPLATE": "common",
+    "BaseTestCase": "common",
+    "CommandResult": "common",
+    "MinimalistTestResult": "common",
+    "get_seed_from_env": "common",
+    "is_debug_mode": "common",
+    "run_executable": "common",
+    "Makefile": "makefile",
+    "run_targets": "makefile",
+}
+
+if ty.TYPE_CHECKING:
+    from .common import (
+        COMMAND_FAILED_TEXT_TEMPLATE,
+        BaseTestCase,
+        CommandResult,
+        MinimalistTestResult,
+        get_seed_from_env,
+        is_debug_mode,
+        run_executable,
+    )
+    from .makefile import Makefile, run_targets
+
+
+def __getattr__(name: str) -> ty.Any:
+    if name in _NAME_TO_MODULE:
+        module = importlib.import_module(f".{_NAME_TO_MODULE[name]}", __name__)
+        value = getattr(module, name)
+        # Cache it, so __getattr__ is not called again for this name.
+        globals()[name] = value
+        return value
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def __dir__() -> list[str]:
+    return sorted([*globals().keys(), *__all__])
@@ -0,0 +1,73 @@
+"""
+The helper process of `grading_lib.executor.ForkServerExecutor`.
+
+Run it with `python -m grading_lib._forkserver`. It reads pickled requests
+`(request_id, kind, args, kwargs)` from its stdin and writes pickled responses
+`(request_id, value, exception)` to its stdout. `kind` is either `"run"`
+(`run_executable`) or `"reap"` (`reap_process_groups`). Requests are handled
+concurrently, so the responses may come in a different order.
+
+The helper only imports the common module, so forking it to start a command is
+much cheaper than forking a grading process that has loaded GitPython and the
+grading scripts.
+"""
+
+import os
+import pickle
+import threading
+import typing as ty
+
+from .common import reap_process_groups, run_executable
+
+HANDLERS: dict[str, ty.Callable[..., ty.Any]] = {
+    "run": run_executable,
+    "reap": reap_process_groups,
+}
+
+
+def main() -> None:
+    # Keep the pipes for the protocol only, so a command cannot read the requests
+    # or write into the responses.
+    rfile = os.fdopen(os.dup(0), "rb")
+    wfile = os.fdopen(os.dup(1), "wb")
+    devnull = os.open(os.devnull, os.O_RDONLY)
+    os.dup2(devnull, 0)
+    os.close(devnull)
+    os.dup2(2, 1)
+
+    write_lock = threading.Lock()
+
+    def handle(
+        request_id: int, kind: str, args: tuple[ty.Any, ...], kwargs: dict[str, ty.Any]
+    ) -> None:
+        value, exc = None, None
+        try:
+            value = HANDLERS[kind](*args, **kwargs)
+        except Exception as e:
+            exc = e
+
+        try:
+            data = pickle.dumps((request_id, value, exc))
+        except Exception as e:
+            data = pickle.dumps(
+                (request_id, None, RuntimeError(f"Cannot send the response: {e!r}"))
+            )
+        with write_lock:
+            try:
+                wfile.write(data)
+                wfile.flush()
+            except OSError:
+                # The grading process is gone.
+                pass
+
+    while True:
+        try:
+            request = pickle.load(rfile)
+        except EOFError:
+            # No more requests. The running ones are finished before exiting.
+            break
+        threading.Thread(target=handle, args=request).start()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+"""
+On-disk cache of the grading results.
+
+A result of a problem is stored under a key computed from the content of every
+file in the problem folder (which includes `scripts/grade.py`) and the version of
+grading_lib. When the key is found, the stored result is replayed instead of
+running the grading script again.
+
+The content outside of the problem folder is not part of the key, so the cache
+must not be used with problems whose grading script inspects files outside of
+its own folder.
+
+The cache also keeps a `TreeSnapshot` of each problem folder with the key it was
+computed for. While no file changes its size, mtime, mode, inode or ctime, the
+key is re-used without reading the files again. The ctime cannot be set back by
+a program, so a file written with its mtime restored afterwards is noticed.
+"""
+
+import hashlib
+import json
+import os
+import stat
+import time
+import typing as ty
+from pathlib import Path
+
+from . import __version__
+from .common import _update_hash_with_files, _write_json_atomically
+from .filesystem import TreeSnapshot
+from .grading import ProblemResult
+
+IGNORED_NAMES = frozenset(
+    ["__pycache__", ".pytest_cache", ".mypy_cache", ".ruff_cache", ".git"]
+)
+# A file modified less than this many seconds before a snapshot may be modified
+# again without changing its mtime or ctime, so the snapshot is not stored.
+SNAPSHOT_MIN_AGE = 2.0
+
+
+def _walk_files(problem_path: Path) -> ty.Iterator[Path]:
+    for dir_path, dir_names, file_names in os.walk(problem_path):
+        # Sorting in-place makes os.walk visit the sub folders in a stable order.
+        dir_names[:] = sorted(name for name in dir_names if name not in IGNORED_NAMES)
+        for name in sorted(file_names):
+            yield Path(dir_path) / name
+
+
+def fingerprint_problem(problem_path: Path | str) -> str:
+    """Return a SHA256 hex digest of the relative path and content of every file in the problem folder."""
+    if isinstance(problem_path, str):
+        problem_path = Path(problem_path)
+
+    m = hashlib.sha256()
+    m.update(f"grading_lib {__version__}\0".encode())
+    _update_hash_with_files(m, problem_path, _walk_files(problem_path))
+    return m.hexdigest()
+
+
+class ResultCache:
+    """
+    A folder of stored `ProblemResult`, one JSON file per key.
+
+    :param path: The folder to store the results in. It is created when needed.
+    """
+
+    def __init__(self, path: Path | str) -> None:
+        if isinstance(path, str):
+            path = Path(path)
+        self.path = path
+
+    def _snapshot_path(self, problem_path: Path) -> Path:
+        name = hashlib.sha256(str(problem_path.resolve()).encode()).hexdigest()[:32]
+        return self.path / "snapshots" / f"{name}.json"
+
+    def get_key(self, problem_path: Path | str) -> str:
+        """
+        Return the key of the problem, like `fingerprint_problem`, but re-use the
+        key stored with the snapshot of the problem folder when the folder has not
+        changed since then.
+        """
+        if isinstance(problem_path, str):
+            problem_path = Path(problem_path)
+
+        captured_at = time.time_ns()
+        snapshot = TreeSnapshot.capture(problem_path, ignored_names=IGNORED_NAMES)
+        snapshot_path = self._snapshot_path(problem_path)
+        try:
+            with open(snapshot_path) as f:
+                data = json.load(f)
+            if data["version"] == __version__ and snapshot == TreeSnapshot.from_dict(
+                problem_path, data["entries"]
+            ):
+                return str(data["key"])
+        except (FileNotFoundError, json.JSONDecodeError, KeyError, TypeError):
+            pass
+
+        key = fingerprint_problem(problem_path)
+
+        # The key covers the targets of the symbolic links, but the snapshot does not.
+        newest_change = max(
+            (
+                max(state.mtime_ns, state.ctime_ns)
+                for state in snapshot.entries.values()
+            ),
+            default=0,
+        )
+        if captured_at - newest_change >= int(SNAPSHOT_MIN_AGE * 10**9) and not any(
+            stat.S_ISLNK(state.mode) for state in snapshot.entries.values()
+        ):
+            data = {"version": __version__, "key": key, "entries": snapshot.to_dict()}
+            _write_json_atomically(snapshot_path, data)
+        return key
+
+    def _entry_path(self, problem_name: str, key: str) -> Path:
+        return self.path / f"{problem_name.replace('/', '_')}-{key}.json"
+
+    def get(self, problem_name: str, key: str) -> ProblemResult | None:
+        """Return the stored result of the problem, or `None` if there is none."""
+        try:
+            with open(self._entry_path(problem_name, key)) as f:
+                data = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+        return ProblemResult(
+            name=data["name"],
+            points=data["points"],
+            total_points=data["total_points"],
+            point_breakdowns={
+                name: (val[0], val[1]) for name, val in data["point_breakdowns"].items()
+            },
+            output=data["output"],
+        )
+
+    def put(self, key: str, result: ProblemResult) -> None:
+        """Store the result of the problem."""
+        # The timings are not stored since a replayed result does not take any time.
+        data = result._asdict()
+        del data["timings"]
+        _write_json_atomically(self._entry_path(result.name, key), data)
@@ -1,15 +1,10 @@
-import copy
-import importlib
 import os
 import sys
-import unittest
 from pathlib import Path
 
 import click
 
 from .. import __version__
-from ..common import MinimalistTestResult, MinimalistTestRunner
-from ..util import FindProblemList, get_problem_total_points, load_problems_metadata
 from .dev import dev
 from .internal import internal
 
@@ -71,6 +66,8 @@ def summary_command() -> None:
     """
     Summarize the problem set.
     """
+    from ..util import get_problem_total_points, load_problems_metadata
+
     problems = load_problems_metadata()
 
     problem_points: list[float] = []
@@ -121,69 +118,214 @@ def rebase_todo_injector_command(todo_items_file_path: str | Path, path: str) ->
 
 @cli.command(name="grade")
 @click.argument("path", default=".", type=click.Path(exists=True))
-def grade_command(path: str | Path) -> None:
+@click.option(
+    "--jobs",
+    "-j",
+    type=click.IntRange(min=1),
+    default=1,
+    help="Number of worker processes. Each problem is graded in its own worker.",
+)
+@click.option(
+    "--cache-dir",
+    type=click.Path(file_okay=False),
+    default=None,
+    help="If specified, re-use the stored result of a problem whose files did not change since it was last graded.",
+)
+@click.option(
+    "--slowest",
+    type=click.IntRange(min=0),
+    default=0,
+    help="Show the N slowest tests after the summary.",
+)
+@click.option(
+    "--timings-file",
+    type=click.Path(dir_okay=False),
+    default=None,
+    help="If specified, write the wall time and CPU time of every test to this JSON file.",
+)
+@click.option(
+    "--socket",
+    "socket_path",
+    type=click.Path(dir_okay=False),
+    default=None,
+    help="If specified, send the job to the grading daemon listening on this socket (see the 'serve' command).",
+)
+def grade_command(
+    path: str | Path,
+    jobs: int = 1,
+    cache_dir: str | Path | None = None,
+    slowest: int = 0,
+    timings_file: str | Path | None = None,
+    socket_path: str | Path | None = None,
+) -> None:
     """Grade problems at path"""
-    # Steps:
-    # 1. Using mistletoe, parse the README.md in the path for the problem order.
-    #    By extracting the list after the inline code token with `:problem-list:` on a heading token.
-    # 2. Prepare the tests to execute in that order. Remove or skip the test where the students did not change the content of the target file.
-    if isinstance(path, str):
-        path = Path(path)
-    problem_names = FindProblemList.from_file(path / "README.md")
-
-    if len(problem_names) == 0:
-        print("No problem found.")
-
-    current_directory = os.getcwd()
-    current_sys_path = copy.copy(sys.path)
-    test_programs = []
-    for idx, problem_name in enumerate(problem_names, start=1):
-        print(f"{idx} - Grading {problem_name} ", flush=True)
+    if socket_path is not None:
+        if jobs != 1:
+            raise click.UsageError(
+                "--jobs cannot be used with --socket, the daemon grades with its own workers (see 'serve --workers')."
+            )
+        from ..daemon import send_grade_job
+
+        exit_code = send_grade_job(
+            socket_path,
+            path,
+            cache_dir=cache_dir,
+            slowest=slowest,
+            timings_file=timings_file,
+        )
+        if exit_code != 0:
+            sys.exit(exit_code)
+        return
+
+    # Imported here to keep the start up time of other commands low.
+    from ..cache import ResultCache
+    from ..grading import grade_homework
+
+    cache = ResultCache(cache_dir) if cache_dir is not None else None
+    exit_code = grade_homework(
+        path,
+        jobs=jobs,
+        cache=cache,
+        slowest=slowest,
+        timings_file=timings_file,
+    )
+    if exit_code != 0:
+        sys.exit(exit_code)
 
-        try:
-            os.chdir(problem_name)
 
-            # Prepare sys.path for module import.
-            sys.path.append(os.getcwd())
-            importlib.invalidate_caches()
-            mod = importlib.import_module("scripts.grade")
+@cli.command(name="grade-batch")
+@click.argument(
+    "roster_dir", type=click.Path(exists=True, dir_okay=True, file_okay=False)
+)
+@click.option(
+    "--output",
+    "-o",
+    type=click.Path(dir_okay=False),
+    default="report.json",
+    show_default=True,
+    help="Report file. Use a .csv suffix for a CSV report, otherwise JSON is written.",
+)
+@click.option(
+    "--jobs",
+    "-j",
+    type=click.IntRange(min=1),
+    default=None,
+    help="Number of worker processes. Default to the number of CPUs.",
+)
+@click.option(
+    "--log-dir",
+    type=click.Path(file_okay=False),
+    default=None,
+    help="If specified, save the grading output of each submission in this folder.",
+)
+@click.option(
+    "--cache-dir",
+    type=click.Path(file_okay=False),
+    default=None,
+    help="If specified, re-use the stored result of a problem whose files did not change since it was last graded.",
+)
+def grade_batch_command(
+    roster_dir: str | Path,
+    output: str | Path = "report.json",
+    jobs: int | None = None,
+    log_dir: str | Path | None = None,
+    cache_dir: str | Path | None = None,
+) -> None:
+    """
+    Grade every submission folder in ROSTER_DIR.
+
+    A submission folder is a folder with a README.md that lists the problems.
+    """
+    from ..cache import ResultCache
+    from ..grading import (
+        find_submissions,
+        grade_submissions,
+        write_csv_report,
+        write_json_report,
+    )
 
-            runner = MinimalistTestRunner(
-                stream=sys.stdout, resultclass=MinimalistTestResult
+    if isinstance(roster_dir, str):
+        roster_dir = Path(roster_dir)
+    if isinstance(output, str):
+        output = Path(output)
+    if isinstance(log_dir, str):
+        log_dir = Path(log_dir)
+    if jobs is None:
+        jobs = os.cpu_count() or 1
+
+    paths = find_submissions(roster_dir)
+    print(f"Found {len(paths)} submission(s).", flush=True)
+    if log_dir is not None:
+        log_dir.mkdir(parents=True, exist_ok=True)
+
+    cache = ResultCache(cache_dir) if cache_dir is not None else None
+    results = []
+    try:
+        for idx, result in enumerate(
+            grade_submissions(paths, jobs=jobs, cache=cache), start=1
+        ):
+            results.append(result)
+            if result.error is None:
+                status = f"{result.points:>5} / {result.total_points:>5}"
+            else:
+                status = f"error: {result.error}"
+            print(f"{idx:>4} - {result.name:<40}{status}", flush=True)
+
+            if log_dir is not None:
+                with open(log_dir / f"{result.name}.log", "w") as f:
+                    f.write(result.output)
+    finally:
+        # Even when the batch is interrupted, the submissions graded so far are kept.
+        if output.suffix == ".csv":
+            write_csv_report(results, output)
+        else:
+            write_json_report(results, output)
+        if len(results) == len(paths):
+            print(f"Report is written to '{output}'.")
+        else:
+            print(
+                f"Report of {len(results)} of {len(paths)} submission(s) is written to '{output}'."
             )
-            test_program = unittest.main(
-                mod, testRunner=runner, argv=[sys.argv[0]], exit=False
-            )
-            test_programs.append((problem_name, test_program))
-        finally:
-            os.chdir(current_directory)
-            # Without copy, sys.path will be a ref to current_sys_path.
-            sys.path = copy.copy(current_sys_path)
-            if "scripts.grade" in sys.modules.keys():
-                # This will be re-used by Python since we have the same module name in
-                # every problem.
-                del sys.modules["scripts.grade"]
-
-        print("\n\n", flush=True)
-
-    # Summary.
-    print("==== Summary ====")
-    total_points = sum(
-        [test_program.result.total_points for _, test_program in test_programs]
-    )
-    student_total_points = 0.0
-    for idx, item in enumerate(test_programs, start=1):
-        problem_name, test_program = item
+
+
+@cli.command(name="serve")
+@click.option(
+    "--socket",
+    "socket_path",
+    type=click.Path(dir_okay=False),
+    default=None,
+    help="Path of the Unix domain socket. Default to '.grading-lib.sock'.",
+)
+@click.option(
+    "--workers",
+    "-j",
+    type=click.IntRange(min=1),
+    default=None,
+    help="Number of worker processes. Default to the number of CPUs.",
+)
+def serve_command(
+    socket_path: str | Path | None = None, workers: int | None = None
+) -> None:
+    """
+    Start a grading daemon that keeps a pool of warm worker processes.
+
+    Use 'grade --socket' to send a job to the daemon.
+    """
+    from .. import daemon
+
+    if not hasattr(daemon, "GradingServer"):
+        raise click.ClickException("The grading daemon requires Unix domain sockets.")
+    if socket_path is None:
+        socket_path = daemon.DEFAULT_SOCKET_PATH
+
+    with daemon.GradingServer(socket_path, workers=workers) as server:
         print(
-            f"{idx:>3} - {problem_name:<30}{test_program.result.points:>5} / {test_program.result.total_points:>5}"
+            f"Listening on '{socket_path}' with {server.workers} worker(s).", flush=True
         )
-        for key, val in test_program.result.point_breakdowns.items():
-            print(f"      - {key:<50}{val[0]:>5} / {val[1]:>5}")
-        student_total_points += test_program.result.points
-    print(f"Total: {student_total_points:>5} / {total_points:>5}")
-
-    if student_total_points < total_points:
-        sys.exit(1)
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
 
 
 cli.add_command(dev)
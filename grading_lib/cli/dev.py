@@ -4,8 +4,6 @@ from pathlib import Path
 
 import click
 
-from ..util import load_problems_metadata
-
 
 @click.group()
 def dev() -> None:
@@ -21,6 +19,8 @@ def run_mypy_command() -> None:
     If mypy is run on the template's root. It will complain saying that
     there are multiple grade.py module.
     """
+    from ..util import load_problems_metadata
+
     problems = load_problems_metadata()
     for metadata in problems:
         target_dir = Path(".") / metadata["problem"]["name"] / "scripts"
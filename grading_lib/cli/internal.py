@@ -2,7 +2,6 @@ import json
 from pathlib import Path
 
 import click
-import tomli
 
 
 @click.group()
@@ -30,6 +29,8 @@ def collect_autograding_tests_command(
 
     This is meant to be used by the GitHub Action's workflow.
     """
+    import tomli
+
     if isinstance(src_dir, str):
         src_dir = Path(src_dir)
 
@@ -1,19 +1,56 @@
+import atexit
+import collections
+import contextlib
 import datetime
+import errno
+import functools
 import hashlib
+import io
+import json
+import multiprocessing
 import os
+import queue
+import select
+import shutil
+import signal
 import subprocess
 import sys
 import tempfile
+import threading
 import time
 import typing as ty
 import unittest
 from collections import namedtuple
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
 from pathlib import Path
 
+if sys.platform != "win32":
+    import fcntl
+    import resource
+
+if ty.TYPE_CHECKING:
+    from .filesystem import ExpectedEntry
+
 T = ty.TypeVar("T")
 
 COMMAND_FAILED_TEXT_TEMPLATE = "An error occurred while trying to run a command '{command}'. The command's output is\n\n{output}"
 FILE_NOT_EXIST_TEXT_TEMPLATE = "File '{path}' does not exist"
+TREE_MISMATCH_TEXT_TEMPLATE = (
+    "The content of '{root}' is not as expected:\n\n{differences}"
+)
+CHECKSUMS_MISMATCH_TEXT_TEMPLATE = (
+    "These files do not have the expected content:\n\n{mismatches}"
+)
+COMMAND_TIMED_OUT_TEXT_TEMPLATE = "Command timed out after {timeout} seconds."
+OUTPUT_TRUNCATED_TEXT_TEMPLATE = "\n\n... {count} bytes of output are omitted ...\n\n"
+# Enough for any sensible output, but a program stuck in a printing loop cannot
+# use up the memory of the grading host.
+DEFAULT_MAX_OUTPUT_BYTES = 16 * 1024 * 1024
+# Seconds between SIGTERM and SIGKILL when a process group is killed.
+DEFAULT_KILL_GRACE_PERIOD = 1.0
+# Environment variable with the folder to create the temporary directories of the
+# tests in, e.g. /dev/shm. Default to the current working directory.
+TEMP_ROOT_ENV_NAME = "GRADING_LIB_TEMP_ROOT"
 DEFAULT_FILENAME_POOL = ["main.cpp", "file.txt"]
 FILE_SUFFIX_POOL = [".cpp", ".txt", ".md", ".zip", ".py", ".toml", ".yml", ".yaml"]
 NAME_POOL = ["herta", "cat", "dog", "dolphin", "falcon", "dandilion", "fox", "jett"]
@@ -29,17 +66,169 @@ def points(value: float) -> ty.Callable[[T], T]:
     return decorator
 
 
+# Size of the chunks that a file is hashed in, so a large file is not read into
+# memory at once. hashlib releases the GIL while it hashes a chunk this large.
+CHECKSUM_CHUNK_SIZE = 1024 * 1024
+# A file modified less than this many seconds ago may be modified again without
+# changing its mtime (the resolution of some file systems is coarse), so its
+# checksum is not cached.
+CHECKSUM_CACHE_MIN_AGE = 2.0
+CHECKSUM_CACHE_MAX_ENTRIES = 4096
+
+
+class _ChecksumCache:
+    """
+    Checksums of files by (device, inode, size, mtime_ns, ctime_ns, algorithm).
+
+    ctime cannot be set by a user, so a file whose mtime is set back (e.g. with
+    `touch -d`) is hashed again.
+    """
+
+    def __init__(self, max_entries: int = CHECKSUM_CACHE_MAX_ENTRIES) -> None:
+        self.max_entries = max_entries
+        self._entries: collections.OrderedDict[tuple[ty.Any, ...], str] = (
+            collections.OrderedDict()
+        )
+        self._lock = threading.Lock()
+
+    def get_checksum(self, path: Path, algorithm: str) -> str:
+        with open(path, "rb") as f:
+            st = os.fstat(f.fileno())
+            key = (
+                st.st_dev,
+                st.st_ino,
+                st.st_size,
+                st.st_mtime_ns,
+                st.st_ctime_ns,
+                algorithm,
+            )
+            with self._lock:
+                if key in self._entries:
+                    self._entries.move_to_end(key)
+                    return self._entries[key]
+
+            m = hashlib.new(algorithm)
+            buffer = bytearray(min(CHECKSUM_CHUNK_SIZE, max(st.st_size, 1)))
+            view = memoryview(buffer)
+            while count := f.readinto(buffer):
+                m.update(view[:count])
+            checksum = m.hexdigest()
+
+        if time.time_ns() - max(st.st_mtime_ns, st.st_ctime_ns) >= int(
+            CHECKSUM_CACHE_MIN_AGE * 10**9
+        ):
+            with self._lock:
+                self._entries[key] = checksum
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+        return checksum
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+_checksum_cache = _ChecksumCache()
+
+
+def get_file_checksum(path: Path | str, algorithm: str = "sha512") -> str:
+    """
+    Return the hex digest of the file's content with a `hashlib` algorithm.
+
+    The file is read in chunks. The checksum is cached in the process until the
+    file changes.
+    """
+    if isinstance(path, str):
+        path = Path(path)
+    return _checksum_cache.get_checksum(path, algorithm)
+
+
+def clear_checksum_cache() -> None:
+    _checksum_cache.clear()
+
+
 def file_has_correct_sha512_checksum(expected_checksum: str, file_path: Path) -> bool:
     """Return True if the file has the same SHA512 checksum."""
+    return get_file_checksum(file_path, "sha512") == expected_checksum
 
-    with open(file_path, "rb") as f:
-        data = f.read()
-        m = hashlib.sha512()
-        m.update(data)
-        checksum = m.hexdigest()
-        return checksum == expected_checksum
 
-    return False
+def _update_hash_with_files(
+    m: "hashlib._Hash", root: Path, paths: ty.Iterable[Path]
+) -> None:
+    """Feed the path relative to `root` and the content of each file to `m`, in order."""
+    for path in paths:
+        m.update(path.relative_to(root).as_posix().encode())
+        m.update(b"\0")
+        with open(path, "rb") as f:
+            while chunk := f.read(1 << 16):
+                m.update(chunk)
+        m.update(b"\0")
+
+
+class ChecksumMismatch(ty.NamedTuple):
+    """
+    A file without the expected checksum. `actual` is `None` when the file does
+    not exist or cannot be read. `error` is why it cannot be read.
+    """
+
+    path: Path
+    expected: str
+    actual: str | None
+    error: str | None = None
+
+    def describe(self, algorithm: str = "sha512") -> str:
+        if self.error is not None:
+            return f"'{self.path}' cannot be read ({self.error})"
+        if self.actual is None:
+            return f"'{self.path}' does not exist"
+        return f"'{self.path}' has {algorithm} checksum {self.actual}, expected {self.expected}"
+
+
+def verify_checksums(
+    checksums: ty.Mapping[str, str] | ty.Mapping[Path, str],
+    algorithm: str = "sha512",
+    root: Path | str | None = None,
+    jobs: int | None = None,
+) -> list[ChecksumMismatch]:
+    """
+    Check many files at once on a thread pool and return the mismatched ones in
+    the order of `checksums`.
+
+    :param checksums: Expected hex digests by path.
+    :param root: If specified, relative paths are relative to it.
+    :param jobs: Number of threads. Default to the number of CPUs.
+    """
+    if isinstance(root, str):
+        root = Path(root)
+
+    paths = [Path(path) for path in checksums]
+    if root is not None:
+        paths = [root / path for path in paths]
+
+    def get_checksum(path: Path) -> tuple[str | None, str | None]:
+        try:
+            return get_file_checksum(path, algorithm), None
+        except (FileNotFoundError, NotADirectoryError):
+            return None, None
+        except OSError as e:
+            # E.g. a folder or a file without the read permission.
+            return None, f"{type(e).__name__}: {e.strerror}"
+
+    if jobs == 1 or len(paths) < 2:
+        actual_checksums = [get_checksum(path) for path in paths]
+    else:
+        with ThreadPoolExecutor(
+            max_workers=min(jobs or os.cpu_count() or 1, len(paths))
+        ) as executor:
+            actual_checksums = list(executor.map(get_checksum, paths))
+
+    return [
+        ChecksumMismatch(path, expected.lower(), actual, error)
+        for path, expected, (actual, error) in zip(
+            paths, checksums.values(), actual_checksums, strict=True
+        )
+        if actual != expected.lower()
+    ]
 
 
 def is_debug_mode(
@@ -83,6 +272,82 @@ def has_file_changed(last_known_mtime: datetime.datetime, path: Path | str) -> b
     return new_mtime > last_known_mtime
 
 
+class MtimeController:
+    """
+    Set synthetic modification times, so incremental builds can be tested without
+    sleeping until the clock of the file system moves forward.
+
+    The synthetic clock starts an hour in the past by default, so any file written
+    by a command afterward (e.g. a target that make rebuilds) is newer than every
+    file with a synthetic time. A typical use is
+
+        run_targets(["all"], cwd=root)
+        controller = MtimeController(root)
+        controller.settle()             # Every file is up to date.
+        controller.touch("main.c")      # main.c is newer than the rest.
+        before = controller.snapshot()
+        run_targets(["all"], cwd=root)
+        after = controller.snapshot()
+        get_changed_files(before, after)  # e.g. ["main.o", "prog"]
+
+    :param root: Relative paths are relative to this folder.
+    :param start: The first synthetic time, in seconds since the epoch.
+    :param step: How far the synthetic clock moves on each `touch`, in seconds.
+    """
+
+    def __init__(
+        self, root: Path | str, start: float | None = None, step: float = 1.0
+    ) -> None:
+        if isinstance(root, str):
+            root = Path(root)
+        if start is None:
+            start = time.time() - 3600.0
+        self.root = root
+        self.now_ns = int(start * 1e9)
+        self.step_ns = int(step * 1e9)
+
+    def _resolve(self, path: Path | str) -> Path:
+        if isinstance(path, str):
+            path = Path(path)
+        return path if path.is_absolute() else self.root / path
+
+    def _iter_files(self) -> ty.Iterator[Path]:
+        for dir_path, _, file_names in os.walk(self.root):
+            for name in file_names:
+                yield Path(dir_path) / name
+
+    def settle(self, paths: ty.Iterable[Path | str] | None = None) -> None:
+        """
+        Set the files (every file under `root` by default) to the current synthetic
+        time, so make sees them as up to date with each other.
+        """
+        files = self._iter_files() if paths is None else map(self._resolve, paths)
+        for path in files:
+            os.utime(path, ns=(self.now_ns, self.now_ns))
+
+    def touch(self, *paths: Path | str) -> None:
+        """
+        Move the synthetic clock forward and set the files to it, so they are newer
+        than every file set before. A file that does not exist is created.
+        """
+        self.now_ns += self.step_ns
+        for path in map(self._resolve, paths):
+            path.touch()
+            os.utime(path, ns=(self.now_ns, self.now_ns))
+
+    def snapshot(self) -> dict[str, int]:
+        """Return the mtime (in nanoseconds) of every file under `root` by its relative path."""
+        return {
+            path.relative_to(self.root).as_posix(): path.stat().st_mtime_ns
+            for path in self._iter_files()
+        }
+
+
+def get_changed_files(before: dict[str, int], after: dict[str, int]) -> list[str]:
+    """Return the files of the `after` snapshot that are new or have a different mtime."""
+    return sorted(name for name, mtime in after.items() if before.get(name) != mtime)
+
+
 def populate_folder_with_filenames(path: Path | str, filnames: list[str]) -> None:
     if isinstance(path, str):
         path = Path(path)
@@ -96,11 +361,592 @@ def populate_folder_with_filenames(path: Path | str, filnames: list[str]) -> Non
             f.write("")
 
 
-CommandResult = namedtuple("CommandResult", ["success", "command", "output"])
+# ioctl request of Linux that makes a file share the blocks of another (a reflink).
+_FICLONE = 0x40049409
+# errno values of a file system that cannot do a reflink or copy_file_range.
+_UNSUPPORTED_COPY_ERRNOS = frozenset(
+    getattr(errno, name)
+    for name in ("EXDEV", "EOPNOTSUPP", "ENOTSUP", "EINVAL", "ENOTTY", "ENOSYS")
+    if hasattr(errno, name)
+)
+
+
+def _write_json_atomically(path: Path, data: ty.Any) -> None:
+    """Write `data` as JSON to `path`, creating its folder if needed."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    # Write to a temporary file first, so other processes sharing the same folder
+    # never read a partially written file.
+    fd, temp_path = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w") as f:
+            json.dump(data, f)
+        os.replace(temp_path, path)
+    except BaseException:
+        with contextlib.suppress(FileNotFoundError):
+            os.unlink(temp_path)
+        raise
+
+
+class _FileCopier:
+    """
+    Copy files with the fastest method that works: a reflink, then
+    `os.copy_file_range`, then a plain copy. A method that fails once because the
+    file system does not support it is not tried again.
+    """
+
+    def __init__(self) -> None:
+        self.use_reflink = sys.platform == "linux"
+        self.use_copy_file_range = hasattr(os, "copy_file_range")
+
+    def copy(self, src: Path, dst: Path) -> None:
+        with open(src, "rb") as src_f, open(dst, "wb") as dst_f:
+            if self.use_reflink:
+                try:
+                    fcntl.ioctl(dst_f.fileno(), _FICLONE, src_f.fileno())
+                    return
+                except OSError as e:
+                    if e.errno not in _UNSUPPORTED_COPY_ERRNOS:
+                        raise
+                    self.use_reflink = False
+
+            if self.use_copy_file_range:
+                size = os.fstat(src_f.fileno()).st_size
+                try:
+                    copied = 0
+                    while copied < size:
+                        count = os.copy_file_range(
+                            src_f.fileno(), dst_f.fileno(), size - copied
+                        )
+                        if count == 0:
+                            break
+                        copied += count
+                    return
+                except OSError as e:
+                    if e.errno not in _UNSUPPORTED_COPY_ERRNOS:
+                        raise
+                    self.use_copy_file_range = False
+                    dst_f.seek(0)
+                    dst_f.truncate()
+                    src_f.seek(0)
+
+            shutil.copyfileobj(src_f, dst_f, 1 << 20)
+
+
+def clone_tree(src: Path | str, dst: Path | str, hardlink: bool = False) -> None:
+    """
+    Copy the content of the folder `src` into the folder `dst`, keeping the modes,
+    the mtimes and the symbolic links.
+
+    Files are cloned with a reflink when the file system supports it (the copy
+    shares the blocks until one of them is written), otherwise with
+    `os.copy_file_range`, otherwise with a plain copy. With `hardlink`, files are
+    hard links to the ones in `src` instead, which is the fastest, but writing to
+    one writes to both, so only use it for files that the tests do not modify.
+    """
+    if isinstance(src, str):
+        src = Path(src)
+    if isinstance(dst, str):
+        dst = Path(dst)
+
+    copier = _FileCopier()
+    for dir_path, dir_names, file_names in os.walk(src):
+        relative_dir = Path(dir_path).relative_to(src)
+        dst_dir = dst / relative_dir
+        dst_dir.mkdir(parents=True, exist_ok=True)
+
+        # os.walk lists symbolic links to folders as folders, but does not follow them.
+        for name in [*dir_names, *file_names]:
+            src_path = Path(dir_path) / name
+            dst_path = dst_dir / name
+            if src_path.is_symlink():
+                os.symlink(os.readlink(src_path), dst_path)
+            elif name in file_names:
+                if hardlink:
+                    os.link(src_path, dst_path)
+                else:
+                    copier.copy(src_path, dst_path)
+                    shutil.copystat(src_path, dst_path)
+
+    # The folders last, adding their content changed their mtime.
+    for dir_path, _, _ in os.walk(src):
+        relative_dir = Path(dir_path).relative_to(src)
+        shutil.copystat(dir_path, dst / relative_dir)
+
+
+# Fixture templates copied to a temporary root, by (template, root), with the
+# process that copied them. A forked worker inherits the entries of its parent, and
+# its atexit handlers.
+_fixture_templates: dict[tuple[Path, Path], tuple[Path, int]] = {}
+_fixture_templates_lock = threading.Lock()
+_fixture_templates_atexit_registered = False
+
+
+def remove_fixture_templates() -> None:
+    """
+    Remove the copies of `BaseTestCase.fixture_template` made by this process.
+    `MinimalistTestRunner` calls it after the tests, and it is called when the
+    process exits.
+    """
+    with _fixture_templates_lock:
+        for path, pid in _fixture_templates.values():
+            if pid == os.getpid():
+                _remove_tree(path)
+        _fixture_templates.clear()
+
+
+def _materialize_fixture_template(template: Path, root: Path) -> Path:
+    """
+    Return a copy of the template folder in `root`, made on the first call, so it
+    is on the same file system as the temporary directories it is cloned into.
+    """
+    # Absolute, so the copy can be removed after the working directory changes.
+    root = root.resolve()
+    key = (template.resolve(), root)
+    global _fixture_templates_atexit_registered
+    with _fixture_templates_lock:
+        if key not in _fixture_templates or _fixture_templates[key][1] != os.getpid():
+            # For the tests that are not run by MinimalistTestRunner, e.g. with
+            # unittest.main() or pytest.
+            if not _fixture_templates_atexit_registered:
+                atexit.register(remove_fixture_templates)
+                _fixture_templates_atexit_registered = True
+            path = Path(tempfile.mkdtemp(prefix="grading-lib-template-", dir=root))
+            clone_tree(template, path)
+            _fixture_templates[key] = (path, os.getpid())
+        return _fixture_templates[key][0]
+
+
+def _remove_tree(path: Path | str) -> None:
+    """
+    Remove a folder like `shutil.rmtree`, but also the read-only folders (e.g. the
+    objects of a Git repository) and ignore the files that cannot be removed.
+    """
+
+    def on_error(func: ty.Callable[..., ty.Any], failed_path: str, _: ty.Any) -> None:
+        if os.path.exists(failed_path) or os.path.islink(failed_path):
+            try:
+                os.chmod(os.path.dirname(failed_path), 0o700)
+                if os.path.isdir(failed_path) and not os.path.islink(failed_path):
+                    os.chmod(failed_path, 0o700)
+                    _remove_tree(failed_path)
+                else:
+                    os.unlink(failed_path)
+            except OSError:
+                pass
+
+    if sys.version_info >= (3, 12):
+        shutil.rmtree(path, onexc=on_error)
+    else:
+        shutil.rmtree(path, onerror=on_error)
+
+
+class _DeferredCleaner:
+    """
+    Remove folders on a background thread.
+
+    A folder is first renamed to a tombstone next to it, so its name can be re-used
+    right away and a half-removed folder is easy to recognize.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._pid: int | None = None
+        self._queue: queue.Queue[Path] = queue.Queue()
+
+    def _worker(self, paths: "queue.Queue[Path]") -> None:
+        while True:
+            path = paths.get()
+            try:
+                _remove_tree(path)
+            finally:
+                paths.task_done()
+
+    def remove(self, path: Path) -> None:
+        # The thread removes it later, maybe after the working directory changed.
+        path = Path(os.path.abspath(path))
+        tombstone = path.with_name(f".{path.name}.deleted")
+        try:
+            path.rename(tombstone)
+        except OSError:
+            _remove_tree(path)
+            return
+
+        with self._lock:
+            # A forked process has the queue but not the thread.
+            if self._pid != os.getpid():
+                if self._pid is None:
+                    atexit.register(self.drain)
+                self._pid = os.getpid()
+                self._queue = queue.Queue()
+                threading.Thread(
+                    target=self._worker,
+                    args=(self._queue,),
+                    name="grading-lib-cleanup",
+                    daemon=True,
+                ).start()
+            self._queue.put(tombstone)
+
+    def drain(self) -> None:
+        with self._lock:
+            if self._pid != os.getpid():
+                return
+            paths = self._queue
+        paths.join()
+
+
+_deferred_cleaner = _DeferredCleaner()
+
+
+def drain_deferred_cleanup() -> None:
+    """
+    Wait until the temporary directories of the tests with `deferred_cleanup` are
+    removed. `MinimalistTestRunner` calls it after the tests, and it is called when
+    the process exits.
+    """
+    _deferred_cleaner.drain()
+
+
+class CommandUsage(ty.NamedTuple):
+    """
+    Resources used by a command.
+
+    The CPU times are in seconds and `max_rss` is in bytes. They are `None` when the
+    platform does not report them (i.e. Windows). `exit_signal` is the number of the
+    signal that terminated the command, if any.
+    """
+
+    wall_time: float
+    user_time: float | None
+    system_time: float | None
+    max_rss: int | None
+    exit_signal: int | None
+
+
+class CommandResult(namedtuple("CommandResult", ["success", "command", "output"])):
+    """
+    A (success, command, output) tuple.
+
+    :ivar usage: Resources used by the command when it is run by `run_executable`,
+    `None` otherwise. It is not part of the tuple.
+    """
+
+    usage: CommandUsage | None = None
+
+
+class ResourceLimits(ty.NamedTuple):
+    """
+    Limits applied with `resource.setrlimit` in the child process (POSIX only).
+
+    A limit that is `None` is left as is. A limit higher than the current hard
+    limit is lowered to the hard limit.
+
+    :ivar cpu_time: CPU time in seconds (RLIMIT_CPU). The command receives SIGXCPU
+    when it is reached.
+    :ivar address_space: Size of the virtual memory in bytes (RLIMIT_AS).
+    :ivar file_size: Size of a file the command can write in bytes (RLIMIT_FSIZE).
+    The command receives SIGXFSZ when it is exceeded.
+    :ivar open_files: Number of open file descriptors (RLIMIT_NOFILE).
+    """
+
+    cpu_time: int | None = None
+    address_space: int | None = None
+    file_size: int | None = None
+    open_files: int | None = None
+
+
+def _apply_resource_limits(limits: ResourceLimits) -> None:
+    """Apply the limits to the current process. Called in the child before exec."""
+    if sys.platform == "win32":
+        return
+
+    for name, value in (
+        ("RLIMIT_CPU", limits.cpu_time),
+        ("RLIMIT_AS", limits.address_space),
+        ("RLIMIT_FSIZE", limits.file_size),
+        ("RLIMIT_NOFILE", limits.open_files),
+    ):
+        if value is None:
+            continue
+        kind = getattr(resource, name)
+        _, hard = resource.getrlimit(kind)
+        if hard != resource.RLIM_INFINITY:
+            value = min(value, hard)
+        resource.setrlimit(
+            kind, (value, hard if kind == resource.RLIMIT_CPU else value)
+        )
+
+
+class _OutputCapture:
+    """
+    Keep the head and the tail of a stream, up to `max_bytes` bytes in total.
+
+    When `spill_file` is given, the whole stream is also written to it.
+    """
+
+    def __init__(
+        self, max_bytes: int | None = None, spill_file: ty.BinaryIO | None = None
+    ) -> None:
+        self.max_bytes = max_bytes
+        self.spill_file = spill_file
+        self.total_bytes = 0
+        self.closed = False
+        self.lock = threading.Lock()
+
+        self.head = bytearray()
+        self.tail: collections.deque[bytes] = collections.deque()
+        self.tail_bytes = 0
+
+    def feed(self, data: bytes) -> None:
+        with self.lock:
+            if self.closed:
+                return
+            self._feed(data)
+
+    def _feed(self, data: bytes) -> None:
+        self.total_bytes += len(data)
+        if self.spill_file is not None:
+            self.spill_file.write(data)
+
+        if self.max_bytes is None:
+            self.head.extend(data)
+            return
+
+        head_room = (self.max_bytes - self.max_bytes // 2) - len(self.head)
+        if head_room > 0:
+            self.head.extend(data[:head_room])
+            data = data[head_room:]
+
+        if len(data) != 0:
+            self.tail.append(data)
+            self.tail_bytes += len(data)
+            # Only drop whole chunks here, the first chunk is sliced in getvalue().
+            # The last chunk is always kept, even when the limit is 0 (max_bytes < 2).
+            tail_limit = self.max_bytes // 2
+            while (
+                len(self.tail) > 1 and self.tail_bytes - len(self.tail[0]) >= tail_limit
+            ):
+                self.tail_bytes -= len(self.tail.popleft())
+
+    def close(self) -> None:
+        """Ignore the data fed from now on and close the spill file."""
+        with self.lock:
+            self.closed = True
+            if self.spill_file is not None:
+                self.spill_file.close()
+
+    def getvalue(self) -> str:
+        with self.lock:
+            head = bytes(self.head)
+            tail = b"".join(self.tail)
+            total_bytes = self.total_bytes
+
+        if self.max_bytes is not None:
+            tail = tail[len(tail) - self.max_bytes // 2 :]
+
+        omitted_bytes = total_bytes - len(head) - len(tail)
+        if omitted_bytes == 0:
+            return (head + tail).decode(errors="replace")
+        return (
+            head.decode(errors="replace")
+            + OUTPUT_TRUNCATED_TEXT_TEMPLATE.format(count=omitted_bytes)
+            + tail.decode(errors="replace")
+        )
+
+
+def _pump_output(stream: ty.BinaryIO, capture: _OutputCapture) -> None:
+    """Read the stream until EOF into the capture, then close the stream."""
+    with stream:
+        fd = stream.fileno()
+        while data := os.read(fd, 1 << 16):
+            capture.feed(data)
+
+
+class LeakedProcess(ty.NamedTuple):
+    """A process that was still running after the command that started it had finished."""
+
+    pid: int
+    name: str
+    process_group: int
+
+
+# Process groups of the finished commands that still have running processes.
+_process_groups: set[int] = set()
+_process_groups_lock = threading.Lock()
+
+
+def _list_process_group(process_group: int) -> list[LeakedProcess] | None:
+    """
+    Return the processes in the process group, excluding zombies.
+
+    Return `None` when the processes cannot be listed (i.e. there is no /proc).
+    """
+    if not os.path.isdir("/proc/self"):
+        return None
+
+    processes = []
+    for entry in os.scandir("/proc"):
+        if not entry.name.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry.name}/stat") as f:
+                stat = f.read()
+        except OSError:
+            # The process has just exited.
+            continue
+        # The name is between the first '(' and the last ')' and can contain both.
+        name = stat[stat.find("(") + 1 : stat.rfind(")")]
+        state, _, pgrp = stat[stat.rfind(")") + 2 :].split(" ", 3)[:3]
+        if int(pgrp) == process_group and state != "Z":
+            processes.append(LeakedProcess(int(entry.name), name, process_group))
+    return processes
+
+
+def _is_process_group_alive(process_group: int) -> bool:
+    if sys.platform == "win32":
+        return False
+    try:
+        os.killpg(process_group, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+
+    # Zombies are also members of the group until they are reaped.
+    processes = _list_process_group(process_group)
+    return processes is None or len(processes) != 0
+
+
+def _kill_process_group(
+    process_group: int, grace_period: float = DEFAULT_KILL_GRACE_PERIOD
+) -> None:
+    """Send SIGTERM to the process group, then SIGKILL to whatever is left after the grace period."""
+    if sys.platform == "win32":
+        return
+
+    try:
+        os.killpg(process_group, signal.SIGTERM)
+    except ProcessLookupError:
+        return
+
+    deadline = time.monotonic() + grace_period
+    delay = 0.001
+    while _is_process_group_alive(process_group):
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            try:
+                os.killpg(process_group, signal.SIGKILL)
+            except ProcessLookupError:
+                pass
+            return
+        time.sleep(min(delay, remaining))
+        delay = min(delay * 2, 0.05)
+
+
+def reap_process_groups(
+    grace_period: float = DEFAULT_KILL_GRACE_PERIOD,
+) -> list[LeakedProcess]:
+    """
+    Kill the processes that were left running by the commands of `run_executable`.
+
+    Return the processes that were found, e.g. a server started in the background
+    by a student's script. On systems without /proc, only the process group id is
+    known, so `pid` and `name` are the process group id and an empty string.
+    """
+    with _process_groups_lock:
+        process_groups = sorted(_process_groups)
+        _process_groups.clear()
+
+    leaked_processes: list[LeakedProcess] = []
+    for process_group in process_groups:
+        processes = _list_process_group(process_group)
+        if processes is None:
+            processes = [LeakedProcess(process_group, "", process_group)]
+        if len(processes) != 0:
+            leaked_processes.extend(processes)
+            _kill_process_group(process_group, grace_period)
+    return leaked_processes
+
+
+def _wait_for_process(
+    proc: subprocess.Popen[bytes], timeout: float | None = None
+) -> ty.Any:
+    """
+    Wait for the process like `Popen.wait` and return its `resource.struct_rusage`.
+
+    Return `None` when the platform cannot report the usage of a single child.
+    """
+    if sys.platform == "win32":
+        proc.wait(timeout=timeout)
+        return None
+
+    deadline = None if timeout is None else time.monotonic() + timeout
+    if timeout is not None and hasattr(os, "pidfd_open"):
+        # A pidfd becomes readable when the process exits, so the wait can block
+        # with a timeout instead of polling.
+        try:
+            pidfd = os.pidfd_open(proc.pid)
+        except OSError:
+            # The kernel is too old (before 5.3) or the process is already reaped.
+            pass
+        else:
+            try:
+                ready, _, _ = select.select([pidfd], [], [], timeout)
+            finally:
+                os.close(pidfd)
+            if len(ready) == 0:
+                raise subprocess.TimeoutExpired(proc.args, timeout)
+            deadline = None
+
+    # Otherwise, the same polling as Popen.wait with a timeout.
+    delay = 0.0005
+    while True:
+        try:
+            pid, status, rusage = os.wait4(
+                proc.pid, 0 if deadline is None else os.WNOHANG
+            )
+        except ChildProcessError:
+            # Someone else has reaped it.
+            proc.wait()
+            return None
+        if pid == proc.pid:
+            proc.returncode = os.waitstatus_to_exitcode(status)
+            return rusage
+
+        assert deadline is not None and timeout is not None
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise subprocess.TimeoutExpired(proc.args, timeout)
+        time.sleep(min(delay, remaining))
+        delay = min(delay * 2, 0.05)
+
+
+def _get_command_usage(
+    proc: subprocess.Popen[bytes], wall_time: float, rusage: ty.Any
+) -> CommandUsage:
+    exit_signal = (
+        -proc.returncode
+        if proc.returncode is not None and proc.returncode < 0
+        else None
+    )
+    if rusage is None:
+        return CommandUsage(wall_time, None, None, None, exit_signal)
+
+    # ru_maxrss is in kilobytes, except on macOS where it is in bytes.
+    max_rss = rusage.ru_maxrss if sys.platform == "darwin" else rusage.ru_maxrss * 1024
+    return CommandUsage(
+        wall_time, rusage.ru_utime, rusage.ru_stime, max_rss, exit_signal
+    )
 
 
 def run_executable(
-    args: list[str], cwd: str | Path | None = None, timeout: float = 15.0
+    args: list[str],
+    cwd: str | Path | None = None,
+    timeout: float = 15.0,
+    max_output_bytes: int | None = DEFAULT_MAX_OUTPUT_BYTES,
+    spill_path: str | Path | None = None,
+    kill_grace_period: float = DEFAULT_KILL_GRACE_PERIOD,
+    limits: ResourceLimits | None = None,
+    env: dict[str, str] | None = None,
 ) -> CommandResult:
     """
     Run a command at the cwd.
@@ -109,18 +955,172 @@ def run_executable(
     - (True, command, output) when the command completes without any error.
     - (False, command, output) when the command completes with error.
 
-    It will redirect stderr to stdout and capture stdout as output.
+    It will redirect stderr to stdout and capture stdout as output. When the command
+    times out, the output so far is kept after the time out message.
+
+    :param max_output_bytes: When the output is longer than this, only its head and
+    its tail are kept with a marker telling how many bytes are omitted in between.
+    Use `None` to keep everything.
+    :param spill_path: If specified, the whole output is also written to this file.
+    :param kill_grace_period: The command runs in its own process group (on POSIX).
+    When it times out, the whole group receives SIGTERM and then SIGKILL after this
+    many seconds. Processes of the group that outlive a finished command are killed
+    by `reap_process_groups`, which `BaseTestCase.tearDown` calls.
+    :param limits: If specified, the limits are applied to the command (POSIX only).
+    :param env: If specified, the environment variables of the command. Otherwise
+    it inherits the ones of this process.
+
+    The wall time, CPU time, maximum resident set size and exit signal of the command
+    are reported in `CommandResult.usage`.
     """
+    command = " ".join(args)
+    start_time = time.monotonic()
+    deadline = start_time + timeout
+
+    spill_file = open(spill_path, "wb") if spill_path is not None else None
+    capture = _OutputCapture(max_output_bytes, spill_file)
     try:
-        make_cmd_output = subprocess.check_output(
-            args, stderr=subprocess.STDOUT, cwd=cwd, timeout=timeout
+        proc = subprocess.Popen(
+            args,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            cwd=cwd,
+            env=env,
+            start_new_session=sys.platform != "win32",
+            preexec_fn=functools.partial(_apply_resource_limits, limits)
+            if limits is not None and sys.platform != "win32"
+            else None,
         )
-        return CommandResult(True, " ".join(args), make_cmd_output.decode())
-    except subprocess.CalledProcessError as e:
-        return CommandResult(False, " ".join(args), e.output.decode())
+    except BaseException:
+        capture.close()
+        raise
+
+    assert proc.stdout is not None
+    # The output is read by a thread, so it is consumed while we wait for the
+    # process with a timeout. The thread owns (and closes) the pipe.
+    reader = threading.Thread(
+        target=_pump_output, args=(proc.stdout, capture), daemon=True
+    )
+    reader.start()
+
+    timed_out = False
+    rusage = None
+    try:
+        # The end of the output arrives when the command exits, unless a process
+        # it started still holds the pipe open.
+        reader.join(timeout=max(deadline - time.monotonic(), 0.0))
+        rusage = _wait_for_process(proc, max(deadline - time.monotonic(), 0.0))
+        timed_out = reader.is_alive()
     except subprocess.TimeoutExpired:
-        return CommandResult(
-            False, " ".join(args), f"Command timed out after {timeout} seconds."
+        timed_out = True
+    except BaseException:
+        # E.g. a KeyboardInterrupt. The command is in its own session, so the
+        # Ctrl-C of the terminal does not reach it.
+        if sys.platform == "win32":
+            proc.kill()
+        else:
+            _kill_process_group(proc.pid, kill_grace_period)
+        proc.wait()
+        raise
+
+    if timed_out:
+        if sys.platform == "win32":
+            proc.kill()
+        else:
+            # The process group id is the pid of the session leader.
+            _kill_process_group(proc.pid, kill_grace_period)
+        if proc.returncode is None:
+            rusage = _wait_for_process(proc)
+        reader.join(timeout=1.0)
+    elif _is_process_group_alive(proc.pid):
+        with _process_groups_lock:
+            _process_groups.add(proc.pid)
+    capture.close()
+
+    usage = _get_command_usage(proc, time.monotonic() - start_time, rusage)
+
+    output = capture.getvalue()
+    if timed_out:
+        text = COMMAND_TIMED_OUT_TEXT_TEMPLATE.format(timeout=timeout)
+        if len(output) != 0:
+            text += f"\n\nThe command's output before the timeout is\n\n{output}"
+        result = CommandResult(False, command, text)
+    else:
+        result = CommandResult(proc.returncode == 0, command, output)
+    result.usage = usage
+    return result
+
+
+async def async_run_executable(
+    args: list[str],
+    cwd: str | Path | None = None,
+    timeout: float = 15.0,
+    **kwargs: ty.Any,
+) -> CommandResult:
+    """
+    Coroutine version of `run_executable`.
+
+    The command is waited for on a thread of the event loop's default executor,
+    so the result (including the timeout handling) is the same as `run_executable`.
+    Other keyword arguments are passed to `run_executable`.
+    """
+    import asyncio
+
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        None,
+        functools.partial(run_executable, args, cwd=cwd, timeout=timeout, **kwargs),
+    )
+
+
+async def async_run_many(
+    commands: list[list[str]],
+    concurrency: int = 4,
+    cwd: str | Path | None = None,
+    timeout: float = 15.0,
+    **kwargs: ty.Any,
+) -> list[CommandResult]:
+    """
+    Coroutine version of `run_many`.
+    """
+    import asyncio
+
+    loop = asyncio.get_running_loop()
+    # A dedicated executor, so the concurrency is not capped by the size of the
+    # default executor.
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        futures = [
+            loop.run_in_executor(
+                executor,
+                functools.partial(
+                    run_executable, args, cwd=cwd, timeout=timeout, **kwargs
+                ),
+            )
+            for args in commands
+        ]
+        return list(await asyncio.gather(*futures))
+
+
+def run_many(
+    commands: list[list[str]],
+    concurrency: int = 4,
+    cwd: str | Path | None = None,
+    timeout: float = 15.0,
+    **kwargs: ty.Any,
+) -> list[CommandResult]:
+    """
+    Run independent commands at the cwd with at most `concurrency` of them at a time.
+
+    Return the `CommandResult` of each command in the same order as `commands`.
+    The `timeout` applies to each command. Other keyword arguments are passed to
+    `run_executable`.
+    """
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        return list(
+            executor.map(
+                functools.partial(run_executable, cwd=cwd, timeout=timeout, **kwargs),
+                commands,
+            )
         )
 
 
@@ -134,10 +1134,32 @@ def ensure_lf_line_ending(path: Path | str) -> CommandResult:
     return run_executable(["dos2unix", str(path)])
 
 
+class Timing(ty.NamedTuple):
+    """Time spent by a test, in seconds.
+
+    `children_cpu_time` is the CPU time of the child processes that were waited
+    for during the test, e.g. by `run_executable`. It is always 0.0 on Windows.
+    """
+
+    wall_time: float
+    cpu_time: float
+    children_cpu_time: float
+
+
+def _get_children_cpu_time() -> float:
+    if sys.platform == "win32":
+        return 0.0
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return usage.ru_utime + usage.ru_stime
+
+
 class MinimalistTestResult(unittest.TextTestResult):
     """TextTestResult without the traceback.
 
     Traceback is too verbose for our purpose.
+
+    The time spent by each test is recorded in `timings` with the test's id as
+    the key.
     """
 
     def __init__(self, *args, **kwargs) -> None:
@@ -149,6 +1171,10 @@ class MinimalistTestResult(unittest.TextTestResult):
         self.total_points = 0.0
         self.point_breakdowns: dict[str, tuple[float, float]] = {}
 
+        # Time tracking.
+        self.timings: dict[str, Timing] = {}
+        self._test_start_times = (0.0, 0.0, 0.0)
+
     def getDescription(self, test: unittest.TestCase) -> str:
         doc_first_line = test.shortDescription()
         if self.descriptions and doc_first_line:
@@ -164,6 +1190,21 @@ class MinimalistTestResult(unittest.TextTestResult):
             self.total_points += points
             self.point_breakdowns[test._testMethodName] = (0.0, points)
 
+        self._test_start_times = (
+            time.perf_counter(),
+            time.process_time(),
+            _get_children_cpu_time(),
+        )
+
+    def stopTest(self, test: unittest.TestCase) -> None:
+        wall_time, cpu_time, children_cpu_time = self._test_start_times
+        self.timings[test.id()] = Timing(
+            wall_time=time.perf_counter() - wall_time,
+            cpu_time=time.process_time() - cpu_time,
+            children_cpu_time=_get_children_cpu_time() - children_cpu_time,
+        )
+        super().stopTest(test)
+
     def addSuccess(self, test: unittest.TestCase) -> None:
         super().addSuccess(test)
         test_method = getattr(test, test._testMethodName)
@@ -184,9 +1225,184 @@ class MinimalistTestResult(unittest.TextTestResult):
             self.stream.flush()
 
 
+class _TestOutcome(ty.NamedTuple):
+    """Outcome of a test that was run in a worker process."""
+
+    status: str
+    message: str
+    output: str
+    timing: Timing | None
+
+
+# Tests to be run by the worker processes. Workers are forked after this list is
+# filled, so they can find a test by its index without pickling it.
+_parallel_tests: list[unittest.TestCase] = []
+
+
+def _run_parallel_test(index: int) -> _TestOutcome:
+    test = _parallel_tests[index]
+    result = MinimalistTestResult(io.StringIO(), True, 0)
+    output = io.StringIO()
+    with contextlib.redirect_stdout(output), contextlib.redirect_stderr(output):
+        # A suite also takes care of setUpClass and tearDownClass.
+        unittest.TestSuite([test])(result)
+    # Worker processes do not run the atexit handlers.
+    drain_deferred_cleanup()
+    remove_fixture_templates()
+
+    if len(result.errors) != 0:
+        status, message = "error", result.errors[0][1]
+    elif len(result.failures) != 0:
+        status, message = "failure", result.failures[0][1].removesuffix("\n")
+    elif len(result.skipped) != 0:
+        status, message = "skip", result.skipped[0][1]
+    elif len(result.expectedFailures) != 0:
+        status, message = "expected_failure", result.expectedFailures[0][1]
+    elif len(result.unexpectedSuccesses) != 0:
+        status, message = "unexpected_success", ""
+    else:
+        status, message = "success", ""
+    return _TestOutcome(
+        status, message, output.getvalue(), result.timings.get(test.id())
+    )
+
+
+def _as_exc_info(exc: BaseException) -> ty.Any:
+    """Raise and catch `exc` to get a complete exc_info tuple for the TestResult."""
+    try:
+        raise exc
+    except BaseException:
+        return sys.exc_info()
+
+
+class _ParallelTestProxy:
+    """
+    Stand in for a test that is run by a worker process.
+
+    When called by the suite, it waits for the worker and reports the outcome to
+    the result as if the test was run here.
+    """
+
+    def __init__(self, test: unittest.TestCase, future: Future[_TestOutcome]) -> None:
+        self.test = test
+        self.future = future
+
+    def countTestCases(self) -> int:
+        return 1
+
+    def __call__(self, result: unittest.TestResult) -> None:
+        outcome = self.future.result()
+        test = self.test
+
+        result.startTest(test)
+        sys.stdout.write(outcome.output)
+        if outcome.status == "success":
+            result.addSuccess(test)
+        elif outcome.status == "failure":
+            result.addFailure(test, _as_exc_info(AssertionError(outcome.message)))
+        elif outcome.status == "error":
+            result.addError(test, _as_exc_info(Exception(outcome.message)))
+            # Show the traceback from the worker instead of the one of the placeholder.
+            result.errors[-1] = (test, outcome.message)
+        elif outcome.status == "skip":
+            result.addSkip(test, outcome.message)
+        elif outcome.status == "expected_failure":
+            result.addExpectedFailure(
+                test, _as_exc_info(AssertionError(outcome.message))
+            )
+            result.expectedFailures[-1] = (test, outcome.message)
+        elif outcome.status == "unexpected_success":
+            result.addUnexpectedSuccess(test)
+        result.stopTest(test)
+
+        if isinstance(result, MinimalistTestResult) and outcome.timing is not None:
+            result.timings[test.id()] = outcome.timing
+
+
+# Proxies of a test class share the module of the test class, so the suite does not
+# tear down and set up the module fixtures when it moves between them.
+_proxy_classes: dict[str, type[_ParallelTestProxy]] = {}
+
+
+def _make_proxy(
+    test: unittest.TestCase, future: Future[_TestOutcome]
+) -> _ParallelTestProxy:
+    module_name = type(test).__module__
+    if module_name not in _proxy_classes:
+        _proxy_classes[module_name] = type(
+            "_ParallelTestProxy", (_ParallelTestProxy,), {"__module__": module_name}
+        )
+    return _proxy_classes[module_name](test, future)
+
+
+def _iter_tests(
+    test: unittest.TestSuite | unittest.TestCase,
+) -> ty.Iterator[unittest.TestCase]:
+    if isinstance(test, unittest.TestSuite):
+        for item in test:
+            yield from _iter_tests(item)
+    else:
+        yield test
+
+
 class MinimalistTestRunner(unittest.TextTestRunner):
+    """
+    TextTestRunner that prints the points at the end.
+
+    Tests of a class with `run_in_parallel = True` are run concurrently in a pool
+    of worker processes. Their outcomes are reported in the same order as when
+    they are run one after another.
+
+    :param jobs: Number of worker processes for the tests that can be run in
+    parallel. Default to the number of CPUs. Use 1 to run every test in this process.
+    """
+
+    def __init__(
+        self, *args: ty.Any, jobs: int | None = None, **kwargs: ty.Any
+    ) -> None:
+        super().__init__(*args, **kwargs)
+        self.jobs = jobs
+
     def run(self, test: unittest.TestSuite | unittest.TestCase) -> unittest.TestResult:
-        result = super().run(test)
+        jobs = self.jobs or os.cpu_count() or 1
+        tests = list(_iter_tests(test))
+        parallel_tests = [
+            item for item in tests if getattr(item, "run_in_parallel", False) is True
+        ]
+
+        # Workers must be forked to see the test classes of the grading script.
+        if (
+            jobs == 1
+            or len(parallel_tests) < 2
+            or "fork" not in multiprocessing.get_all_start_methods()
+        ):
+            result = super().run(test)
+        else:
+            _parallel_tests[:] = parallel_tests
+            executor = ProcessPoolExecutor(
+                max_workers=min(jobs, len(parallel_tests)),
+                mp_context=multiprocessing.get_context("fork"),
+            )
+            try:
+                futures = {
+                    id(item): executor.submit(_run_parallel_test, idx)
+                    for idx, item in enumerate(parallel_tests)
+                }
+                suite = unittest.TestSuite(
+                    [
+                        ty.cast(unittest.TestCase, _make_proxy(item, futures[id(item)]))
+                        if id(item) in futures
+                        else item
+                        for item in tests
+                    ]
+                )
+                result = super().run(suite)
+            finally:
+                executor.shutdown(cancel_futures=True)
+                _parallel_tests.clear()
+
+        drain_deferred_cleanup()
+        remove_fixture_templates()
         self.stream.writeln(f"POINTS: {result.points} / {result.total_points}")
         self.stream.flush()
         return result
@@ -206,9 +1422,39 @@ class BaseTestCase(unittest.TestCase, metaclass=BaseTestCaseMeta):
     A base class for test case.
 
     :cvar with_temporary_dir: When `True`, create a temporary directory for each test.
+    :cvar temporary_dir_root: The folder to create the temporary directories in.
+    Default to the value of the `GRADING_LIB_TEMP_ROOT` environment variable, or
+    the current working directory. A memory-backed folder like `/dev/shm` makes
+    file-heavy tests faster.
+    :cvar fixture_template: A folder whose content is put into the temporary
+    directory of every test. It is copied to `temporary_dir_root` once, and each
+    test gets a clone of that copy (see `clone_tree`).
+    :cvar fixture_hardlink: When `True`, the files of `fixture_template` are hard
+    links in the temporary directory, so the tests must not modify them.
+    :cvar deferred_cleanup: When `True`, the temporary directory is removed on a
+    background thread after the test instead of in `tearDown`. See
+    `drain_deferred_cleanup`.
+    :cvar run_in_parallel: When `True`, the `MinimalistTestRunner` may run the tests
+    of this class concurrently in worker processes. Only use it when the tests do
+    not depend on each other, e.g. each test only touches its own temporary directory.
     """
 
     with_temporary_dir: bool  # Added by metaclass.
+    temporary_dir_root: str | Path | None = None
+    fixture_template: str | Path | None = None
+    fixture_hardlink: bool = False
+    deferred_cleanup: bool = False
+    run_in_parallel: bool = False
+
+    @classmethod
+    def get_temporary_dir_root(cls) -> Path:
+        root = cls.temporary_dir_root
+        if root is None:
+            root = os.environ.get(TEMP_ROOT_ENV_NAME, ".")
+        if isinstance(root, str):
+            root = Path(root)
+        root.mkdir(parents=True, exist_ok=True)
+        return root
 
     def setUp(self) -> None:
         self.is_debug_mode = is_debug_mode()
@@ -216,16 +1462,36 @@ class BaseTestCase(unittest.TestCase, metaclass=BaseTestCaseMeta):
 
         self.temporary_dir = None
         if self.with_temporary_dir:
+            root = self.get_temporary_dir_root()
             if sys.version_info < (3, 12, 0):
-                self.temporary_dir = tempfile.TemporaryDirectory(dir=Path("."))
+                self.temporary_dir = tempfile.TemporaryDirectory(dir=root)
             else:
-                self.temporary_dir = tempfile.TemporaryDirectory(
-                    dir=Path("."), delete=False
-                )
+                self.temporary_dir = tempfile.TemporaryDirectory(dir=root, delete=False)
             self.temporary_dir_path = Path(self.temporary_dir.name)
 
+            if self.fixture_template is not None:
+                template = _materialize_fixture_template(
+                    Path(self.fixture_template), root
+                )
+                clone_tree(
+                    template, self.temporary_dir_path, hardlink=self.fixture_hardlink
+                )
+
     def tearDown(self) -> None:
+        leaked_processes = reap_process_groups()
+        if len(leaked_processes) != 0:
+            names = ", ".join(
+                f"{process.name or '?'} (pid {process.pid})"
+                for process in leaked_processes
+            )
+            print(
+                f"[warning]: Killed {len(leaked_processes)} process(es) that were left running by the commands of the test: {names}"
+            )
+
         if not self.is_debug_mode and self.temporary_dir is not None:
+            if self.deferred_cleanup:
+                _deferred_cleaner.remove(self.temporary_dir_path)
+            # When the directory is already renamed, this only stops its finalizer.
             self.temporary_dir.cleanup()
         elif self.is_debug_mode and self.temporary_dir is not None:
             print(
@@ -272,6 +1538,53 @@ class BaseTestCase(unittest.TestCase, metaclass=BaseTestCaseMeta):
                 msg.format(paths=path_strs, not_exist=not_exist_strs)
             )
 
+    def assertChecksumsMatch(
+        self,
+        checksums: ty.Mapping[str, str] | ty.Mapping[Path, str],
+        algorithm: str = "sha512",
+        root: Path | str | None = None,
+        msg_template: str = CHECKSUMS_MISMATCH_TEXT_TEMPLATE,
+    ) -> None:
+        """
+        Pass if every file has its expected checksum. See `verify_checksums`.
+
+        The `msg_template` will be formatted with `mismatches`.
+        """
+        mismatches = verify_checksums(checksums, algorithm=algorithm, root=root)
+        if len(mismatches) != 0:
+            lines = [f"- {mismatch.describe(algorithm)}" for mismatch in mismatches]
+            msg = msg_template.format(mismatches="\n".join(lines))
+            raise self.failureException(msg)
+
+    def assertTreeMatches(
+        self,
+        root: Path | str,
+        manifest: ty.Mapping[str, "ExpectedEntry"],
+        exact: bool = False,
+        ignored_names: ty.Collection[str] = (),
+        algorithm: str = "sha512",
+        msg_template: str = TREE_MISMATCH_TEXT_TEMPLATE,
+    ) -> None:
+        """
+        Pass if the folder has every entry of the manifest, by relative path with
+        `/`. See `grading_lib.filesystem.find_tree_differences`.
+
+        The `msg_template` will be formatted with `root` and `differences`.
+        """
+        from .filesystem import find_tree_differences
+
+        differences = find_tree_differences(
+            root,
+            manifest,
+            exact=exact,
+            ignored_names=ignored_names,
+            algorithm=algorithm,
+        )
+        if len(differences) != 0:
+            lines = [f"- {difference.describe()}" for difference in differences]
+            msg = msg_template.format(root=str(root), differences="\n".join(lines))
+            raise self.failureException(msg)
+
     def assertCommandSuccessful(
         self, result: CommandResult, msg_template: str = COMMAND_FAILED_TEXT_TEMPLATE
     ) -> None:
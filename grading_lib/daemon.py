@@ -0,0 +1,200 @@
+"""
+A grading daemon that keeps warm worker processes.
+
+The daemon listens on a Unix domain socket. A client sends one job per
+connection as a line of JSON, e.g.
+
+    {"path": "/abs/path/to/hw", "cache_dir": null, "slowest": 0, "timings_file": null}
+
+and receives lines of JSON. Each `{"output": "..."}` message is a piece of the
+output of the `grade` command and the last message `{"exit_code": 0}` carries
+its exit code.
+
+The problems are graded by a pool of worker processes that have imported
+unittest, GitPython and grading_lib's modules once. A worker restores the working
+directory, `sys.path` and `sys.modules` after every problem, the same way the
+`grade` command does.
+
+Only the client part of this module is meant to be imported by the CLI before
+a job is sent, so it must not import anything heavy at the module level.
+"""
+
+import io
+import json
+import os
+import socket
+import socketserver
+import sys
+import threading
+import traceback
+import typing as ty
+from pathlib import Path
+
+if ty.TYPE_CHECKING:
+    from concurrent.futures import ProcessPoolExecutor
+
+DEFAULT_SOCKET_PATH = ".grading-lib.sock"
+
+
+def _send_message(wfile: ty.BinaryIO, message: dict[str, ty.Any]) -> None:
+    wfile.write(json.dumps(message).encode() + b"\n")
+    wfile.flush()
+
+
+class _MessageStream(io.StringIO):
+    """
+    A text stream that sends everything written to it as output messages.
+
+    Nothing is kept in the buffer of the `io.StringIO`, which is only the base for
+    the `ty.TextIO` interface.
+    """
+
+    def __init__(self, wfile: ty.BinaryIO) -> None:
+        super().__init__()
+        self.wfile = wfile
+
+    def write(self, s: str) -> int:
+        if len(s) != 0:
+            _send_message(self.wfile, {"output": s})
+        return len(s)
+
+
+class _GradeJobHandler(socketserver.StreamRequestHandler):
+    server: "GradingServer"
+
+    def handle(self) -> None:
+        from concurrent.futures.process import BrokenProcessPool
+
+        from .cache import ResultCache
+        from .grading import grade_homework
+
+        stream = _MessageStream(ty.cast(ty.BinaryIO, self.wfile))
+        try:
+            job = json.loads(self.rfile.readline())
+            cache_dir = job.get("cache_dir")
+            exit_code = grade_homework(
+                job["path"],
+                cache=ResultCache(cache_dir) if cache_dir is not None else None,
+                slowest=job.get("slowest", 0),
+                timings_file=job.get("timings_file"),
+                stream=stream,
+                executor=self.server.get_executor(),
+            )
+        except BrokenPipeError:
+            # The client is gone, there is no one to report to.
+            return
+        except BrokenProcessPool:
+            # A worker that died (e.g. a grading script called os._exit()) breaks
+            # the whole pool. Replace it for the next jobs.
+            self.server.reset_executor()
+            stream.write(traceback.format_exc())
+            exit_code = 1
+        except Exception:
+            stream.write(traceback.format_exc())
+            exit_code = 1
+        except SystemExit as e:
+            # A grading script called sys.exit(), which the grade command reports
+            # with its exit code.
+            stream.write(traceback.format_exc())
+            exit_code = e.code if isinstance(e.code, int) and e.code != 0 else 1
+
+        try:
+            _send_message(ty.cast(ty.BinaryIO, self.wfile), {"exit_code": exit_code})
+        except BrokenPipeError:
+            pass
+
+
+if hasattr(socketserver, "UnixStreamServer"):
+
+    class GradingServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+        """
+        A Unix domain socket server that grades the homework with a pool of warm workers.
+
+        :param socket_path: Where to create the socket. An existing file at this path
+        is removed.
+        :param workers: Number of worker processes. Default to the number of CPUs.
+        """
+
+        daemon_threads = True
+
+        def __init__(self, socket_path: Path | str, workers: int | None = None) -> None:
+            if isinstance(socket_path, str):
+                socket_path = Path(socket_path)
+            self.socket_path = socket_path
+            self.workers = workers or os.cpu_count() or 1
+            self._executor: ProcessPoolExecutor | None = None
+            self._executor_lock = threading.Lock()
+
+            if socket_path.exists() or socket_path.is_symlink():
+                socket_path.unlink()
+            super().__init__(str(socket_path), _GradeJobHandler)
+
+            # Start the workers now, so the first job does not pay for them.
+            self.get_executor()
+
+        def get_executor(self) -> "ProcessPoolExecutor":
+            with self._executor_lock:
+                if self._executor is None:
+                    from concurrent.futures import ProcessPoolExecutor
+
+                    from .grading import _warm_up_worker
+
+                    self._executor = ProcessPoolExecutor(
+                        max_workers=self.workers, initializer=_warm_up_worker
+                    )
+                return self._executor
+
+        def reset_executor(self) -> None:
+            with self._executor_lock:
+                if self._executor is not None:
+                    self._executor.shutdown(wait=False, cancel_futures=True)
+                    self._executor = None
+
+        def server_close(self) -> None:
+            super().server_close()
+            self.reset_executor()
+            if self.socket_path.exists():
+                self.socket_path.unlink()
+
+
+def send_grade_job(
+    socket_path: Path | str,
+    path: Path | str,
+    cache_dir: Path | str | None = None,
+    slowest: int = 0,
+    timings_file: Path | str | None = None,
+    stream: ty.TextIO | None = None,
+) -> int:
+    """
+    Send a grade job to the daemon, write its output to `stream` as it arrives and
+    return the exit code.
+
+    Relative paths are resolved against the current working directory of the client.
+    """
+    if stream is None:
+        stream = sys.stdout
+
+    job = {
+        "path": os.path.abspath(path),
+        "cache_dir": os.path.abspath(cache_dir) if cache_dir is not None else None,
+        "slowest": slowest,
+        "timings_file": os.path.abspath(timings_file)
+        if timings_file is not None
+        else None,
+    }
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.connect(str(socket_path))
+        sock.sendall(json.dumps(job).encode() + b"\n")
+
+        with sock.makefile("rb") as rfile:
+            for line in rfile:
+                message = json.loads(line)
+                if "output" in message:
+                    stream.write(message["output"])
+                    stream.flush()
+                elif "exit_code" in message:
+                    return int(message["exit_code"])
+
+    raise ConnectionError(
+        "The grading daemon closed the connection before the job finished."
+    )
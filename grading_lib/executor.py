@@ -0,0 +1,408 @@
+"""
+Executors that run commands on behalf of the grading scripts.
+
+An executor has the same `run_executable` and `run_targets` methods as the
+functions of the same name in the common and makefile modules, so a grading
+script can swap one for the other.
+"""
+
+from __future__ import annotations
+
+import collections
+import hashlib
+import itertools
+import json
+import os
+import pickle
+import subprocess
+import sys
+import threading
+import typing as ty
+from concurrent.futures import Future
+from pathlib import Path
+
+from .common import (
+    COMMAND_TIMED_OUT_TEXT_TEMPLATE,
+    DEFAULT_KILL_GRACE_PERIOD,
+    CommandResult,
+    CommandUsage,
+    LeakedProcess,
+    _update_hash_with_files,
+    _write_json_atomically,
+    run_executable,
+)
+
+if ty.TYPE_CHECKING:
+    from collections.abc import Callable, Iterable
+
+
+def fingerprint_inputs(cwd: Path | str, patterns: Iterable[str]) -> str:
+    """
+    Return a SHA256 hex digest of the relative path and content of every file under
+    `cwd` that matches one of the glob patterns (e.g. `"*.c"` or `"src/**/*.h"`).
+    """
+    if isinstance(cwd, str):
+        cwd = Path(cwd)
+
+    paths: set[Path] = set()
+    for pattern in patterns:
+        paths.update(path for path in cwd.glob(pattern) if path.is_file())
+
+    m = hashlib.sha256()
+    _update_hash_with_files(m, cwd, sorted(paths))
+    return m.hexdigest()
+
+
+class MemoizedExecutor:
+    """
+    Run commands and re-use the result of an identical earlier call.
+
+    A call is identical when the arguments, the resolved `cwd`, the values of the
+    `env_keys` environment variables and the content of the files matching the
+    `inputs` glob patterns (relative to `cwd`) are all the same.
+
+    Only the `CommandResult` is re-used; the command is not run again, so its side
+    effects (e.g. the files it creates) are not re-created. Declare every file that
+    the command reads in `inputs`, and only memoize a command whose side effects
+    are still there when it is called again, or whose side effects are not checked.
+
+    :param inputs: Default glob patterns of the input files. Can be overridden per call.
+    :param env_keys: Names of the environment variables that the result depends on.
+    :param max_entries: Maximum number of results kept in each scope. The least
+    recently used result is evicted first.
+    :param cache_dir: If specified, the results are also stored in this folder, so
+    they are shared between processes and runs. Otherwise they are kept only in
+    this process.
+    :param run: The function that actually runs a command.
+    """
+
+    def __init__(
+        self,
+        inputs: Iterable[str] = (),
+        env_keys: Iterable[str] = (),
+        max_entries: int = 128,
+        cache_dir: Path | str | None = None,
+        run: Callable[..., CommandResult] = run_executable,
+    ) -> None:
+        if isinstance(cache_dir, str):
+            cache_dir = Path(cache_dir)
+        self.inputs = list(inputs)
+        self.env_keys = sorted(env_keys)
+        self.max_entries = max_entries
+        self.cache_dir = cache_dir
+        self.run = run
+        self.hits = 0
+        self.misses = 0
+        self._results: collections.OrderedDict[str, CommandResult] = (
+            collections.OrderedDict()
+        )
+        self._lock = threading.Lock()
+
+    def make_key(
+        self,
+        args: list[str],
+        cwd: Path | str | None = None,
+        inputs: Iterable[str] | None = None,
+        **kwargs: ty.Any,
+    ) -> str:
+        """Return the cache key of a call."""
+        cwd = Path(cwd if cwd is not None else ".").resolve()
+        patterns = self.inputs if inputs is None else list(inputs)
+        data = {
+            "args": args,
+            "cwd": str(cwd),
+            "env": {key: os.environ.get(key) for key in self.env_keys},
+            "inputs": fingerprint_inputs(cwd, patterns),
+            "kwargs": {key: repr(value) for key, value in sorted(kwargs.items())},
+        }
+        return hashlib.sha256(json.dumps(data).encode()).hexdigest()
+
+    def run_executable(
+        self,
+        args: list[str],
+        cwd: Path | str | None = None,
+        timeout: float = 15.0,
+        inputs: Iterable[str] | None = None,
+        **kwargs: ty.Any,
+    ) -> CommandResult:
+        """
+        Same as `grading_lib.common.run_executable`, but re-use the result of an
+        identical earlier call.
+
+        :param inputs: Glob patterns of the input files, default to `self.inputs`.
+        """
+        key = self.make_key(args, cwd, inputs, timeout=timeout, **kwargs)
+        result = self._get(key)
+        if result is not None:
+            with self._lock:
+                self.hits += 1
+            return result
+
+        result = self.run(args, cwd=cwd, timeout=timeout, **kwargs)
+        with self._lock:
+            self.misses += 1
+        # A time out depends on the load of the machine, so it is not re-used.
+        timed_out_text = COMMAND_TIMED_OUT_TEXT_TEMPLATE.format(timeout=timeout)
+        if not result.output.startswith(timed_out_text):
+            self._put(key, result)
+        return result
+
+    def run_targets(
+        self,
+        targets: list[str],
+        makefile_name: str = "answer.mk",
+        cwd: Path | str | None = None,
+        timeout: float = 15.0,
+        inputs: Iterable[str] | None = None,
+    ) -> CommandResult:
+        """
+        Same as `grading_lib.makefile.run_targets`, but re-use the result of an
+        identical earlier call.
+
+        The Makefile is always part of the inputs.
+        """
+        patterns = list(self.inputs if inputs is None else inputs)
+        return self.run_executable(
+            ["make", "-f", makefile_name, *targets],
+            cwd=cwd,
+            timeout=timeout,
+            inputs=[makefile_name, *patterns],
+        )
+
+    def clear(self) -> None:
+        """Forget the results kept in this process. The stored results are kept."""
+        with self._lock:
+            self._results.clear()
+
+    def _get(self, key: str) -> CommandResult | None:
+        with self._lock:
+            if key in self._results:
+                self._results.move_to_end(key)
+                return self._results[key]
+
+        if self.cache_dir is None:
+            return None
+
+        entry_path = self.cache_dir / f"{key}.json"
+        try:
+            with open(entry_path) as f:
+                data = json.load(f)
+            # Mark it as recently used for the eviction.
+            os.utime(entry_path)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+        result = CommandResult(data["success"], data["command"], data["output"])
+        if data["usage"] is not None:
+            result.usage = CommandUsage(*data["usage"])
+        self._remember(key, result)
+        return result
+
+    def _put(self, key: str, result: CommandResult) -> None:
+        self._remember(key, result)
+        if self.cache_dir is None:
+            return
+
+        data = {**result._asdict(), "usage": result.usage}
+        _write_json_atomically(self.cache_dir / f"{key}.json", data)
+
+        entries = []
+        for path in self.cache_dir.glob("*.json"):
+            try:
+                entries.append((path.stat().st_mtime_ns, path))
+            except FileNotFoundError:
+                # Evicted by another process.
+                continue
+        entries.sort()
+        for _, path in entries[: max(len(entries) - self.max_entries, 0)]:
+            path.unlink(missing_ok=True)
+
+    def _remember(self, key: str, result: CommandResult) -> None:
+        with self._lock:
+            self._results[key] = result
+            self._results.move_to_end(key)
+            while len(self._results) > self.max_entries:
+                self._results.popitem(last=False)
+
+
+class ForkServerExecutor:
+    """
+    Run commands from a small helper process instead of this process.
+
+    Starting a command forks the process that starts it. A grading process that has
+    loaded GitPython and the grading scripts is slow and memory-heavy to fork, so the
+    helper (see `grading_lib._forkserver`), which only loads the common module, is
+    started once and asked to start the commands. The results are the same as the
+    ones of `grading_lib.common.run_executable`.
+
+    CPython starts a plain command with vfork when it can, which does not copy the
+    memory of this process. A command that needs a step in the child before it
+    starts (i.e. `limits`) is started with fork, and that is where the helper pays
+    off. Sending a command to the helper costs about half a millisecond.
+
+    The working directory and the environment variables of this process at the time
+    of the call are sent with every command. Commands can be run from several
+    threads at the same time.
+
+    Processes left running by finished commands belong to the helper, so call
+    `reap_process_groups` of the executor (e.g. in `tearDown`) to kill them.
+
+    The helper is started on first use (or by `start`) and stopped by `close` or when
+    the executor is used as a context manager and the block ends.
+    """
+
+    def __init__(self) -> None:
+        self._proc: subprocess.Popen[bytes] | None = None
+        self._lock = threading.Lock()
+        # The requests waiting for a response and the helper they were sent to.
+        self._pending: dict[int, tuple[subprocess.Popen[bytes], Future[ty.Any]]] = {}
+        self._request_ids = itertools.count()
+
+    def __enter__(self) -> ForkServerExecutor:
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info: object) -> None:
+        self.close()
+
+    def start(self) -> None:
+        """Start the helper process if it is not running."""
+        with self._lock:
+            self._start()
+
+    def _start(self) -> subprocess.Popen[bytes]:
+        if self._proc is not None:
+            return self._proc
+
+        # The helper must be able to import this copy of grading_lib.
+        env = os.environ.copy()
+        package_parent = str(Path(__file__).parent.parent)
+        env["PYTHONPATH"] = os.pathsep.join(
+            [package_parent, *filter(None, [env.get("PYTHONPATH")])]
+        )
+        proc = subprocess.Popen(
+            [sys.executable, "-m", "grading_lib._forkserver"],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            env=env,
+        )
+        threading.Thread(target=self._read_responses, args=(proc,), daemon=True).start()
+        self._proc = proc
+        return proc
+
+    def _read_responses(self, proc: subprocess.Popen[bytes]) -> None:
+        assert proc.stdout is not None
+        while True:
+            try:
+                request_id, value, exc = pickle.load(proc.stdout)
+            except (EOFError, OSError, pickle.UnpicklingError):
+                break
+
+            with self._lock:
+                _, future = self._pending.pop(request_id)
+            if exc is not None:
+                future.set_exception(exc)
+            else:
+                future.set_result(value)
+
+        proc.wait()
+        with self._lock:
+            if self._proc is proc:
+                self._proc = None
+            # Only the requests of this helper, a new one may have been started.
+            request_ids = [
+                request_id
+                for request_id, (request_proc, _) in self._pending.items()
+                if request_proc is proc
+            ]
+            pending = [self._pending.pop(request_id)[1] for request_id in request_ids]
+        for future in pending:
+            future.set_exception(
+                ConnectionError(
+                    f"The fork server exited (exit code {proc.returncode}) before the command finished."
+                )
+            )
+
+    def _submit(
+        self, kind: str, args: tuple[ty.Any, ...], kwargs: dict[str, ty.Any]
+    ) -> Future[ty.Any]:
+        future: Future[ty.Any] = Future()
+        with self._lock:
+            proc = self._start()
+            assert proc.stdin is not None
+            request_id = next(self._request_ids)
+            self._pending[request_id] = (proc, future)
+            try:
+                pickle.dump((request_id, kind, args, kwargs), proc.stdin)
+                proc.stdin.flush()
+            except OSError as e:
+                # The reader thread fails the other pending requests.
+                del self._pending[request_id]
+                raise ConnectionError(
+                    "Cannot send the command to the fork server."
+                ) from e
+        return future
+
+    def run_executable(
+        self,
+        args: list[str],
+        cwd: Path | str | None = None,
+        timeout: float = 15.0,
+        **kwargs: ty.Any,
+    ) -> CommandResult:
+        """
+        Same as `grading_lib.common.run_executable`, but the command is started by the
+        helper process. A relative `cwd` or `spill_path` is relative to the working
+        directory of this process.
+        """
+        cwd = os.path.abspath(cwd if cwd is not None else ".")
+        kwargs.setdefault("env", dict(os.environ))
+        if kwargs.get("spill_path") is not None:
+            kwargs["spill_path"] = os.path.abspath(kwargs["spill_path"])
+        future = self._submit(
+            "run", (args,), {"cwd": cwd, "timeout": timeout, **kwargs}
+        )
+        return ty.cast(CommandResult, future.result())
+
+    def run_targets(
+        self,
+        targets: list[str],
+        makefile_name: str = "answer.mk",
+        cwd: Path | str | None = None,
+        timeout: float = 15.0,
+    ) -> CommandResult:
+        """
+        Same as `grading_lib.makefile.run_targets`, but make is started by the helper
+        process.
+        """
+        return self.run_executable(
+            ["make", "-f", makefile_name, *targets], cwd=cwd, timeout=timeout
+        )
+
+    def reap_process_groups(
+        self, grace_period: float = DEFAULT_KILL_GRACE_PERIOD
+    ) -> list[LeakedProcess]:
+        """
+        Same as `grading_lib.common.reap_process_groups`, for the commands started by
+        the helper process.
+        """
+        with self._lock:
+            if self._proc is None:
+                return []
+        future = self._submit("reap", (grace_period,), {})
+        return ty.cast(list[LeakedProcess], future.result())
+
+    def close(self) -> None:
+        """Wait for the running commands to finish and stop the helper process."""
+        with self._lock:
+            proc = self._proc
+            self._proc = None
+        if proc is None:
+            return
+
+        assert proc.stdin is not None
+        try:
+            proc.stdin.close()
+        except OSError:
+            pass
+        proc.wait()
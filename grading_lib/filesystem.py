@@ -0,0 +1,500 @@
+"""
+Generate and inspect folder trees for the problems about files, e.g. `find`,
+`grep` or `tar`.
+
+A generated tree is planned in memory first from a `TreeSpec` and a seed, so the
+same seed always gives the same `TreeManifest`, and then written to a folder. The
+manifest keeps what was written for the assertions of the test.
+
+A `TreeSnapshot` records the state of every entry of a folder, so two snapshots
+show what a command added, removed or modified. `find_tree_differences` compares
+a folder with the expected entries in one walk.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import os
+import random
+import stat
+import typing as ty
+from pathlib import Path
+
+from .common import (
+    FILE_SUFFIX_POOL,
+    NAME_POOL,
+    get_file_checksum,
+    get_seed_from_env,
+    verify_checksums,
+)
+
+if ty.TYPE_CHECKING:
+    from collections.abc import Collection, Iterator, Mapping, Sequence
+
+# Content buffers are at least this large, so files of the same size do not
+# all have the same content.
+MIN_CONTENT_BUFFER_SIZE = 64 * 1024
+
+
+class TreeSpec(ty.NamedTuple):
+    """
+    Shape of a generated folder tree.
+
+    A fan-out is either a fixed count or a `(min, max)` range to pick from.
+
+    :param depth: Number of levels of sub-folders under the root.
+    :param dir_fan_out: Number of sub-folders of each folder above the last level.
+    :param file_fan_out: Number of files in each folder, the root included.
+    :param file_sizes: Sizes in bytes to pick the size of a file from.
+    :param file_size_weights: Relative weights of `file_sizes`. Default to equal weights.
+    :param name_pool: Names to build the names of files and folders from.
+    :param suffix_pool: Suffixes of the files.
+    :param binary: When `True`, files contain random bytes. Otherwise they contain
+    lines of words from `name_pool`.
+    """
+
+    depth: int = 2
+    dir_fan_out: int | tuple[int, int] = 3
+    file_fan_out: int | tuple[int, int] = 10
+    file_sizes: Sequence[int] = (0, 128, 1024)
+    file_size_weights: Sequence[float] | None = None
+    name_pool: Sequence[str] = tuple(NAME_POOL)
+    suffix_pool: Sequence[str] = tuple(FILE_SUFFIX_POOL)
+    binary: bool = False
+
+
+class FileEntry(ty.NamedTuple):
+    """
+    A generated file. Its content is `size` bytes of the content buffer of the
+    manifest from `offset`.
+    """
+
+    size: int
+    offset: int
+
+
+class TreeManifest:
+    """
+    What a generated tree contains. Paths are relative to the root and use `/`.
+
+    :ivar seed: The seed the tree is generated from.
+    :ivar directories: The folders, each one after its parent.
+    :ivar files: The files and where their content is in `buffer`.
+    :ivar buffer: The bytes that the content of every file is taken from.
+    """
+
+    def __init__(
+        self,
+        seed: int,
+        directories: list[str],
+        files: dict[str, FileEntry],
+        buffer: bytes,
+    ) -> None:
+        self.seed = seed
+        self.directories = directories
+        self.files = files
+        self.buffer = buffer
+
+    def __len__(self) -> int:
+        return len(self.files)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.files)
+
+    def get_content(self, path: str) -> bytes:
+        entry = self.files[path]
+        return self.buffer[entry.offset : entry.offset + entry.size]
+
+    def get_total_size(self) -> int:
+        return sum(entry.size for entry in self.files.values())
+
+    def get_expected_entries(
+        self, algorithm: str | None = None
+    ) -> dict[str, ExpectedEntry]:
+        """
+        Return the folders and files as expected entries, e.g. for
+        `BaseTestCase.assertTreeMatches`.
+
+        :param algorithm: If specified, the checksums of the files are expected too.
+        """
+        expected = {directory: ExpectedEntry("dir") for directory in self.directories}
+        for path, entry in self.files.items():
+            checksum = None
+            if algorithm is not None:
+                checksum = hashlib.new(algorithm, self.get_content(path)).hexdigest()
+            expected[path] = ExpectedEntry("file", size=entry.size, checksum=checksum)
+        return expected
+
+    def write(self, root: Path | str) -> None:
+        """
+        Create the folders and files under `root`, which is created if it does not
+        exist. Existing files are overwritten.
+        """
+        if isinstance(root, str):
+            root = Path(root)
+        root.mkdir(parents=True, exist_ok=True)
+
+        for directory in self.directories:
+            os.makedirs(root / directory, exist_ok=True)
+
+        # Slices of the memoryview are written without copying the buffer.
+        view = memoryview(self.buffer)
+        flags = os.O_WRONLY | os.O_CREAT | os.O_TRUNC | getattr(os, "O_BINARY", 0)
+        root_str = str(root)
+        for path, entry in self.files.items():
+            fd = os.open(os.path.join(root_str, path), flags, 0o644)
+            try:
+                if entry.size != 0:
+                    content = view[entry.offset : entry.offset + entry.size]
+                    while len(content) != 0:
+                        content = content[os.write(fd, content) :]
+            finally:
+                os.close(fd)
+
+
+def _pick_count(rng: random.Random, fan_out: int | tuple[int, int]) -> int:
+    if isinstance(fan_out, int):
+        return fan_out
+    return rng.randint(fan_out[0], fan_out[1])
+
+
+def _make_content_buffer(rng: random.Random, spec: TreeSpec, size: int) -> bytes:
+    if spec.binary:
+        return rng.randbytes(size)
+
+    words = [name.encode() for name in spec.name_pool] or [b"word"]
+    # The average word and separator are long enough to fill the buffer.
+    count = size // (min(len(word) for word in words) + 1) + 1
+    parts = rng.choices(words, k=count)
+    separators = rng.choices([b" ", b" ", b" ", b"\n"], k=count)
+    return b"".join(
+        part + separator for part, separator in zip(parts, separators, strict=True)
+    )[:size]
+
+
+def plan_tree(spec: TreeSpec | None = None, seed: int | None = None) -> TreeManifest:
+    """
+    Plan a folder tree without writing it. The same `spec` and `seed` always give
+    the same manifest.
+
+    :param seed: Default to `get_seed_from_env()`.
+    """
+    if spec is None:
+        spec = TreeSpec()
+    if seed is None:
+        seed = get_seed_from_env()
+    if spec.depth < 0:
+        raise ValueError("'depth' must not be negative")
+    if len(spec.file_sizes) == 0 or min(spec.file_sizes) < 0:
+        raise ValueError("'file_sizes' must have sizes that are not negative")
+    if len(spec.name_pool) == 0 or len(spec.suffix_pool) == 0:
+        raise ValueError("'name_pool' and 'suffix_pool' must not be empty")
+
+    rng = random.Random(seed)
+    directories: list[str] = []
+    file_names: list[str] = []
+
+    # Breadth first, so a folder is always listed after its parent.
+    level = [""]
+    for current_depth in range(spec.depth + 1):
+        next_level = []
+        for directory in level:
+            prefix = f"{directory}/" if directory != "" else ""
+            for idx in range(_pick_count(rng, spec.file_fan_out)):
+                name = rng.choice(spec.name_pool)
+                suffix = rng.choice(spec.suffix_pool)
+                file_names.append(f"{prefix}{name}_{idx}{suffix}")
+
+            if current_depth < spec.depth:
+                for idx in range(_pick_count(rng, spec.dir_fan_out)):
+                    next_level.append(f"{prefix}{rng.choice(spec.name_pool)}_{idx}")
+        directories.extend(next_level)
+        level = next_level
+
+    sizes = rng.choices(
+        spec.file_sizes, weights=spec.file_size_weights, k=len(file_names)
+    )
+    buffer_size = max(2 * max(spec.file_sizes), MIN_CONTENT_BUFFER_SIZE)
+    files = {
+        name: FileEntry(size, rng.randint(0, buffer_size - size))
+        for name, size in zip(file_names, sizes, strict=True)
+    }
+    buffer = _make_content_buffer(rng, spec, buffer_size)
+    return TreeManifest(seed, directories, files, buffer)
+
+
+def generate_tree(
+    root: Path | str, spec: TreeSpec | None = None, seed: int | None = None
+) -> TreeManifest:
+    """
+    Create a folder tree under `root` and return its manifest.
+
+    Example:
+
+        manifest = generate_tree(
+            self.temporary_dir_path,
+            TreeSpec(depth=3, dir_fan_out=(2, 4), file_sizes=(0, 100, 10_000)),
+            seed=self.seed,
+        )
+
+    :param seed: Default to `get_seed_from_env()`.
+    """
+    manifest = plan_tree(spec, seed)
+    manifest.write(root)
+    return manifest
+
+
+class EntryState(ty.NamedTuple):
+    """
+    State of a file, folder or symbolic link in a `TreeSnapshot`.
+
+    The size, mtime, inode and ctime of a folder are always 0, since they change
+    whenever its content changes. `checksum` is only recorded for files, and only
+    when asked.
+
+    `ino` and `ctime_ns` are compared by `TreeSnapshot.__eq__` but not by
+    `TreeSnapshot.diff`: they catch a file that is replaced, or written with its
+    mtime restored afterwards, but also change when only its metadata does.
+    """
+
+    size: int
+    mtime_ns: int
+    mode: int
+    checksum: str | None = None
+    ino: int = 0
+    ctime_ns: int = 0
+
+
+class TreeDiff(ty.NamedTuple):
+    """Sorted paths that are added, removed or modified between two snapshots."""
+
+    added: list[str]
+    removed: list[str]
+    modified: list[str]
+
+    def is_empty(self) -> bool:
+        return (
+            len(self.added) == 0 and len(self.removed) == 0 and len(self.modified) == 0
+        )
+
+
+class TreeSnapshot:
+    """
+    State of every entry under a folder, by relative path with `/`.
+
+    Symbolic links are recorded, not followed.
+
+    :ivar root: The folder.
+    :ivar entries: The `EntryState` of each path.
+    """
+
+    def __init__(self, root: Path, entries: dict[str, EntryState]) -> None:
+        self.root = root
+        self.entries = entries
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def __contains__(self, path: object) -> bool:
+        return path in self.entries
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, TreeSnapshot):
+            return NotImplemented
+        return self.entries == other.entries
+
+    @classmethod
+    def capture(
+        cls,
+        root: Path | str,
+        ignored_names: Collection[str] = (),
+        checksum: str | None = None,
+    ) -> TreeSnapshot:
+        """
+        Walk `root` once with `os.scandir`.
+
+        :param ignored_names: Names of files and folders to skip at any level.
+        :param checksum: If specified, the name of a `hashlib` algorithm to record
+        the checksum of every file with (see `get_file_checksum`).
+        """
+        if isinstance(root, str):
+            root = Path(root)
+
+        entries: dict[str, EntryState] = {}
+        stack = [(str(root), "")]
+        while len(stack) != 0:
+            dir_path, prefix = stack.pop()
+            with os.scandir(dir_path) as it:
+                for entry in it:
+                    if entry.name in ignored_names:
+                        continue
+                    path = prefix + entry.name
+                    st = entry.stat(follow_symlinks=False)
+                    if stat.S_ISDIR(st.st_mode):
+                        entries[path] = EntryState(0, 0, st.st_mode)
+                        stack.append((entry.path, path + "/"))
+                    elif checksum is not None and stat.S_ISREG(st.st_mode):
+                        entries[path] = EntryState(
+                            st.st_size,
+                            st.st_mtime_ns,
+                            st.st_mode,
+                            get_file_checksum(entry.path, checksum),
+                            st.st_ino,
+                            st.st_ctime_ns,
+                        )
+                    else:
+                        entries[path] = EntryState(
+                            st.st_size,
+                            st.st_mtime_ns,
+                            st.st_mode,
+                            None,
+                            st.st_ino,
+                            st.st_ctime_ns,
+                        )
+        return cls(root, entries)
+
+    def diff(self, other: TreeSnapshot) -> TreeDiff:
+        """
+        Return the changes from this snapshot to `other`, a later one.
+
+        When both snapshots have the checksum of a file, it is modified if its
+        checksum or mode is different, so a file that is only touched is not.
+        Otherwise it is modified if its size, mtime or mode is different.
+        """
+        added = other.entries.keys() - self.entries.keys()
+        removed = self.entries.keys() - other.entries.keys()
+        modified = []
+        for path, before in self.entries.items():
+            after = other.entries.get(path)
+            if after is None or after == before:
+                continue
+            if before.checksum is not None and after.checksum is not None:
+                if before.checksum != after.checksum or before.mode != after.mode:
+                    modified.append(path)
+            elif before[:3] != after[:3]:
+                modified.append(path)
+        return TreeDiff(sorted(added), sorted(removed), sorted(modified))
+
+    def to_dict(self) -> dict[str, list[ty.Any]]:
+        """Return the entries in a JSON serializable form. See `from_dict`."""
+        return {path: list(state) for path, state in self.entries.items()}
+
+    @classmethod
+    def from_dict(cls, root: Path | str, data: dict[str, list[ty.Any]]) -> TreeSnapshot:
+        if isinstance(root, str):
+            root = Path(root)
+        return cls(root, {path: EntryState(*state) for path, state in data.items()})
+
+
+class ExpectedEntry(ty.NamedTuple):
+    """
+    An entry that is expected in a folder. A field that is `None` is not checked.
+
+    :param kind: `"file"`, `"dir"` or `"symlink"`.
+    :param size: Size of a file in bytes.
+    :param mode: Permission bits, e.g. `0o755`.
+    :param checksum: Hex digest of the content of a file.
+    """
+
+    kind: str = "file"
+    size: int | None = None
+    mode: int | None = None
+    checksum: str | None = None
+
+
+class TreeDifference(ty.NamedTuple):
+    """
+    A difference between a folder and its expected entries.
+
+    :param kind: `"missing"`, `"unexpected"`, `"type"`, `"size"`, `"mode"` or
+    `"checksum"`.
+    """
+
+    path: str
+    kind: str
+    expected: ty.Any = None
+    actual: ty.Any = None
+
+    def describe(self) -> str:
+        if self.kind == "missing":
+            return f"'{self.path}' does not exist"
+        if self.kind == "unexpected":
+            return f"'{self.path}' is not expected"
+        if self.kind == "type":
+            return f"'{self.path}' is a {self.actual}, expected a {self.expected}"
+        if self.kind == "mode":
+            return f"'{self.path}' has permissions {self.actual:o}, expected {self.expected:o}"
+        return f"'{self.path}' has {self.kind} {self.actual}, expected {self.expected}"
+
+
+def _get_kind(mode: int) -> str:
+    if stat.S_ISDIR(mode):
+        return "dir"
+    if stat.S_ISLNK(mode):
+        return "symlink"
+    if stat.S_ISREG(mode):
+        return "file"
+    return "special file"
+
+
+def find_tree_differences(
+    root: Path | str,
+    expected: Mapping[str, ExpectedEntry],
+    exact: bool = False,
+    ignored_names: Collection[str] = (),
+    algorithm: str = "sha512",
+) -> list[TreeDifference]:
+    """
+    Compare the folder with the expected entries (by relative path with `/`) and
+    return every difference, sorted by path.
+
+    The folder is walked once. Only the files with an expected checksum are read,
+    on a thread pool (see `verify_checksums`).
+
+    :param exact: When `True`, an entry that is not expected is a difference too.
+    :param ignored_names: Names of files and folders to skip at any level.
+    :param algorithm: The `hashlib` algorithm of the expected checksums.
+    """
+    if isinstance(root, str):
+        root = Path(root)
+
+    snapshot = TreeSnapshot.capture(root, ignored_names=ignored_names)
+    differences: list[TreeDifference] = []
+    checksums: dict[str, str] = {}
+    for path, entry in expected.items():
+        state = snapshot.entries.get(path)
+        if state is None:
+            differences.append(TreeDifference(path, "missing"))
+            continue
+
+        kind = _get_kind(state.mode)
+        if kind != entry.kind:
+            differences.append(TreeDifference(path, "type", entry.kind, kind))
+            continue
+        if entry.size is not None and entry.size != state.size:
+            differences.append(TreeDifference(path, "size", entry.size, state.size))
+        if entry.mode is not None and entry.mode != stat.S_IMODE(state.mode):
+            differences.append(
+                TreeDifference(path, "mode", entry.mode, stat.S_IMODE(state.mode))
+            )
+        if entry.checksum is not None and kind == "file":
+            checksums[path] = entry.checksum
+
+    for mismatch in verify_checksums(checksums, algorithm=algorithm, root=root):
+        differences.append(
+            TreeDifference(
+                mismatch.path.relative_to(root).as_posix(),
+                "checksum",
+                mismatch.expected,
+                mismatch.actual if mismatch.error is None else mismatch.error,
+            )
+        )
+
+    if exact:
+        differences.extend(
+            TreeDifference(path, "unexpected")
+            for path in snapshot.entries.keys() - expected.keys()
+        )
+
+    differences.sort(key=lambda difference: difference.path)
+    return differences
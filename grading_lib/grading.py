@@ -0,0 +1,519 @@
+"""
+Routines that grade the problems of a homework.
+
+A problem is graded by importing its `scripts/grade.py` as `scripts.grade` and
+running the module with the `MinimalistTestRunner`. Since every problem uses the
+same module name, the working directory, `sys.path` and the imported `scripts`
+modules must be restored before the next problem can be graded in the same
+interpreter.
+"""
+
+import contextlib
+import copy
+import csv
+import importlib
+import io
+import json
+import os
+import sys
+import traceback
+import typing as ty
+import unittest
+from concurrent.futures import Executor, Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+
+from .common import MinimalistTestResult, MinimalistTestRunner, Timing
+from .util import FindProblemList
+
+if ty.TYPE_CHECKING:
+    from .cache import ResultCache
+
+CACHED_RESULT_TEXT = "[info]: Nothing in the problem has changed since it was last graded. Reuse the stored result.\n"
+
+
+class ProblemResult(ty.NamedTuple):
+    """Points of a graded problem."""
+
+    name: str
+    points: float
+    total_points: float
+    point_breakdowns: dict[str, tuple[float, float]]
+    output: str = ""
+    timings: dict[str, Timing] | None = None
+    error: str | None = None
+
+
+def _forget_problem_modules() -> None:
+    """Remove `scripts` and its submodules from `sys.modules`.
+
+    They will be re-used by Python since we have the same module name in
+    every problem.
+    """
+    for name in list(sys.modules.keys()):
+        if name == "scripts" or name.startswith("scripts."):
+            del sys.modules[name]
+
+
+def grade_problem(
+    problem_name: str, root: Path | str = ".", stream: ty.TextIO | None = None
+) -> ProblemResult:
+    """
+    Run `scripts/grade.py` of the problem folder `problem_name` inside `root`.
+
+    The output of the test runner is written to `stream` (default to `sys.stdout`).
+    """
+    if isinstance(root, str):
+        root = Path(root)
+    if stream is None:
+        stream = sys.stdout
+
+    current_directory = os.getcwd()
+    current_sys_path = copy.copy(sys.path)
+    try:
+        os.chdir(root / problem_name)
+
+        # Prepare sys.path for module import.
+        sys.path.append(os.getcwd())
+        importlib.invalidate_caches()
+        mod = importlib.import_module("scripts.grade")
+
+        runner = MinimalistTestRunner(stream=stream, resultclass=MinimalistTestResult)
+        test_program = unittest.main(
+            mod, testRunner=runner, argv=[sys.argv[0]], exit=False
+        )
+    finally:
+        os.chdir(current_directory)
+        # Without copy, sys.path will be a ref to current_sys_path.
+        sys.path = copy.copy(current_sys_path)
+        _forget_problem_modules()
+
+    result = ty.cast(MinimalistTestResult, test_program.result)
+    return ProblemResult(
+        name=problem_name,
+        points=result.points,
+        total_points=result.total_points,
+        point_breakdowns=dict(result.point_breakdowns),
+        timings=dict(result.timings),
+    )
+
+
+class _TeeStream(io.StringIO):
+    """Keep a copy of everything written to `stream`."""
+
+    def __init__(self, stream: ty.TextIO) -> None:
+        super().__init__()
+        self.stream = stream
+
+    def write(self, s: str) -> int:
+        self.stream.write(s)
+        return super().write(s)
+
+    def flush(self) -> None:
+        self.stream.flush()
+
+
+def _make_error_result(problem_name: str, exc: BaseException) -> ProblemResult:
+    return ProblemResult(
+        name=problem_name,
+        points=0.0,
+        total_points=0.0,
+        point_breakdowns={},
+        output="".join(traceback.format_exception(exc)),
+        error=f"{type(exc).__name__}: {exc}",
+    )
+
+
+def _grade_problem_captured(problem_name: str, root: str) -> ProblemResult:
+    """Grade a problem and keep everything it prints in `ProblemResult.output`.
+
+    Used by the worker processes, so the output of different problems does not
+    interleave.
+    """
+    stream = io.StringIO()
+    with contextlib.redirect_stdout(stream), contextlib.redirect_stderr(stream):
+        result = grade_problem(problem_name, root, stream=stream)
+    return result._replace(output=stream.getvalue())
+
+
+def grade_problems(
+    problem_names: list[str],
+    root: Path | str = ".",
+    jobs: int = 1,
+    stream: ty.TextIO | None = None,
+    cache: "ResultCache | None" = None,
+    executor: Executor | None = None,
+    keep_going: bool = False,
+) -> list[ProblemResult]:
+    """
+    Grade the problems and return their results in the same order as `problem_names`.
+
+    :param jobs: When greater than 1, each problem is graded in a worker process of
+    a pool with `jobs` processes. The output of a problem is written to `stream`
+    once the problem and all the problems before it are graded.
+    :param cache: If specified, a problem whose content has not changed since it was
+    last graded is not graded again. Its stored result is used instead.
+    :param executor: If specified, the problems are graded by this (process pool)
+    executor instead of a new pool. It is not shut down afterward.
+    :param keep_going: When `True`, an exception (or `SystemExit`) raised while
+    grading a problem is recorded in `ProblemResult.error` of that problem and the
+    next problems are still graded. Otherwise it is raised.
+    """
+    if isinstance(root, str):
+        root = Path(root)
+    if stream is None:
+        stream = sys.stdout
+
+    keys: dict[str, str] = {}
+    cached_results: dict[str, ProblemResult] = {}
+    if cache is not None:
+        for problem_name in problem_names:
+            keys[problem_name] = cache.get_key(root / problem_name)
+            cached_result = cache.get(problem_name, keys[problem_name])
+            if cached_result is not None:
+                cached_results[problem_name] = cached_result
+
+    results: list[ProblemResult] = []
+    if executor is None and jobs <= 1:
+        for idx, problem_name in enumerate(problem_names, start=1):
+            print(f"{idx} - Grading {problem_name} ", file=stream, flush=True)
+            if problem_name in cached_results:
+                result = cached_results[problem_name]
+                stream.write(CACHED_RESULT_TEXT)
+                stream.write(result.output)
+            else:
+                tee_stream = _TeeStream(stream)
+                try:
+                    result = grade_problem(problem_name, root, stream=tee_stream)
+                except (Exception, SystemExit) as e:
+                    if not keep_going:
+                        raise
+                    result = _make_error_result(problem_name, e)
+                    stream.write(result.output)
+                result = result._replace(output=tee_stream.getvalue() + result.output)
+                if cache is not None and result.error is None:
+                    cache.put(keys[problem_name], result)
+            results.append(result)
+            print("\n\n", file=stream, flush=True)
+        return results
+
+    pool: contextlib.AbstractContextManager[Executor] = (
+        ProcessPoolExecutor(max_workers=jobs)
+        if executor is None
+        else contextlib.nullcontext(executor)
+    )
+    with pool as executor:
+        futures: list[Future[ProblemResult] | None] = [
+            None
+            if problem_name in cached_results
+            # Workers have their own cwd, so they must receive an absolute path.
+            else executor.submit(
+                _grade_problem_captured, problem_name, str(root.resolve())
+            )
+            for problem_name in problem_names
+        ]
+        for idx, (problem_name, future) in enumerate(
+            zip(problem_names, futures, strict=True), start=1
+        ):
+            print(f"{idx} - Grading {problem_name} ", file=stream, flush=True)
+            if future is None:
+                result = cached_results[problem_name]
+                stream.write(CACHED_RESULT_TEXT)
+            else:
+                try:
+                    result = future.result()
+                except (Exception, SystemExit) as e:
+                    if not keep_going:
+                        raise
+                    result = _make_error_result(problem_name, e)
+                if cache is not None and result.error is None:
+                    cache.put(keys[problem_name], result)
+            stream.write(result.output)
+            print("\n\n", file=stream, flush=True)
+            results.append(result)
+    return results
+
+
+def grade_homework(
+    path: Path | str = ".",
+    jobs: int = 1,
+    cache: "ResultCache | None" = None,
+    slowest: int = 0,
+    timings_file: Path | str | None = None,
+    stream: ty.TextIO | None = None,
+    executor: Executor | None = None,
+) -> int:
+    """
+    Grade the problems listed in the README.md at `path` and print the summary.
+
+    Return the exit code of the `grade` command, which is 1 when the points are
+    less than the total points and 0 otherwise.
+    """
+    # Steps:
+    # 1. Using mistletoe, parse the README.md in the path for the problem order.
+    #    By extracting the list after the inline code token with `:problem-list:` on a heading token.
+    # 2. Prepare the tests to execute in that order. When the cache is used, skip the problem where the students did not change the content of any file.
+    if isinstance(path, str):
+        path = Path(path)
+    if stream is None:
+        stream = sys.stdout
+
+    problem_names = FindProblemList.from_file(path / "README.md")
+
+    if len(problem_names) == 0:
+        print("No problem found.", file=stream)
+
+    results = grade_problems(
+        problem_names,
+        root=path,
+        jobs=jobs,
+        stream=stream,
+        cache=cache,
+        executor=executor,
+    )
+
+    student_total_points, total_points = print_summary(results, stream=stream)
+    if slowest > 0:
+        print_slowest_tests(results, slowest, stream=stream)
+    if timings_file is not None:
+        write_timings(results, timings_file)
+
+    if student_total_points < total_points:
+        return 1
+    return 0
+
+
+def print_summary(
+    results: list[ProblemResult], stream: ty.TextIO | None = None
+) -> tuple[float, float]:
+    """Print the summary section and return the earned points and the total points."""
+    if stream is None:
+        stream = sys.stdout
+
+    print("==== Summary ====", file=stream)
+    total_points = sum([result.total_points for result in results])
+    student_total_points = 0.0
+    for idx, result in enumerate(results, start=1):
+        print(
+            f"{idx:>3} - {result.name:<30}{result.points:>5} / {result.total_points:>5}",
+            file=stream,
+        )
+        for key, val in result.point_breakdowns.items():
+            print(f"      - {key:<50}{val[0]:>5} / {val[1]:>5}", file=stream)
+        student_total_points += result.points
+    print(f"Total: {student_total_points:>5} / {total_points:>5}", file=stream)
+    return student_total_points, total_points
+
+
+def get_slowest_tests(
+    results: list[ProblemResult], count: int
+) -> list[tuple[str, str, Timing]]:
+    """Return the problem name, test id and timing of the `count` slowest tests by wall time."""
+    items = [
+        (result.name, test_id, timing)
+        for result in results
+        for test_id, timing in (result.timings or {}).items()
+    ]
+    items.sort(key=lambda item: item[2].wall_time, reverse=True)
+    return items[:count]
+
+
+def print_slowest_tests(
+    results: list[ProblemResult], count: int, stream: ty.TextIO | None = None
+) -> None:
+    """Print the `count` slowest tests with their wall time, CPU time and child processes' CPU time."""
+    if stream is None:
+        stream = sys.stdout
+
+    print(f"==== Slowest {count} Tests ====", file=stream)
+    print(f"{'wall':>9}{'cpu':>9}{'children':>9}  test", file=stream)
+    for problem_name, test_id, timing in get_slowest_tests(results, count):
+        print(
+            f"{timing.wall_time:>8.3f}s{timing.cpu_time:>8.3f}s{timing.children_cpu_time:>8.3f}s  {problem_name}: {test_id}",
+            file=stream,
+        )
+
+
+def write_timings(results: list[ProblemResult], path: Path | str) -> None:
+    """Write the timing of every test as a JSON file."""
+    data = {
+        "problems": [
+            {
+                "name": result.name,
+                "tests": [
+                    {"id": test_id, **timing._asdict()}
+                    for test_id, timing in (result.timings or {}).items()
+                ],
+            }
+            for result in results
+        ]
+    }
+    with open(path, "w") as f:
+        json.dump(data, f, indent=2)
+
+
+class SubmissionResult(ty.NamedTuple):
+    """Results of all problems in a student's submission."""
+
+    name: str
+    problems: list[ProblemResult]
+    error: str | None = None
+    output: str = ""
+
+    @property
+    def points(self) -> float:
+        return sum(problem.points for problem in self.problems)
+
+    @property
+    def total_points(self) -> float:
+        return sum(problem.total_points for problem in self.problems)
+
+
+def find_submissions(roster_dir: Path | str) -> list[Path]:
+    """Return the folders in `roster_dir` that have a README.md, sorted by name."""
+    if isinstance(roster_dir, str):
+        roster_dir = Path(roster_dir)
+    return sorted(
+        path
+        for path in roster_dir.iterdir()
+        if path.is_dir() and (path / "README.md").is_file()
+    )
+
+
+def grade_submission(
+    path: Path | str, cache: "ResultCache | None" = None
+) -> SubmissionResult:
+    """
+    Grade every problem listed in the README.md of the submission at `path`.
+
+    Everything printed while grading is kept in `SubmissionResult.output`. An
+    exception (or `SystemExit`, e.g. a module that calls `sys.exit()` when it is
+    imported) raised while grading a problem is recorded in `ProblemResult.error`
+    and the other problems are still graded. Any other exception (e.g. a missing
+    README.md) is recorded in `SubmissionResult.error`, so one broken submission
+    does not stop the batch.
+    """
+    if isinstance(path, str):
+        path = Path(path)
+
+    stream = io.StringIO()
+    problems: list[ProblemResult] = []
+    error = None
+    with contextlib.redirect_stdout(stream), contextlib.redirect_stderr(stream):
+        try:
+            problem_names = FindProblemList.from_file(path / "README.md")
+            problems = grade_problems(
+                problem_names, root=path, stream=stream, cache=cache, keep_going=True
+            )
+        except (Exception, SystemExit) as e:
+            error = f"{type(e).__name__}: {e}"
+    return SubmissionResult(path.name, problems, error, stream.getvalue())
+
+
+def _warm_up_worker() -> None:
+    """Import the heavy modules once per worker instead of once per submission."""
+    importlib.import_module("git")
+    importlib.import_module("grading_lib.makefile")
+    importlib.import_module("grading_lib.repository")
+
+
+def grade_submissions(
+    paths: list[Path], jobs: int = 1, cache: "ResultCache | None" = None
+) -> ty.Iterator[SubmissionResult]:
+    """
+    Grade the submissions with a pool of `jobs` worker processes.
+
+    The workers are re-used across submissions. Results are yielded in the same
+    order as `paths`. When a worker dies (e.g. `os._exit()`), the submission it was
+    grading gets the error and the pool is re-created for the next submissions.
+    """
+    paths = [path.resolve() for path in paths]
+    start = 0
+    while start < len(paths):
+        with ProcessPoolExecutor(
+            max_workers=jobs, initializer=_warm_up_worker
+        ) as executor:
+            futures = [
+                executor.submit(grade_submission, path, cache) for path in paths[start:]
+            ]
+            for future in futures:
+                try:
+                    result = future.result()
+                except BrokenProcessPool:
+                    break
+                start += 1
+                yield result
+            else:
+                return
+
+        # Every pending submission fails with a broken pool, not only the one that
+        # killed its worker. Grading it alone tells which one it was.
+        yield _grade_submission_alone(paths[start], cache)
+        start += 1
+
+
+def _grade_submission_alone(
+    path: Path, cache: "ResultCache | None" = None
+) -> SubmissionResult:
+    with ProcessPoolExecutor(max_workers=1, initializer=_warm_up_worker) as executor:
+        try:
+            return executor.submit(grade_submission, path, cache).result()
+        except BrokenProcessPool as e:
+            return SubmissionResult(path.name, [], f"{type(e).__name__}: {e}")
+
+
+def write_json_report(results: list[SubmissionResult], path: Path | str) -> None:
+    """Write points and point breakdowns of every submission as a JSON file."""
+    data = {
+        "submissions": [
+            {
+                "name": result.name,
+                "points": result.points,
+                "total_points": result.total_points,
+                "error": result.error,
+                "problems": [
+                    {
+                        "name": problem.name,
+                        "points": problem.points,
+                        "total_points": problem.total_points,
+                        "point_breakdowns": problem.point_breakdowns,
+                        "error": problem.error,
+                    }
+                    for problem in result.problems
+                ],
+            }
+            for result in results
+        ]
+    }
+    with open(path, "w") as f:
+        json.dump(data, f, indent=2)
+
+
+def write_csv_report(results: list[SubmissionResult], path: Path | str) -> None:
+    """
+    Write one row per test of every problem of every submission as a CSV file.
+
+    A problem or a submission that could not be graded, or a submission without
+    problems, gets one row with its error (if any) instead, so every submission
+    is in the report.
+    """
+    with open(path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(
+            ["submission", "problem", "test", "points", "total_points", "error"]
+        )
+        for result in results:
+            if result.error is not None or len(result.problems) == 0:
+                writer.writerow([result.name, "", "", "", "", result.error or ""])
+            for problem in result.problems:
+                if problem.error is not None:
+                    writer.writerow(
+                        [result.name, problem.name, "", "", "", problem.error]
+                    )
+                for test_name, (
+                    points,
+                    total_points,
+                ) in problem.point_breakdowns.items():
+                    writer.writerow(
+                        [result.name, problem.name, test_name, points, total_points, ""]
+                    )
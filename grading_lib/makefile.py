@@ -6,17 +6,32 @@ the homework requirement do not need the full
 Makefile to be parsed. So far we only need
 the target names of a rule. If this parser is
 too much to mataintain we can offload checking-
-if-a-target-exist to GNU Make itself as well.
+if-a-target-exist to GNU Make itself as well,
+which is what `Makefile.from_make_database` does.
 """
 
 from __future__ import annotations
 
+import hashlib
+import os
 import re
 import shutil
+import threading
+import typing as ty
 from pathlib import Path
 
-from .common import BaseTestCase, CommandResult, is_debug_mode, run_executable
+from .common import (
+    COMMAND_FAILED_TEXT_TEMPLATE,
+    BaseTestCase,
+    CommandResult,
+    async_run_executable,
+    get_changed_files,
+    is_debug_mode,
+    run_executable,
+    run_many,
+)
 
+# Not used by the parser anymore, kept for the code that imports it.
 RULE_PATTERN = re.compile(
     r"(?P<targets>[\w\.\-%$()\ +]+):(?!=|:=|::=)(?P<prereqs>[\w\.\-%$()\ +]*)"
 )
@@ -25,6 +40,100 @@ RULE_PATTERN = re.compile(
 # Thus, parsing variable definition is dropped in v0.0.3
 VAR_DEF_PATTERN = re.compile(r"(?P<name>[\w\.-]+)\s*(:*|\?|!|\+)?=\s*(?P<value>.*)")
 
+# A line that starts with one of these words is not a rule.
+DIRECTIVES = frozenset(
+    [
+        "ifeq",
+        "ifneq",
+        "ifdef",
+        "ifndef",
+        "else",
+        "endif",
+        "include",
+        "-include",
+        "sinclude",
+        "export",
+        "unexport",
+        "override",
+        "private",
+        "undefine",
+        "vpath",
+        "endef",
+    ]
+)
+INCLUDE_DIRECTIVES = frozenset(["include", "-include", "sinclude"])
+
+
+def _find_top_level(text: str, char: str, start: int = 0) -> int:
+    """
+    Return the index of the first `char` in `text` that is not inside a variable
+    reference like `$(SRC:.c=.o)`, or -1.
+    """
+    if "$" not in text:
+        return text.find(char, start)
+
+    depth = 0
+    for idx in range(start, len(text)):
+        c = text[idx]
+        if c == "(" or c == "{":
+            depth += 1
+        elif c == ")" or c == "}":
+            depth -= 1
+        elif c == char and depth <= 0:
+            return idx
+    return -1
+
+
+def _strip_comment(line: str) -> str:
+    idx = line.find("#")
+    while idx != -1:
+        if idx == 0 or line[idx - 1] != "\\":
+            return line[:idx]
+        idx = line.find("#", idx + 1)
+    return line
+
+
+def _parse_rule_line(line: str) -> Rule | None:
+    """Return the rule of a rule line, or `None` if it is not one."""
+    colon = _find_top_level(line, ":")
+    if colon <= 0:
+        return None
+    # e.g. 'CMD = git push origin :branch' or 'A ?= b:c'
+    if _find_top_level(line[:colon], "=") != -1:
+        return None
+
+    rest = line[colon + 1 :]
+    if rest.startswith("=") or rest.startswith(":="):
+        # ':=', '::=' and ':::=' assignments.
+        return None
+    if rest.startswith(":"):
+        # A double-colon rule.
+        rest = rest[1:]
+
+    semicolon = _find_top_level(rest, ";")
+    recipe: list[str] = []
+    if semicolon != -1:
+        inline_recipe = rest[semicolon + 1 :].strip()
+        if len(inline_recipe) != 0:
+            recipe.append(inline_recipe)
+        rest = rest[:semicolon]
+    rest = _strip_comment(rest)
+
+    if _find_top_level(rest, "=") != -1:
+        # A target-specific variable e.g. 'prog: CFLAGS = -g'.
+        return None
+    # A static pattern rule e.g. 'objs: %.o: %.c', keep the prerequisite patterns.
+    if (second_colon := _find_top_level(rest, ":")) != -1:
+        rest = rest[second_colon + 1 :]
+
+    target_tokens = line[:colon].split()
+    if len(target_tokens) == 0:
+        return None
+    targets: str | list[str] = (
+        target_tokens[0] if len(target_tokens) == 1 else target_tokens
+    )
+    return Rule(targets=targets, prerequisites=rest.split(), recipe=recipe)
+
 
 def run_targets(
     targets: list[str],
@@ -43,6 +152,152 @@ def run_targets(
     )
 
 
+async def async_run_targets(
+    targets: list[str],
+    makefile_name: str = "answer.mk",
+    cwd: str | Path | None = None,
+    timeout: float = 15.0,
+) -> CommandResult:
+    """
+    Coroutine version of `run_targets`.
+    """
+    return await async_run_executable(
+        ["make", "-f", makefile_name, *targets], cwd=cwd, timeout=timeout
+    )
+
+
+# Lines of `make --trace` that tell which target the following recipe belongs to,
+# e.g. "answer.mk:7: update target 'main.o' due to: main.c".
+TRACE_LINE_PATTERN = re.compile(r"^.+?:\d+: (?:update )?target '(?P<target>.+?)' ")
+MAKE_MESSAGE_PATTERN = re.compile(r"^make(?:\[\d+\])?: (?P<message>.*)$")
+NO_RULE_PATTERN = re.compile(r"No rule to make target '(?P<target>.+?)'")
+NOTHING_TO_BE_DONE_PATTERN = re.compile(r"Nothing to be done for '(?P<target>.+?)'")
+# An error of make itself (e.g. "answer.mk:2: *** missing separator.  Stop."), not
+# the output of a recipe.
+MAKE_ERROR_PATTERN = re.compile(
+    r"^(?:make(?:\[\d+\])?|[^\s:]+:\d+): \*\*\* (?P<message>.*?)(?:  Stop\.)?$"
+)
+
+
+class DryRunResult(ty.NamedTuple):
+    """
+    What make would run for the targets.
+
+    :ivar recipes: The commands, as make would run them, of every target that would
+    be made, including the prerequisites of the requested targets. A requested
+    target that exists but has nothing to run (e.g. a phony target with only
+    prerequisites) maps to an empty list.
+    :ivar missing: Requested targets and prerequisites that have no rule.
+    :ivar errors: Lines of the other errors of make (e.g. a syntax error of the
+    Makefile). When there are some, `recipes` may be incomplete.
+    """
+
+    success: bool
+    command: str
+    output: str
+    recipes: dict[str, list[str]]
+    missing: list[str]
+    errors: list[str]
+
+
+def dry_run_targets(
+    targets: list[str],
+    makefile_name: str = "answer.mk",
+    cwd: str | Path | None = None,
+    timeout: float = 15.0,
+) -> DryRunResult:
+    """
+    Find what make would run for each of the targets with one make call.
+
+    Make runs with `--just-print --always-make --keep-going --trace`, so every
+    target is considered out of date and the recipes are printed instead of run.
+    Note that, like with `make -n`, recipe lines with `$(MAKE)` or a `+` prefix are
+    still run.
+    """
+    result = run_executable(
+        [
+            "make",
+            "--just-print",
+            "--always-make",
+            "--keep-going",
+            "--trace",
+            "-f",
+            makefile_name,
+            *targets,
+        ],
+        cwd=cwd,
+        timeout=timeout,
+        # The messages are parsed, so they must be in English.
+        env={**os.environ, "LC_ALL": "C"},
+    )
+
+    recipes: dict[str, list[str]] = {}
+    missing: list[str] = []
+    errors: list[str] = []
+    current_recipe: list[str] | None = None
+    continued = False
+    for line in result.output.splitlines():
+        if continued and current_recipe is not None:
+            # The rest of a command that ends with a backslash.
+            current_recipe[-1] += "\n" + line
+            continued = line.endswith("\\")
+            continue
+
+        if (res := MAKE_ERROR_PATTERN.match(line)) is not None:
+            if NO_RULE_PATTERN.search(res.group("message")) is None:
+                errors.append(line)
+                current_recipe = None
+                continue
+
+        if (res := TRACE_LINE_PATTERN.match(line)) is not None:
+            current_recipe = recipes.setdefault(res.group("target"), [])
+            continue
+        if (res := MAKE_MESSAGE_PATTERN.match(line)) is not None:
+            current_recipe = None
+            message = res.group("message")
+            if (res := NO_RULE_PATTERN.search(message)) is not None:
+                if res.group("target") not in missing:
+                    missing.append(res.group("target"))
+            elif (res := NOTHING_TO_BE_DONE_PATTERN.search(message)) is not None:
+                recipes.setdefault(res.group("target"), [])
+            continue
+
+        if current_recipe is not None:
+            current_recipe.append(line)
+            continued = line.endswith("\\")
+
+    # A target with only prerequisites prints nothing of its own.
+    for target in targets:
+        if target not in missing:
+            recipes.setdefault(target, [])
+
+    return DryRunResult(
+        result.success, result.command, result.output, recipes, missing, errors
+    )
+
+
+def run_many_targets(
+    targets_list: list[list[str]],
+    makefile_name: str = "answer.mk",
+    cwd: str | Path | None = None,
+    timeout: float = 15.0,
+    concurrency: int = 4,
+) -> list[CommandResult]:
+    """
+    Invoke each list of target(s) in its own make call, with at most `concurrency`
+    calls at a time.
+
+    Return the results in the same order as `targets_list`. Only use it for
+    targets that do not write the same files.
+    """
+    return run_many(
+        [["make", "-f", makefile_name, *targets] for targets in targets_list],
+        concurrency=concurrency,
+        cwd=cwd,
+        timeout=timeout,
+    )
+
+
 class Rule:
     def __init__(
         self, targets: str | list[str], prerequisites: list[str], recipe: list[str]
@@ -75,6 +330,192 @@ class VariableDefinition:
         self.value = value
 
 
+# Targets with a special meaning to GNU Make. They are not part of the graph.
+SPECIAL_TARGETS = frozenset(
+    [
+        ".PHONY",
+        ".SUFFIXES",
+        ".DEFAULT",
+        ".PRECIOUS",
+        ".INTERMEDIATE",
+        ".NOTINTERMEDIATE",
+        ".SECONDARY",
+        ".SECONDEXPANSION",
+        ".DELETE_ON_ERROR",
+        ".IGNORE",
+        ".LOW_RESOLUTION_TIME",
+        ".SILENT",
+        ".EXPORT_ALL_VARIABLES",
+        ".NOTPARALLEL",
+        ".ONESHELL",
+        ".POSIX",
+    ]
+)
+
+
+def _find_strongly_connected_components(
+    adjacency: dict[str, list[str]],
+) -> list[list[str]]:
+    """
+    Return the strongly connected components of the graph (Tarjan's algorithm).
+
+    A component comes after every component reachable from it, i.e. prerequisites
+    come before their targets.
+    """
+    index: dict[str, int] = {}
+    low: dict[str, int] = {}
+    stack: list[str] = []
+    on_stack: set[str] = set()
+    components: list[list[str]] = []
+
+    for root in adjacency:
+        if root in index:
+            continue
+
+        index[root] = low[root] = len(index)
+        stack.append(root)
+        on_stack.add(root)
+        # Iterative, so a long chain of rules does not hit the recursion limit.
+        work = [(root, iter(adjacency[root]))]
+        while len(work) != 0:
+            node, children = work[-1]
+            for child in children:
+                if child not in index:
+                    index[child] = low[child] = len(index)
+                    stack.append(child)
+                    on_stack.add(child)
+                    work.append((child, iter(adjacency[child])))
+                    break
+                if child in on_stack:
+                    low[node] = min(low[node], index[child])
+            else:
+                work.pop()
+                if len(work) != 0:
+                    parent = work[-1][0]
+                    low[parent] = min(low[parent], low[node])
+                if low[node] == index[node]:
+                    component = []
+                    while True:
+                        member = stack.pop()
+                        on_stack.discard(member)
+                        component.append(member)
+                        if member == node:
+                            break
+                    components.append(component)
+    return components
+
+
+class RuleGraph:
+    """
+    The graph between the targets of a Makefile and their prerequisites.
+
+    Every query is answered from tables computed when the graph is built. Special
+    targets (e.g. `.PHONY`) and pattern rules are not part of the graph.
+
+    :ivar targets: Names that have a rule.
+    :ivar phony_targets: Prerequisites of `.PHONY`.
+    :ivar topological_order: Every name, a prerequisite before its targets. Names
+    in a cycle are next to each other in no particular order.
+    :ivar cycles: Each list is a set of names that depend on each other, i.e. the
+    circular dependencies that GNU Make drops.
+    """
+
+    def __init__(self, rules: list[Rule]) -> None:
+        # A dict keeps the order of the prerequisites and drops the duplicates.
+        edges: dict[str, dict[str, None]] = {}
+        targets: set[str] = set()
+        phony_targets: set[str] = set()
+        for rule in rules:
+            rule_targets = (
+                [rule.targets] if isinstance(rule.targets, str) else rule.targets
+            )
+            for target in rule_targets:
+                if target == ".PHONY":
+                    phony_targets.update(rule.prerequisites)
+                if target in SPECIAL_TARGETS or "%" in target:
+                    continue
+                targets.add(target)
+                target_prerequisites = edges.setdefault(target, {})
+                for prerequisite in rule.prerequisites:
+                    target_prerequisites[prerequisite] = None
+                    edges.setdefault(prerequisite, {})
+        adjacency = {name: list(prerequisites) for name, prerequisites in edges.items()}
+
+        self.targets = frozenset(targets)
+        self.phony_targets = frozenset(phony_targets)
+        self._prerequisites = {
+            name: frozenset(prerequisites) for name, prerequisites in adjacency.items()
+        }
+
+        components = _find_strongly_connected_components(adjacency)
+        self.topological_order = [
+            name for component in components for name in component
+        ]
+        self.cycles = [
+            component
+            for component in components
+            if len(component) > 1 or component[0] in self._prerequisites[component[0]]
+        ]
+
+        # The names in a component reach each other, so they share their set.
+        self._all_prerequisites: dict[str, frozenset[str]] = {}
+        for component in components:
+            reachable: set[str] = set()
+            for name in component:
+                for prerequisite in adjacency[name]:
+                    reachable.add(prerequisite)
+                    if prerequisite not in component:
+                        reachable.update(self._all_prerequisites[prerequisite])
+            frozen = frozenset(reachable)
+            for name in component:
+                self._all_prerequisites[name] = frozen
+
+        dependents: dict[str, set[str]] = {name: set() for name in adjacency}
+        for name, prerequisites in adjacency.items():
+            for prerequisite in prerequisites:
+                dependents[prerequisite].add(name)
+        self._dependents = {
+            name: frozenset(names) for name, names in dependents.items()
+        }
+        self._all_dependents: dict[str, frozenset[str]] = {}
+        for component in reversed(components):
+            reachable = set()
+            for name in component:
+                for dependent in dependents[name]:
+                    reachable.add(dependent)
+                    if dependent not in component:
+                        reachable.update(self._all_dependents[dependent])
+            frozen = frozenset(reachable)
+            for name in component:
+                self._all_dependents[name] = frozen
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._prerequisites
+
+    def get_prerequisites(self, target: str, transitive: bool = True) -> frozenset[str]:
+        """
+        Return the prerequisites of `target`, and theirs when `transitive` is `True`.
+
+        Return an empty set for a name that is not in the graph.
+        """
+        table = self._all_prerequisites if transitive else self._prerequisites
+        return table.get(target, frozenset())
+
+    def get_dependents(self, name: str, transitive: bool = True) -> frozenset[str]:
+        """
+        Return the targets that have `name` as a prerequisite, and theirs when
+        `transitive` is `True`, i.e. the targets that are rebuilt when `name` changes.
+        """
+        table = self._all_dependents if transitive else self._dependents
+        return table.get(name, frozenset())
+
+    def depends_on(
+        self, target: str, prerequisite: str, transitive: bool = True
+    ) -> bool:
+        """Return `True` if `prerequisite` is one of `get_prerequisites(target)`."""
+        return prerequisite in self.get_prerequisites(target, transitive=transitive)
+
+
 class Makefile:
     """
     A high-level representation of a Makefile.
@@ -89,89 +530,427 @@ class Makefile:
         self,
         path: Path | str,
         rules: list[Rule],
+        includes: list[str] | None = None,
+        variables: dict[str, str] | None = None,
     ):
         self.path = path
         self.rules = rules
+        # The operands of the include directives, as written.
+        self.includes = includes if includes is not None else []
+        # Only filled by `from_make_database`.
+        self.variables = variables if variables is not None else {}
+        self._graph: RuleGraph | None = None
+
+        # Lookup tables built once, so the rules are not scanned for every lookup.
+        # They do not follow later changes to `rules`.
+        self._rule_by_targets: dict[str | tuple[str, ...], Rule] = {}
+        self._rules_by_target: dict[str, list[Rule]] = {}
+        for rule in rules:
+            targets = rule.targets
+            if isinstance(targets, str):
+                self._rule_by_targets.setdefault(targets, rule)
+                self._rules_by_target.setdefault(targets, []).append(rule)
+            else:
+                self._rule_by_targets.setdefault(tuple(targets), rule)
+                for target in targets:
+                    self._rules_by_target.setdefault(target, []).append(rule)
 
     @classmethod
     def from_path(cls, path: Path | str) -> Makefile:
         with open(path) as f:
             content = f.read()
-            return cls.from_text(content)
+            makefile = cls.from_text(content)
+            makefile.path = path
+            return makefile
+
+    @classmethod
+    def from_path_cached(cls, path: Path | str) -> Makefile:
+        """
+        Same as `from_path`, but the parsed Makefile is shared within the process
+        until the file or one of the files it includes changes.
+
+        The returned instance is shared, so it must not be modified.
+        """
+        return _makefile_cache.get(path)
+
+    @classmethod
+    def from_make_database(cls, path: Path | str) -> Makefile:
+        """
+        Parse the database that GNU Make prints for the Makefile at `path`.
+
+        GNU Make runs once in the folder of the Makefile, without running any
+        recipe and without its built-in rules. Unlike `from_text`, the result is
+        what GNU Make sees: the files of `include` are read, the prerequisites are
+        expanded, a static pattern rule becomes one rule per target, so does a rule
+        with several targets, and `variables` holds the expanded value of every
+        variable defined by the Makefiles. Pattern rules are included. The rules
+        are in the order of the database, not of the Makefile.
+
+        Expanding the variables runs their `$(shell ...)`.
+
+        The result is cached like `from_path_cached`, so the returned instance must
+        not be modified. Raise `ValueError` when GNU Make cannot read the Makefile.
+        """
+        return _makefile_cache.get(path, from_make_database=True)
 
     @classmethod
     def from_text(cls, text: str) -> Makefile:
+        """
+        Parse the rules of a Makefile.
+
+        Lines ending with a backslash are joined with the next line. A line that
+        starts with a tab after a rule is part of its recipe, so is an indented line
+        that directly follows a rule or its recipe. Variable definitions, directives
+        and `define` blocks are skipped. A target may have several rules.
+        """
         DEBUG: bool = is_debug_mode()
 
         rules: list[Rule] = []
-
-        lines = [line.replace("\r", "") for line in text.split("\n")]
+        includes: list[str] = []
         current_rule: Rule | None = None
-        for line in lines:
-            line = line.strip()
+        lines = text.splitlines()
+        line_count = len(lines)
+        idx = 0
+        while idx < line_count:
+            line = lines[idx]
+            idx += 1
+
+            # Join the continuation lines.
+            if line.endswith("\\"):
+                parts = [line]
+                while (
+                    idx < line_count
+                    and parts[-1].endswith("\\")
+                    and (len(parts[-1]) - len(parts[-1].rstrip("\\"))) % 2 == 1
+                ):
+                    parts.append(lines[idx])
+                    idx += 1
+                if line.startswith("\t") and current_rule is not None:
+                    # The shell sees the backslash-newline, so keep it.
+                    line = "\n".join(
+                        [
+                            line,
+                            *(
+                                part[1:] if part.startswith("\t") else part
+                                for part in parts[1:]
+                            ),
+                        ]
+                    )
+                else:
+                    line = " ".join(part.rstrip("\\").strip() for part in parts)
 
             if DEBUG:
                 print(f"parsing '{line}'")
 
-            if len(line.strip()) != 0:
-                if line[0] == "#":
-                    if DEBUG:
-                        print("  line is a comment")
-                    continue
-                if (res := re.match(RULE_PATTERN, line)) is not None:
-                    if current_rule is not None:
-                        # conclude the current rule, if there is any.
-                        rules.append(current_rule)
-                        current_rule = None
-
-                    target_token = res.group("targets")
-                    prereq_token = res.group("prereqs")
-
-                    if " " in target_token:
-                        targets = target_token.split(" ")
-                    else:
-                        targets = target_token
-
-                    prereqs = [
-                        t.strip()
-                        for t in prereq_token.split(" ")
-                        if len(t.strip()) != 0
-                    ]
-                    current_rule = Rule(
-                        targets=targets, prerequisites=prereqs, recipe=list()
-                    )
-                elif current_rule is not None:
-                    # Everything else will be marked as part of the rule
-                    # if we are in one.
+            if line.startswith("\t") and current_rule is not None:
+                recipe_line = line.strip()
+                if len(recipe_line) != 0 and recipe_line[0] != "#":
                     if DEBUG:
                         print("  line is part of the rule")
+                    current_rule.recipe.append(recipe_line)
+                continue
 
-                    current_rule.recipe.append(line)
-                else:
-                    if DEBUG:
-                        print("  no current rule, ignore this line")
-                    pass
+            stripped = line.strip()
+            if len(stripped) == 0 or stripped[0] == "#":
+                # They do not end the rule.
+                continue
+
+            first_word = stripped.split(None, 1)[0]
+            if first_word == "define":
+                # Skip the body of a multi-line variable.
+                while idx < line_count and lines[idx].strip() != "endef":
+                    idx += 1
+                idx += 1
+                current_rule = None
+                continue
+            if first_word in DIRECTIVES:
+                if first_word in INCLUDE_DIRECTIVES:
+                    includes.extend(_strip_comment(stripped).split()[1:])
+                current_rule = None
+                continue
+
+            if ":" in stripped and (rule := _parse_rule_line(stripped)) is not None:
+                if DEBUG:
+                    print(f"  line is a rule of '{rule}'")
+                rules.append(rule)
+                current_rule = rule
+            elif current_rule is not None and line[0] == " ":
+                # A recipe indented with spaces instead of a tab.
+                if DEBUG:
+                    print("  line is part of the rule")
+                current_rule.recipe.append(_strip_comment(stripped).strip())
             else:
-                if current_rule is not None:
-                    # Closing the rule when an empty line is found.
-                    rules.append(current_rule)
-                    current_rule = None
+                if DEBUG:
+                    print("  not a rule, ignore this line")
+                current_rule = None
 
-        if current_rule is not None:
-            rules.append(current_rule)
-        return cls("memory://Makefile", rules)
+        return cls("memory://Makefile", rules, includes=includes)
 
     def get_rule(self, targets: str | list[str]) -> Rule | None:
-        for rule in self.rules:
-            if rule.targets == targets:
-                return rule
+        """
+        Return the first rule whose targets are exactly `targets`, or `None`.
 
-        return None
+        A rule with several targets is found with the list of its targets. Use
+        `get_rules` to find every rule of a target.
+        """
+        if isinstance(targets, str):
+            return self._rule_by_targets.get(targets)
+        return self._rule_by_targets.get(tuple(targets))
+
+    def get_rules(self, target: str) -> list[Rule]:
+        """Return every rule that has `target` as one of its targets, in order."""
+        return list(self._rules_by_target.get(target, []))
 
     def has_rule(self, targets: str | list[str]) -> bool:
         rule = self.get_rule(targets)
         return rule is not None
 
+    def graph(self) -> RuleGraph:
+        """
+        Return the graph between the targets and their prerequisites.
+
+        It is built on the first call. With `from_text`, the names are as written,
+        so use `from_make_database` when the Makefile uses variables in its rules.
+        """
+        if self._graph is None:
+            self._graph = RuleGraph(self.rules)
+        return self._graph
+
+
+# A target added with --eval to print the expanded value of the variables.
+_VARIABLES_TARGET = "__grading_lib_variables__"
+_VARIABLE_MARKER = "@@grading-lib-variable@@"
+_VARIABLES_END_MARKER = "@@grading-lib-variables-end@@"
+_VARIABLES_EVAL = (
+    f"{_VARIABLES_TARGET}: ; @:$(foreach v,$(.VARIABLES),"
+    "$(if $(filter file override,$(origin $(v))),"
+    f"$(info {_VARIABLE_MARKER} $(v)=$($(v)))))$(info {_VARIABLES_END_MARKER})"
+    # So the first rule of the Makefile is still the default goal.
+    "\n.DEFAULT_GOAL :="
+)
+# Variables that GNU Make defines itself.
+_MAKE_VARIABLES = frozenset(
+    ["MAKEFLAGS", "GNUMAKEFLAGS", "CURDIR", "SHELL", ".SHELLSTATUS", "MAKEFILE_LIST"]
+)
+
+
+def _read_make_database(path: Path, timeout: float = 15.0) -> Makefile:
+    """Run GNU Make once and parse its database. See `Makefile.from_make_database`."""
+    result = run_executable(
+        [
+            "make",
+            "--print-data-base",
+            "--just-print",
+            "--no-builtin-rules",
+            "-f",
+            path.name,
+            f"--eval={_VARIABLES_EVAL}",
+            _VARIABLES_TARGET,
+        ],
+        cwd=path.parent,
+        timeout=timeout,
+        max_output_bytes=None,
+        # The database is printed in English only.
+        env={**os.environ, "LC_ALL": "C"},
+    )
+    if not result.success:
+        raise ValueError(f"GNU Make cannot read '{path}'.\n\n{result.output}")
+
+    variables: dict[str, str] = {}
+    rules: list[Rule] = []
+    section = None
+    lines = result.output.splitlines()
+    line_count = len(lines)
+    idx = 0
+    while idx < line_count:
+        line = lines[idx]
+        idx += 1
+
+        if line.startswith(_VARIABLE_MARKER):
+            name, _, value = line[len(_VARIABLE_MARKER) + 1 :].partition("=")
+            # A value with newlines (a define) continues until the next marker.
+            while (
+                idx < line_count
+                and not lines[idx].startswith(_VARIABLE_MARKER)
+                and lines[idx] != _VARIABLES_END_MARKER
+            ):
+                value += "\n" + lines[idx]
+                idx += 1
+            variables[name] = value
+            continue
+
+        if line.startswith("# ") and not line.startswith("#  "):
+            if line in ("# Implicit Rules", "# Files"):
+                section = line
+                continue
+            if line == "# Not a target:":
+                # Skip the entry, it ends with an empty line.
+                while idx < line_count and len(lines[idx]) != 0:
+                    idx += 1
+                continue
+            if section is not None and line.startswith("# VPATH"):
+                section = None
+            continue
+        if section is None or len(line) == 0 or line[0] in "#\t":
+            continue
+
+        rule = _parse_rule_line(line)
+        if rule is None:
+            # e.g. a target-specific variable.
+            continue
+        if "|" in rule.prerequisites:
+            # Keep the order-only prerequisites as well.
+            rule.prerequisites.remove("|")
+        # The recipe is the lines that start with a tab until the end of the entry.
+        while idx < line_count and len(lines[idx]) != 0:
+            if lines[idx].startswith("\t"):
+                rule.recipe.append(lines[idx][1:])
+            idx += 1
+        if rule.targets != _VARIABLES_TARGET:
+            rules.append(rule)
+
+    makefile_list = variables.get("MAKEFILE_LIST", "").split()
+    for name in _MAKE_VARIABLES:
+        variables.pop(name, None)
+    return Makefile(path, rules, includes=makefile_list[1:], variables=variables)
+
+
+class _FileState(ty.NamedTuple):
+    # (size, mtime_ns, inode), or None if the file does not exist.
+    signature: tuple[int, int, int] | None
+    # SHA256 of the content, or None if the file does not exist.
+    digest: str | None
+
+
+def _get_file_signature(path: Path) -> tuple[int, int, int] | None:
+    try:
+        stat = path.stat()
+    except (FileNotFoundError, NotADirectoryError):
+        return None
+    return (stat.st_size, stat.st_mtime_ns, stat.st_ino)
+
+
+def _get_file_digest(path: Path) -> str | None:
+    try:
+        with open(path, "rb") as f:
+            return hashlib.sha256(f.read()).hexdigest()
+    except (FileNotFoundError, NotADirectoryError):
+        return None
+
+
+class _MakefileCache:
+    """
+    Parsed Makefiles of this process, keyed by their resolved path and the backend
+    (`from_text` or GNU Make's database).
+
+    An entry is re-used while the (size, mtime_ns, inode) of the Makefile and of
+    the files it includes (recursively) do not change. When they do, e.g. when a
+    file is copied over with the same content, the content is compared before the
+    Makefile is parsed again.
+    """
+
+    def __init__(self) -> None:
+        self._entries: dict[
+            tuple[Path, bool], tuple[Makefile, dict[Path, _FileState]]
+        ] = {}
+        self._lock = threading.Lock()
+
+    def get(self, path: Path | str, from_make_database: bool = False) -> Makefile:
+        path = Path(path).resolve()
+        key = (path, from_make_database)
+        with self._lock:
+            entry = self._entries.get(key)
+
+        if entry is not None:
+            makefile, states = entry
+            if all(
+                _get_file_signature(file_path) == state.signature
+                for file_path, state in states.items()
+            ):
+                return makefile
+            if all(
+                _get_file_digest(file_path) == state.digest
+                for file_path, state in states.items()
+            ):
+                states = {
+                    file_path: state._replace(signature=_get_file_signature(file_path))
+                    for file_path, state in states.items()
+                }
+                with self._lock:
+                    self._entries[key] = (makefile, states)
+                return makefile
+
+        makefile, states = self._load(path, from_make_database)
+        with self._lock:
+            self._entries[key] = (makefile, states)
+        return makefile
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    @staticmethod
+    def _load(
+        path: Path, from_make_database: bool
+    ) -> tuple[Makefile, dict[Path, _FileState]]:
+        # The signature is taken before reading, so a change while reading is seen
+        # as a change next time.
+        signature = _get_file_signature(path)
+        with open(path, "rb") as f:
+            content = f.read()
+        makefile = Makefile.from_text(content.decode())
+        makefile.path = path
+        states = {path: _FileState(signature, hashlib.sha256(content).hexdigest())}
+
+        # GNU Make looks for the included files in its working directory, which is
+        # the folder of the Makefile in the homework.
+        pending = list(makefile.includes)
+        while len(pending) != 0:
+            name = pending.pop()
+            if "$" in name:
+                # Cannot be resolved without evaluating the variables.
+                continue
+            if any(c in name for c in "*?["):
+                file_paths = sorted(path.parent.glob(name))
+            else:
+                file_paths = [path.parent / name]
+
+            for file_path in file_paths:
+                file_path = file_path.resolve()
+                if file_path in states:
+                    continue
+                signature = _get_file_signature(file_path)
+                try:
+                    with open(file_path, "rb") as f:
+                        included_content = f.read()
+                except (FileNotFoundError, NotADirectoryError):
+                    # Watched too, the Makefile may behave differently once it exists.
+                    states[file_path] = _FileState(None, None)
+                    continue
+                states[file_path] = _FileState(
+                    signature, hashlib.sha256(included_content).hexdigest()
+                )
+                pending.extend(Makefile.from_text(included_content.decode()).includes)
+
+        if from_make_database:
+            makefile = _read_make_database(path)
+            # GNU Make resolves the includes with variables too.
+            for name in makefile.includes:
+                file_path = (path.parent / name).resolve()
+                if file_path not in states:
+                    states[file_path] = _FileState(
+                        _get_file_signature(file_path), _get_file_digest(file_path)
+                    )
+        return makefile, states
+
+
+_makefile_cache = _MakefileCache()
+
+
+def clear_makefile_cache() -> None:
+    """Forget every Makefile parsed by `Makefile.from_path_cached`."""
+    _makefile_cache.clear()
+
 
 class MakefileBaseTestCase(BaseTestCase):
     makefile_path: str | Path
@@ -189,7 +968,8 @@ class MakefileBaseTestCase(BaseTestCase):
             cls.makefile_path.exists()
         ), f"Expect a file '{cls.makefile_path}', but it does not exist."
 
-        cls.makefile = Makefile.from_path(cls.makefile_path)
+        # Test classes of the same Makefile share the parsed one.
+        cls.makefile = Makefile.from_path_cached(cls.makefile_path)
 
     def copy_makefile(
         self, dest: Path | None = None, as_name: str = "answer.mk"
@@ -225,3 +1005,153 @@ class MakefileBaseTestCase(BaseTestCase):
         if not rule.is_empty():
             msg = msg_template.format(target_name=target_name)
             raise self.failureException(msg)
+
+    def assertTargetDependsOn(
+        self,
+        target_name: str,
+        prerequisite: str,
+        transitive: bool = True,
+        msg_template: str = "Target '{target_name}' does not depend on '{prerequisite}'.",
+    ) -> None:
+        """
+        The target must have `prerequisite` as a prerequisite, directly or (when
+        `transitive` is `True`) through other targets.
+        """
+        if not self.makefile.graph().depends_on(
+            target_name, prerequisite, transitive=transitive
+        ):
+            msg = msg_template.format(
+                target_name=target_name, prerequisite=prerequisite
+            )
+            raise self.failureException(msg)
+
+    def assertTargetDoesNotDependOn(
+        self,
+        target_name: str,
+        prerequisite: str,
+        transitive: bool = True,
+        msg_template: str = "Target '{target_name}' should not depend on '{prerequisite}'.",
+    ) -> None:
+        if self.makefile.graph().depends_on(
+            target_name, prerequisite, transitive=transitive
+        ):
+            msg = msg_template.format(
+                target_name=target_name, prerequisite=prerequisite
+            )
+            raise self.failureException(msg)
+
+    def assertTargetsRebuiltWhenChanged(
+        self,
+        name: str,
+        target_names: list[str],
+        msg_template: str = "Targets {missing} are not rebuilt when '{name}' changes.",
+    ) -> None:
+        """
+        Every target in `target_names` must depend on `name`, so they are rebuilt when
+        it changes.
+        """
+        dependents = self.makefile.graph().get_dependents(name)
+        missing = [target for target in target_names if target not in dependents]
+        if len(missing) != 0:
+            msg = msg_template.format(
+                name=name, missing=", ".join(f"'{target}'" for target in missing)
+            )
+            raise self.failureException(msg)
+
+    def assertNoCircularDependency(
+        self,
+        msg_template: str = "The Makefile has circular dependencies: {cycles}.",
+    ) -> None:
+        cycles = self.makefile.graph().cycles
+        if len(cycles) != 0:
+            msg = msg_template.format(
+                cycles="; ".join(" <-> ".join(sorted(cycle)) for cycle in cycles)
+            )
+            raise self.failureException(msg)
+
+    def dry_run_makefile(self, target_names: list[str]) -> DryRunResult:
+        """Return what make would run for the targets of the student's Makefile."""
+        makefile_path = Path(self.makefile_path)
+        return dry_run_targets(
+            target_names, makefile_name=makefile_path.name, cwd=makefile_path.parent
+        )
+
+    def _check_dry_run(self, result: DryRunResult) -> None:
+        """Fail with the output of make when it stops for a reason other than a missing rule."""
+        if not result.success and len(result.errors) != 0:
+            msg = COMMAND_FAILED_TEXT_TEMPLATE.format(
+                command=result.command, output=result.output
+            )
+            raise self.failureException(msg)
+
+    def assertTargetsCanBeMade(
+        self,
+        target_names: list[str],
+        msg_template: str = "Make does not know how to make {missing}. Their behavior cannot be verified.",
+    ) -> None:
+        """
+        Make must know how to make every target in `target_names`, with a rule or
+        with a pattern rule. All of them are checked with one make call.
+        """
+        result = self.dry_run_makefile(target_names)
+        self._check_dry_run(result)
+        if len(result.missing) != 0:
+            msg = msg_template.format(
+                missing=", ".join(f"'{target}'" for target in result.missing)
+            )
+            raise self.failureException(msg)
+
+    def assertTargetRunsCommand(
+        self,
+        target_name: str,
+        command: str,
+        msg_template: str = "Target '{target_name}' does not run '{command}'. It runs:\n{recipe}",
+    ) -> None:
+        """
+        One of the commands that make would run for `target_name` (after expanding
+        the variables) must contain `command`.
+        """
+        result = self.dry_run_makefile([target_name])
+        self._check_dry_run(result)
+        if target_name in result.missing:
+            msg = f"Rule for a target '{target_name}' does not exist. Its behavior cannot be verified."
+            raise self.failureException(msg)
+
+        recipe = result.recipes[target_name]
+        if not any(command in line for line in recipe):
+            msg = msg_template.format(
+                target_name=target_name,
+                command=command,
+                recipe="\n".join(recipe) if len(recipe) != 0 else "(nothing)",
+            )
+            raise self.failureException(msg)
+
+    def assertTargetsRebuilt(
+        self,
+        before: dict[str, int],
+        after: dict[str, int],
+        target_names: list[str],
+        msg_template: str = "Targets {names} are not rebuilt.",
+    ) -> None:
+        """
+        The targets must be new or have a different mtime in the `after` snapshot (see
+        `grading_lib.common.MtimeController`).
+        """
+        changed = get_changed_files(before, after)
+        names = [name for name in target_names if name not in changed]
+        if len(names) != 0:
+            msg = msg_template.format(names=", ".join(f"'{name}'" for name in names))
+            raise self.failureException(msg)
+
+    def assertTargetsNotRebuilt(
+        self,
+        before: dict[str, int],
+        after: dict[str, int],
+        target_names: list[str],
+        msg_template: str = "Targets {names} are rebuilt, but they are up to date.",
+    ) -> None:
+        changed = get_changed_files(before, after)
+        names = [name for name in target_names if name in changed]
+        if len(names) != 0:
+            msg = msg_template.format(names=", ".join(f"'{name}'" for name in names))
+            raise self.failureException(msg)
@@ -10,7 +10,13 @@ from git import Head, Repo, Tag
 from git.repo.fun import is_git_dir
 from typing_extensions import Self
 
-from .common import BaseTestCase, CommandResult, run_executable
+from .common import (
+    BaseTestCase,
+    CommandResult,
+    async_run_executable,
+    run_executable,
+    run_many,
+)
 
 
 def ensure_git_author_identity(
@@ -144,6 +150,32 @@ class Repository:
             args, cwd=str(self.repo.working_tree_dir), timeout=timeout
         )
 
+    async def async_run_executable(
+        self, args: list[str], timeout: float = 15.0
+    ) -> CommandResult:
+        """
+        Coroutine version of `run_executable`.
+        """
+        return await async_run_executable(
+            args, cwd=str(self.repo.working_tree_dir), timeout=timeout
+        )
+
+    def run_many(
+        self, commands: list[list[str]], concurrency: int = 4, timeout: float = 15.0
+    ) -> list[CommandResult]:
+        """
+        Run independent commands using repository's working directory as cwd.
+
+        Return the results in the same order as `commands`. Commands that change the
+        repository (e.g. `git commit`) must not be run together since Git locks the index.
+        """
+        return run_many(
+            commands,
+            concurrency=concurrency,
+            cwd=str(self.repo.working_tree_dir),
+            timeout=timeout,
+        )
+
     def create_and_add_random_file(
         self, name: str | None = None, content: str | None = None
     ) -> str:
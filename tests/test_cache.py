@@ -0,0 +1,85 @@
+import os
+import time
+from pathlib import Path
+
+import grading_lib.cache
+from grading_lib.cache import ResultCache, fingerprint_problem
+from grading_lib.grading import ProblemResult
+
+
+def test_fingerprint_problem(tmp_path) -> None:
+    (tmp_path / "scripts").mkdir()
+    (tmp_path / "scripts" / "grade.py").write_text("# grading script")
+    (tmp_path / "answer.sh").write_text("git status")
+
+    key = fingerprint_problem(tmp_path)
+    assert key == fingerprint_problem(str(tmp_path))
+
+    # Cache folders of Python do not change the key.
+    (tmp_path / "scripts" / "__pycache__").mkdir()
+    (tmp_path / "scripts" / "__pycache__" / "grade.pyc").write_bytes(b"\0")
+    assert key == fingerprint_problem(tmp_path)
+
+    (tmp_path / "answer.sh").write_text("git log")
+    assert key != fingerprint_problem(tmp_path)
+
+    # Same content in a different file.
+    (tmp_path / "answer.sh").write_text("git status")
+    assert key == fingerprint_problem(tmp_path)
+    (tmp_path / "answer.sh").rename(tmp_path / "answer2.sh")
+    assert key != fingerprint_problem(tmp_path)
+
+
+def test_ResultCache(tmp_path) -> None:
+    cache = ResultCache(tmp_path / "cache")
+    assert cache.get("problem-a", "abc") is None
+
+    result = ProblemResult(
+        "problem-a", 2.0, 5.0, {"test_a": (2.0, 2.0), "test_b": (0.0, 3.0)}, "OK\n"
+    )
+    cache.put("abc", result)
+    assert cache.get("problem-a", "abc") == result
+    assert cache.get("problem-b", "abc") is None
+    assert cache.get("problem-a", "def") is None
+
+
+def test_ResultCache_get_key(tmp_path, monkeypatch) -> None:
+    # The files are written by the test, so their ctime is always recent.
+    monkeypatch.setattr(grading_lib.cache, "SNAPSHOT_MIN_AGE", 0)
+    fingerprinted: list[Path] = []
+
+    def fingerprint(problem_path: Path) -> str:
+        fingerprinted.append(problem_path)
+        return fingerprint_problem(problem_path)
+
+    monkeypatch.setattr(grading_lib.cache, "fingerprint_problem", fingerprint)
+
+    problem_path = tmp_path / "problem"
+    (problem_path / "scripts").mkdir(parents=True)
+    (problem_path / "scripts" / "grade.py").write_text("# grading script")
+    (problem_path / "answer.sh").write_text("git status")
+    old = time.time() - 60
+    for path in (problem_path / "scripts" / "grade.py", problem_path / "answer.sh"):
+        os.utime(path, (old, old))
+
+    cache = ResultCache(tmp_path / "cache")
+    key = cache.get_key(problem_path)
+    assert key == fingerprint_problem(problem_path)
+    assert len(list((tmp_path / "cache" / "snapshots").iterdir())) == 1
+
+    # The stored key is used while the snapshot does not change.
+    assert cache.get_key(str(problem_path)) == key
+    assert len(fingerprinted) == 1
+
+    # Same size and mtime, but the ctime changes.
+    (problem_path / "answer.sh").write_text("git reflog")
+    os.utime(problem_path / "answer.sh", (old, old))
+    key = cache.get_key(problem_path)
+    assert key == fingerprint_problem(problem_path)
+    assert len(fingerprinted) == 2
+
+    # Same size and mtime, but a different file.
+    (problem_path / "answer.new").write_text("git status")
+    os.utime(problem_path / "answer.new", (old, old))
+    os.replace(problem_path / "answer.new", problem_path / "answer.sh")
+    assert cache.get_key(problem_path) == fingerprint_problem(problem_path) != key
@@ -1,11 +1,18 @@
+import csv
 import json
+import subprocess
 import sys
+import typing as ty
 from pathlib import Path
 
+import pytest
 from click.testing import CliRunner
 
-from grading_lib.cli import summary_command
+import grading_lib.grading
+from grading_lib.cache import ResultCache
+from grading_lib.cli import grade_batch_command, grade_command, summary_command
 from grading_lib.cli.internal import collect_autograding_tests_command
+from grading_lib.grading import SubmissionResult
 
 
 def test_collect_autograding_tests_command() -> None:
@@ -82,3 +89,314 @@ points = 25
         assert result.exit_code == 0
         assert "Problem Count: 1" in result.output
         assert "Total Points: 25.0" in result.output
+
+
+def create_homework(path: Path) -> None:
+    """Create a homework with two problems in `path`."""
+    with open(path / "README.md", "w") as f:
+        f.write("""
+# Homework 0
+
+## Problem List `:problem-list:`
+
+- `problem-b`
+- `problem-a`
+""")
+
+    for name, passing in (("problem-a", True), ("problem-b", False)):
+        scripts_path = path / name / "scripts"
+        scripts_path.mkdir(parents=True)
+        with open(scripts_path / "grade.py", "w") as f:
+            f.write(f"""
+import os
+import unittest
+
+from grading_lib.common import BaseTestCase, points
+
+
+class Test(BaseTestCase):
+    @points(2)
+    def test_cwd(self):
+        self.assertEqual(os.path.basename(os.getcwd()), "{name}")
+
+    @points(3)
+    def test_passing(self):
+        self.assertTrue({passing})
+""")
+
+
+def test_grade_command() -> None:
+    runner = CliRunner()
+    with runner.isolated_filesystem():
+        create_homework(Path("."))
+
+        result = runner.invoke(grade_command, ["."])
+        assert result.exit_code == 1
+        assert "Total:   7.0 /  10.0" in result.output
+        summary = result.output[result.output.index("==== Summary ====") :]
+        assert summary.index("problem-b") < summary.index("problem-a")
+
+
+def test_grade_command_with_jobs() -> None:
+    runner = CliRunner()
+    with runner.isolated_filesystem():
+        create_homework(Path("."))
+
+        sequential_result = runner.invoke(grade_command, ["."])
+        result = runner.invoke(grade_command, [".", "--jobs", "2"])
+        assert result.exit_code == 1
+        assert "1 - Grading problem-b" in result.output
+        summary = result.output[result.output.index("==== Summary ====") :]
+        assert (
+            summary
+            == sequential_result.output[
+                sequential_result.output.index("==== Summary ====") :
+            ]
+        )
+
+
+def test_grade_command_with_fixture_template() -> None:
+    runner = CliRunner()
+    with runner.isolated_filesystem():
+        create_homework(Path("."))
+        problem_path = Path("problem-a")
+        (problem_path / "fixtures").mkdir()
+        (problem_path / "fixtures" / "data.txt").write_text("data")
+        with open(problem_path / "scripts" / "grade.py", "w") as f:
+            f.write("""
+import unittest
+
+from grading_lib.common import BaseTestCase, points
+
+
+class Test(BaseTestCase):
+    with_temporary_dir = True
+    fixture_template = "fixtures"
+    run_in_parallel = True
+
+    @points(2)
+    def test_a(self):
+        self.assertTrue((self.temporary_dir_path / "data.txt").exists())
+
+    @points(3)
+    def test_b(self):
+        self.assertTrue((self.temporary_dir_path / "data.txt").exists())
+""")
+
+        def list_files() -> list[str]:
+            return sorted(
+                path.as_posix()
+                for path in problem_path.rglob("*")
+                if "__pycache__" not in path.parts
+            )
+
+        files = list_files()
+        for args in ([], ["-j", "2"]):
+            result = runner.invoke(grade_command, [".", *args])
+            assert "POINTS: 5.0 / 5.0" in result.output
+            assert list_files() == files
+
+
+def test_grade_batch_command() -> None:
+    runner = CliRunner()
+    with runner.isolated_filesystem():
+        for name in ("student-1", "student-2"):
+            Path(name).mkdir()
+            create_homework(Path(name))
+        # Not a submission since it does not have a README.md.
+        Path("not-a-submission").mkdir()
+
+        result = runner.invoke(
+            grade_batch_command, [".", "--jobs", "2", "-o", "report.json"]
+        )
+        assert result.exit_code == 0, result.output
+        assert "Found 2 submission(s)." in result.output
+
+        with open("report.json") as f:
+            data = json.load(f)
+        assert [item["name"] for item in data["submissions"]] == [
+            "student-1",
+            "student-2",
+        ]
+        submission = data["submissions"][0]
+        assert submission["error"] is None
+        assert submission["points"] == 7.0
+        assert submission["total_points"] == 10.0
+        assert [problem["name"] for problem in submission["problems"]] == [
+            "problem-b",
+            "problem-a",
+        ]
+        assert submission["problems"][0]["point_breakdowns"]["test_passing"] == [
+            0.0,
+            3,
+        ]
+
+        result = runner.invoke(grade_batch_command, [".", "-o", "report.csv"])
+        assert result.exit_code == 0, result.output
+        with open("report.csv") as f:
+            lines = f.read().splitlines()
+        assert lines[0] == "submission,problem,test,points,total_points,error"
+        assert len(lines) == 1 + 2 * 4
+
+
+def test_grade_batch_command_with_errors() -> None:
+    runner = CliRunner()
+    with runner.isolated_filesystem():
+        Path("student-1").mkdir()
+        create_homework(Path("student-1"))
+        # The grading script of problem-b cannot be imported.
+        with open(Path("student-1") / "problem-b" / "scripts" / "grade.py", "w") as f:
+            f.write("raise RuntimeError('broken script')\n")
+        # No problem is listed.
+        Path("student-2").mkdir()
+        Path("student-2", "README.md").write_text("# Homework 0\n")
+        # The grading script of problem-b exits when it is imported.
+        Path("student-3").mkdir()
+        create_homework(Path("student-3"))
+        with open(Path("student-3") / "problem-b" / "scripts" / "grade.py", "w") as f:
+            f.write("import sys\nsys.exit(3)\n")
+        # The grading script of problem-b kills the worker process.
+        Path("student-4").mkdir()
+        create_homework(Path("student-4"))
+        with open(Path("student-4") / "problem-b" / "scripts" / "grade.py", "w") as f:
+            f.write("import os\nos._exit(1)\n")
+        Path("student-5").mkdir()
+        create_homework(Path("student-5"))
+
+        result = runner.invoke(
+            grade_batch_command, [".", "-o", "report.csv", "-j", "2"]
+        )
+        assert result.exit_code == 0, result.output
+        with open("report.csv") as f:
+            rows = list(csv.reader(f))
+        assert rows[1:7] == [
+            ["student-1", "problem-b", "", "", "", "RuntimeError: broken script"],
+            ["student-1", "problem-a", "test_cwd", "2", "2", ""],
+            ["student-1", "problem-a", "test_passing", "3", "3", ""],
+            ["student-2", "", "", "", "", ""],
+            ["student-3", "problem-b", "", "", "", "SystemExit: 3"],
+            ["student-3", "problem-a", "test_cwd", "2", "2", ""],
+        ]
+        assert rows[8][:5] == ["student-4", "", "", "", ""]
+        assert rows[8][5].startswith("BrokenProcessPool")
+        assert [row[0] for row in rows[9:]] == ["student-5"] * 4
+
+        result = runner.invoke(grade_batch_command, [".", "-o", "report.json"])
+        with open("report.json") as f:
+            data = json.load(f)
+        submission = data["submissions"][0]
+        assert submission["error"] is None
+        assert submission["points"] == 5.0
+        assert submission["problems"][0]["error"] == "RuntimeError: broken script"
+        assert submission["problems"][1]["error"] is None
+
+
+def test_grade_batch_command_interrupted(monkeypatch) -> None:
+    def grade_submissions(
+        paths: list[Path], jobs: int = 1, cache: ResultCache | None = None
+    ) -> ty.Iterator[SubmissionResult]:
+        yield grading_lib.grading.grade_submission(paths[0])
+        raise KeyboardInterrupt
+
+    monkeypatch.setattr(grading_lib.grading, "grade_submissions", grade_submissions)
+    runner = CliRunner()
+    with runner.isolated_filesystem():
+        for name in ("student-1", "student-2"):
+            Path(name).mkdir()
+            create_homework(Path(name))
+
+        result = runner.invoke(grade_batch_command, [".", "-o", "report.json"])
+        assert result.exit_code != 0
+        assert "Report of 1 of 2 submission(s)" in result.output
+        with open("report.json") as f:
+            data = json.load(f)
+        assert [submission["name"] for submission in data["submissions"]] == [
+            "student-1"
+        ]
+
+
+def test_grade_command_with_cache_dir() -> None:
+    runner = CliRunner()
+    with runner.isolated_filesystem():
+        create_homework(Path("."))
+
+        result = runner.invoke(grade_command, [".", "--cache-dir", ".cache"])
+        assert "Reuse the stored result" not in result.output
+        summary = result.output[result.output.index("==== Summary ====") :]
+
+        result = runner.invoke(grade_command, [".", "--cache-dir", ".cache"])
+        assert result.exit_code == 1
+        assert result.output.count("Reuse the stored result") == 2
+        assert "POINTS: 2.0 / 5.0" in result.output
+        assert summary == result.output[result.output.index("==== Summary ====") :]
+
+        with open(Path("problem-a") / "answer.sh", "w") as f:
+            f.write("git status")
+        result = runner.invoke(grade_command, [".", "-j", "2", "--cache-dir", ".cache"])
+        assert result.output.count("Reuse the stored result") == 1
+        assert summary == result.output[result.output.index("==== Summary ====") :]
+
+
+def test_grade_command_with_timings() -> None:
+    runner = CliRunner()
+    with runner.isolated_filesystem():
+        create_homework(Path("."))
+
+        result = runner.invoke(
+            grade_command, [".", "--slowest", "3", "--timings-file", "timings.json"]
+        )
+        assert "==== Slowest 3 Tests ====" in result.output
+        assert "problem-b: scripts.grade.Test.test_cwd" in result.output
+
+        with open("timings.json") as f:
+            data = json.load(f)
+        assert [problem["name"] for problem in data["problems"]] == [
+            "problem-b",
+            "problem-a",
+        ]
+        test = data["problems"][0]["tests"][0]
+        assert test["id"] == "scripts.grade.Test.test_cwd"
+        assert set(test.keys()) == {"id", "wall_time", "cpu_time", "children_cpu_time"}
+
+
+HEAVY_MODULES = [
+    "git",
+    "mistletoe",
+    "tomli",
+    "unittest",
+    "grading_lib.common",
+    "grading_lib.makefile",
+    "grading_lib.repository",
+    "grading_lib.util",
+]
+
+# In microseconds. Importing the CLI takes less than 100ms on a developer's machine.
+CLI_IMPORT_TIME_BUDGET = 500_000
+
+
+def test_cli_import_budget() -> None:
+    """The CLI must not import modules that only some commands need."""
+    output = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import grading_lib.cli"],
+        capture_output=True,
+        text=True,
+        check=True,
+    ).stderr
+
+    import_times: dict[str, int] = {}
+    for line in output.splitlines()[1:]:
+        _, cumulative, name = line.split("|")
+        import_times[name.strip()] = int(cumulative)
+
+    for name in HEAVY_MODULES:
+        assert name not in import_times, f"'{name}' is imported by the CLI"
+    assert import_times["grading_lib.cli"] < CLI_IMPORT_TIME_BUDGET
+
+
+def test_lazy_public_names() -> None:
+    import grading_lib
+
+    assert grading_lib.Makefile.__name__ == "Makefile"
+    assert "run_executable" in dir(grading_lib)
+    with pytest.raises(AttributeError):
+        _ = grading_lib.not_a_public_name
@@ -1,18 +1,43 @@
+import asyncio
+import hashlib
+import io
 import os
+import pickle
+import signal
+import subprocess
+import sys
+import threading
 import time
+import unittest
 from pathlib import Path
 
 import pytest
 
+import grading_lib.common
 from grading_lib import is_debug_mode
 from grading_lib.common import (
     BaseTestCase,
+    MinimalistTestResult,
+    MinimalistTestRunner,
+    MtimeController,
+    ResourceLimits,
+    async_run_executable,
+    async_run_many,
+    clear_checksum_cache,
+    clone_tree,
+    drain_deferred_cleanup,
     file_has_correct_sha512_checksum,
+    get_changed_files,
+    get_file_checksum,
     get_mtime_as_datetime,
     get_seed_from_env,
     has_file_changed,
+    points,
     populate_folder_with_filenames,
+    reap_process_groups,
     run_executable,
+    run_many,
+    verify_checksums,
 )
 
 
@@ -115,6 +140,135 @@ def test_BaseTestCase() -> None:
         instance.tearDown()
 
 
+def test_BaseTestCase_fixture_template(tmp_path) -> None:
+    template = tmp_path / "template"
+    (template / "src").mkdir(parents=True)
+    (template / "src" / "main.c").write_text("int main() {}")
+    (template / "Makefile").write_text("all:\n")
+
+    class ChildClsWithTemplate(BaseTestCase):
+        with_temporary_dir = True
+        temporary_dir_root = tmp_path / "root"
+        fixture_template = template
+
+    instances = [ChildClsWithTemplate(), ChildClsWithTemplate()]
+    for instance in instances:
+        instance.setUp()
+    try:
+        first, second = (instance.temporary_dir_path for instance in instances)
+        assert first.parent == tmp_path / "root"
+        assert (first / "src" / "main.c").read_text() == "int main() {}"
+        # Each test gets its own copy.
+        (first / "Makefile").write_text("changed")
+        assert (second / "Makefile").read_text() == "all:\n"
+        assert (template / "Makefile").read_text() == "all:\n"
+    finally:
+        for instance in instances:
+            instance.tearDown()
+
+
+def test_BaseTestCase_fixture_template_removed_at_exit(tmp_path) -> None:
+    (tmp_path / "fixtures").mkdir()
+    (tmp_path / "fixtures" / "data.txt").write_text("data")
+    (tmp_path / "grade.py").write_text("""
+import unittest
+
+from grading_lib.common import BaseTestCase
+
+
+class Test(BaseTestCase):
+    with_temporary_dir = True
+    fixture_template = "fixtures"
+
+    def test_a(self):
+        self.assertTrue((self.temporary_dir_path / "data.txt").exists())
+
+
+unittest.main()
+""")
+
+    # With the default TextTestRunner of unittest.main().
+    subprocess.run(
+        [sys.executable, "grade.py"],
+        cwd=tmp_path,
+        env={**os.environ, "PYTHONPATH": str(Path(grading_lib.__file__).parents[1])},
+        capture_output=True,
+        check=True,
+    )
+    assert sorted(path.name for path in tmp_path.iterdir()) == ["fixtures", "grade.py"]
+
+
+def test_BaseTestCase_deferred_cleanup(tmp_path, monkeypatch) -> None:
+    class ChildClsWithDeferredCleanup(BaseTestCase):
+        with_temporary_dir = True
+        temporary_dir_root = tmp_path
+        deferred_cleanup = True
+
+    instance = ChildClsWithDeferredCleanup()
+    instance.setUp()
+    path = instance.temporary_dir_path
+    (path / "objects").mkdir()
+    (path / "objects" / "pack").write_text("data")
+    if sys.platform != "win32":
+        # Like the read-only folders of a Git repository.
+        (path / "objects").chmod(0o500)
+    instance.tearDown()
+
+    assert not path.exists()
+    drain_deferred_cleanup()
+    assert list(tmp_path.iterdir()) == []
+
+    # A relative temporary directory, and a change of the working directory
+    # before the thread removes it.
+    class ChildClsWithRelativeRoot(BaseTestCase):
+        with_temporary_dir = True
+        temporary_dir_root = "."
+        deferred_cleanup = True
+
+    changed = threading.Event()
+
+    def remove_tree(path: Path | str) -> None:
+        changed.wait(5.0)
+        remove_tree_function(path)
+
+    remove_tree_function = grading_lib.common._remove_tree
+    monkeypatch.setattr(grading_lib.common, "_remove_tree", remove_tree)
+    (tmp_path / "other").mkdir()
+    monkeypatch.chdir(tmp_path)
+    relative_instance = ChildClsWithRelativeRoot()
+    relative_instance.setUp()
+    (relative_instance.temporary_dir_path / "file.txt").write_text("data")
+    relative_instance.tearDown()
+    os.chdir(tmp_path / "other")
+    changed.set()
+    drain_deferred_cleanup()
+    assert [path.name for path in tmp_path.iterdir()] == ["other"]
+
+
+def test_clone_tree(tmp_path) -> None:
+    src = tmp_path / "src"
+    (src / "a" / "b").mkdir(parents=True)
+    (src / "a" / "b" / "file.txt").write_text("content")
+    (src / "big.bin").write_bytes(os.urandom(3 * 1024 * 1024))
+    (src / "script.sh").write_text("#!/bin/sh")
+    (src / "script.sh").chmod(0o755)
+    os.utime(src / "script.sh", ns=(10**18, 10**18))
+    if sys.platform != "win32":
+        (src / "link").symlink_to("a/b/file.txt")
+
+    clone_tree(str(src), tmp_path / "copy")
+    copy = tmp_path / "copy"
+    assert (copy / "a" / "b" / "file.txt").read_text() == "content"
+    assert (copy / "big.bin").read_bytes() == (src / "big.bin").read_bytes()
+    assert (copy / "script.sh").stat().st_mtime_ns == 10**18
+    if sys.platform != "win32":
+        assert (copy / "script.sh").stat().st_mode & 0o777 == 0o755
+        assert os.readlink(copy / "link") == "a/b/file.txt"
+
+    clone_tree(src, tmp_path / "linked", hardlink=True)
+    assert (tmp_path / "linked" / "big.bin").samefile(src / "big.bin")
+
+
 def test_BaseTestCase_assertArchiveFileIsGzip(tmp_path) -> None:
     class ChildClsWithTempDir(BaseTestCase):
         with_temporary_dir = True
@@ -142,3 +296,378 @@ def test_file_has_correct_sha512_checksum(tmp_path) -> None:
         "f58345b442700529c9f488df0eb76b805bd26fc347b83f9ff5aead0e06fee6b7fc480a556578be9a202813da0c322b48c5004a9c764f1f6b051a6467827338c8",
         file_path,
     )
+
+
+def test_get_file_checksum(tmp_path) -> None:
+    data = os.urandom(3 * 1024 * 1024 + 5)
+    path = tmp_path / "archive.tar.gz"
+    path.write_bytes(data)
+    # Old enough to be cached.
+    os.utime(path, (time.time() - 60, time.time() - 60))
+
+    clear_checksum_cache()
+    assert get_file_checksum(str(path)) == hashlib.sha512(data).hexdigest()
+    assert get_file_checksum(path, "sha256") == hashlib.sha256(data).hexdigest()
+    (tmp_path / "empty").write_bytes(b"")
+    assert get_file_checksum(tmp_path / "empty") == hashlib.sha512().hexdigest()
+
+    # A change with the same size and mtime is still seen.
+    stat = path.stat()
+    path.write_bytes(b"x" * len(data))
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+    assert get_file_checksum(path) == hashlib.sha512(b"x" * len(data)).hexdigest()
+
+
+def test_verify_checksums(tmp_path) -> None:
+    checksums = {}
+    for idx in range(10):
+        (tmp_path / f"{idx}.bin").write_bytes(str(idx).encode())
+        checksums[f"{idx}.bin"] = hashlib.sha512(str(idx).encode()).hexdigest()
+    assert verify_checksums(checksums, root=tmp_path) == []
+    assert verify_checksums(checksums, root=str(tmp_path), jobs=1) == []
+
+    checksums["3.bin"] = checksums["3.bin"].upper()
+    assert verify_checksums(checksums, root=tmp_path) == []
+    checksums["4.bin"] = checksums["5.bin"]
+    checksums["missing.bin"] = checksums["5.bin"]
+    mismatches = verify_checksums(checksums, root=tmp_path)
+    assert [mismatch.path for mismatch in mismatches] == [
+        tmp_path / "4.bin",
+        tmp_path / "missing.bin",
+    ]
+    assert mismatches[0].actual == hashlib.sha512(b"4").hexdigest()
+    assert mismatches[1].actual is None
+
+    (tmp_path / "dir.bin").mkdir()
+    path_checksums = {tmp_path / "dir.bin": checksums["5.bin"]}
+    mismatches = verify_checksums(path_checksums)
+    assert len(mismatches) == 1
+    assert mismatches[0].actual is None
+    assert mismatches[0].error is not None
+    assert "cannot be read" in mismatches[0].describe()
+
+    class ChildCls(BaseTestCase):
+        def test_checksums(self) -> None:
+            self.assertChecksumsMatch(checksums, root=tmp_path)
+
+    result = unittest.TestResult()
+    ChildCls("test_checksums").run(result)
+    message = result.failures[0][1]
+    assert "4.bin" in message and "missing.bin' does not exist" in message
+    assert "0.bin" not in message
+
+
+def test_MinimalistTestResult_timings() -> None:
+    class Child(unittest.TestCase):
+        def test_sleep(self) -> None:
+            time.sleep(0.05)
+
+        def test_run_executable(self) -> None:
+            run_executable(["git", "version"])
+
+    suite = unittest.defaultTestLoader.loadTestsFromTestCase(Child)
+    runner = MinimalistTestRunner(
+        stream=io.StringIO(), resultclass=MinimalistTestResult
+    )
+    result = runner.run(suite)
+
+    assert isinstance(result, MinimalistTestResult)
+    assert len(result.timings) == 2
+    timing = result.timings[f"{Child.__module__}.{Child.__qualname__}.test_sleep"]
+    assert timing.wall_time >= 0.05
+    assert timing.cpu_time < timing.wall_time
+    for timing in result.timings.values():
+        assert timing.children_cpu_time >= 0.0
+
+
+def test_MinimalistTestRunner_run_in_parallel() -> None:
+    class Child(BaseTestCase):
+        with_temporary_dir = True
+        run_in_parallel = True
+
+        @points(1)
+        def test_a(self) -> None:
+            time.sleep(0.3)
+            print(f"worker {os.getpid()}")
+            (self.temporary_dir_path / "a.txt").touch()
+
+        @points(2)
+        def test_b(self) -> None:
+            time.sleep(0.3)
+            self.assertTrue(False, msg="b failed")
+
+        @points(3)
+        def test_c(self) -> None:
+            time.sleep(0.3)
+            raise RuntimeError("c errored")
+
+        @points(4)
+        def test_d(self) -> None:
+            time.sleep(0.3)
+            self.skipTest("d skipped")
+
+    suite = unittest.defaultTestLoader.loadTestsFromTestCase(Child)
+    stream = io.StringIO()
+    runner = MinimalistTestRunner(
+        stream=stream, resultclass=MinimalistTestResult, verbosity=2, jobs=4
+    )
+    start = time.perf_counter()
+    result = runner.run(suite)
+    elapsed = time.perf_counter() - start
+
+    assert elapsed < 4 * 0.3
+    assert isinstance(result, MinimalistTestResult)
+    assert result.testsRun == 4
+    assert result.points == 1
+    assert result.total_points == 10
+    assert list(result.point_breakdowns.keys()) == [
+        "test_a",
+        "test_b",
+        "test_c",
+        "test_d",
+    ]
+    assert [test._testMethodName for test, _ in result.failures] == ["test_b"]
+    assert "b failed" in result.failures[0][1]
+    assert [test._testMethodName for test, _ in result.errors] == ["test_c"]
+    assert "RuntimeError: c errored" in result.errors[0][1]
+    assert [reason for _, reason in result.skipped] == ["d skipped"]
+    assert len(result.timings) == 4
+    assert (
+        result.timings[f"{Child.__module__}.{Child.__qualname__}.test_a"].wall_time
+        >= 0.3
+    )
+
+    output = stream.getvalue()
+    assert (
+        output.index("Child.test_a)")
+        < output.index("Child.test_b)")
+        < output.index("Child.test_c)")
+    )
+    assert "POINTS: 1.0 / 10.0" in output
+
+
+def test_run_many() -> None:
+    commands = [
+        [sys.executable, "-c", f"import time; time.sleep({delay}); print({idx})"]
+        for idx, delay in enumerate([0.3, 0.0, 0.2, 0.1])
+    ]
+
+    start = time.perf_counter()
+    results = run_many(commands, concurrency=4)
+    assert time.perf_counter() - start < 0.6
+    assert [result.output.strip() for result in results] == ["0", "1", "2", "3"]
+    assert all(result.success for result in results)
+
+    results = asyncio.run(async_run_many(commands, concurrency=2))
+    assert [result.output.strip() for result in results] == ["0", "1", "2", "3"]
+
+
+def test_async_run_executable() -> None:
+    result = asyncio.run(async_run_executable(["git", "version"]))
+    assert result == run_executable(["git", "version"])
+
+    result = asyncio.run(
+        async_run_executable(
+            [sys.executable, "-c", "import time; time.sleep(2)"], timeout=0.2
+        )
+    )
+    assert not result.success
+    assert result.output == "Command timed out after 0.2 seconds."
+
+
+def test_run_executable_bounded_output(tmp_path) -> None:
+    code = "import sys; sys.stdout.write('a' * 1000 + 'b' * 100_000 + 'c' * 1000)"
+    spill_path = tmp_path / "output.txt"
+    result = run_executable(
+        [sys.executable, "-c", code], max_output_bytes=2000, spill_path=spill_path
+    )
+    assert result.success
+    assert result.output.startswith("a" * 1000)
+    assert result.output.endswith("c" * 1000)
+    assert "100000 bytes of output are omitted" in result.output
+    assert spill_path.stat().st_size == 102_000
+
+    result = run_executable([sys.executable, "-c", code], max_output_bytes=None)
+    assert len(result.output) == 102_000
+
+    for max_output_bytes, kept in ((0, ""), (1, "a"), (2, "ac")):
+        result = run_executable(
+            [sys.executable, "-c", code], max_output_bytes=max_output_bytes
+        )
+        assert result.success
+        omitted = 102_000 - len(kept)
+        assert result.output == (
+            kept[:1]
+            + f"\n\n... {omitted} bytes of output are omitted ...\n\n"
+            + kept[1:]
+        )
+
+
+def test_run_executable_timeout_keeps_output() -> None:
+    code = "print('started', flush=True)\nwhile True: print('x' * 100)"
+    result = run_executable(
+        [sys.executable, "-c", code], timeout=0.5, max_output_bytes=10_000
+    )
+    assert not result.success
+    assert result.output.startswith("Command timed out after 0.5 seconds.")
+    assert "started" in result.output
+    assert "bytes of output are omitted" in result.output
+    assert len(result.output) < 11_000
+
+
+def is_running(pid: int) -> bool:
+    """Return True if the process exists and is not a zombie."""
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            return f.read().rsplit(")", 1)[1].split()[0] != "Z"
+    except FileNotFoundError:
+        return False
+
+
+@pytest.mark.skipif(
+    not sys.platform.startswith("linux"), reason="/proc is needed to check the pid"
+)
+def test_run_executable_timeout_kills_process_group() -> None:
+    result = run_executable(
+        ["sh", "-c", "sleep 30 & echo $!; wait"], timeout=0.5, kill_grace_period=0.2
+    )
+    assert not result.success
+    pid = int(result.output.splitlines()[-1])
+    assert not is_running(pid)
+
+
+@pytest.mark.skipif(
+    not sys.platform.startswith("linux"), reason="/proc is needed to check the pid"
+)
+def test_run_executable_interrupted_kills_process_group(tmp_path) -> None:
+    def interrupt(signum, frame) -> None:
+        raise KeyboardInterrupt
+
+    # Like a Ctrl-C while the command runs.
+    previous_handler = signal.signal(signal.SIGALRM, interrupt)
+    signal.setitimer(signal.ITIMER_REAL, 0.5)
+    try:
+        with pytest.raises(KeyboardInterrupt):
+            run_executable(
+                ["sh", "-c", "sleep 30 & echo $! > pid.txt; wait"],
+                cwd=tmp_path,
+                timeout=10.0,
+                kill_grace_period=0.2,
+            )
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        signal.signal(signal.SIGALRM, previous_handler)
+
+    pid = int((tmp_path / "pid.txt").read_text())
+    assert not is_running(pid)
+
+
+@pytest.mark.skipif(
+    not sys.platform.startswith("linux"), reason="/proc is needed to check the pid"
+)
+def test_reap_process_groups(capsys) -> None:
+    # The background process does not hold the pipe, so the command finishes.
+    args = ["sh", "-c", "sleep 30 > /dev/null 2>&1 & echo $!"]
+    result = run_executable(args)
+    assert result.success
+    pid = int(result.output.strip())
+    assert is_running(pid)
+
+    leaked_processes = reap_process_groups(grace_period=0.2)
+    assert [process.pid for process in leaked_processes] == [pid]
+    assert leaked_processes[0].name == "sleep"
+    assert not is_running(pid)
+    assert reap_process_groups() == []
+
+    # BaseTestCase reports and kills them at the end of the test.
+    instance = BaseTestCase()
+    instance.setUp()
+    pid = int(run_executable(args).output.strip())
+    instance.tearDown()
+    assert not is_running(pid)
+    assert f"sleep (pid {pid})" in capsys.readouterr().out
+
+
+def test_run_executable_usage() -> None:
+    result = run_executable(
+        [sys.executable, "-c", "sum(range(2_000_000)); x = bytearray(32 << 20)"]
+    )
+    assert result.success
+    assert result.usage is not None
+    assert result.usage.wall_time > 0
+    assert result.usage.exit_signal is None
+    if sys.platform != "win32":
+        assert result.usage.user_time is not None and result.usage.user_time > 0
+        assert result.usage.max_rss is not None and result.usage.max_rss >= 32 << 20
+
+    # It is still a 3-tuple.
+    success, command, output = result
+    assert result == (success, command, output)
+    assert pickle.loads(pickle.dumps(result)).usage == result.usage
+
+
+@pytest.mark.skipif(sys.platform == "win32", reason="requires resource limits")
+def test_run_executable_limits(tmp_path) -> None:
+    result = run_executable(
+        [sys.executable, "-c", "while True: pass"],
+        timeout=10.0,
+        limits=ResourceLimits(cpu_time=1),
+    )
+    assert not result.success
+    assert result.usage is not None
+    assert result.usage.exit_signal in (signal.SIGXCPU, signal.SIGKILL)
+    assert result.usage.wall_time < 10.0
+
+    result = run_executable(
+        [
+            sys.executable,
+            "-c",
+            "import signal; signal.signal(signal.SIGXFSZ, signal.SIG_IGN); open('out.bin', 'wb').write(bytes(1 << 20))",
+        ],
+        cwd=tmp_path,
+        limits=ResourceLimits(file_size=1024),
+    )
+    assert not result.success
+    assert "File too large" in result.output
+
+    result = run_executable(
+        [sys.executable, "-c", "exit(1)"],
+    )
+    assert result.usage is not None and result.usage.exit_signal is None
+
+    result = run_executable(
+        [
+            sys.executable,
+            "-c",
+            "import os, signal; os.kill(os.getpid(), signal.SIGTERM)",
+        ],
+    )
+    assert result.usage is not None and result.usage.exit_signal == signal.SIGTERM
+
+
+def test_MtimeController(tmp_path) -> None:
+    (tmp_path / "src").mkdir()
+    (tmp_path / "src" / "a.c").write_text("a")
+    (tmp_path / "b.c").write_text("b")
+
+    controller = MtimeController(str(tmp_path), start=1_000_000.0, step=2.0)
+    controller.settle()
+    before = controller.snapshot()
+    assert before == {"src/a.c": 1_000_000 * 10**9, "b.c": 1_000_000 * 10**9}
+
+    controller.touch("src/a.c", tmp_path / "new.c")
+    after = controller.snapshot()
+    assert after["src/a.c"] == after["new.c"] == 1_000_002 * 10**9
+    assert get_changed_files(before, after) == ["new.c", "src/a.c"]
+    assert not has_file_changed(
+        get_mtime_as_datetime(tmp_path / "b.c"), tmp_path / "b.c"
+    )
+
+    # A file written now is newer than any synthetic time.
+    controller = MtimeController(tmp_path)
+    controller.settle(["b.c"])
+    controller.touch("src/a.c")
+    before = controller.snapshot()
+    (tmp_path / "b.c").write_text("new b")
+    assert get_changed_files(before, controller.snapshot()) == ["b.c"]
+    assert before["src/a.c"] < (tmp_path / "b.c").stat().st_mtime_ns
@@ -0,0 +1,73 @@
+import io
+import sys
+import threading
+from pathlib import Path
+
+import pytest
+from click.testing import CliRunner
+
+from grading_lib.cli import grade_command
+from grading_lib.grading import grade_homework
+
+from .test_cli import create_homework
+
+pytestmark = pytest.mark.skipif(
+    sys.platform == "win32", reason="Unix domain sockets are required"
+)
+
+
+def test_GradingServer(tmp_path) -> None:
+    from grading_lib.daemon import GradingServer, send_grade_job
+
+    homework_path = tmp_path / "hw"
+    homework_path.mkdir()
+    create_homework(homework_path)
+
+    expected_stream = io.StringIO()
+    expected_exit_code = grade_homework(homework_path, stream=expected_stream)
+    expected_output = expected_stream.getvalue()
+
+    socket_path = tmp_path / "grading.sock"
+    with GradingServer(socket_path, workers=1) as server:
+        thread = threading.Thread(target=server.serve_forever)
+        thread.start()
+        try:
+            for _ in range(2):
+                stream = io.StringIO()
+                exit_code = send_grade_job(socket_path, homework_path, stream=stream)
+                assert exit_code == expected_exit_code
+                output = stream.getvalue()
+                assert "POINTS: 2.0 / 5.0" in output
+                # Other parts contain the duration of the tests.
+                summary = output[output.index("==== Summary ====") :]
+                assert (
+                    summary
+                    == expected_output[expected_output.index("==== Summary ====") :]
+                )
+
+            # The error is reported back to the client.
+            stream = io.StringIO()
+            exit_code = send_grade_job(socket_path, tmp_path / "missing", stream=stream)
+            assert exit_code == 1
+            assert "FileNotFoundError" in stream.getvalue()
+
+            # A grading script that exits when it is imported.
+            with open(homework_path / "problem-b" / "scripts" / "grade.py", "w") as f:
+                f.write("import sys\nsys.exit(3)\n")
+            stream = io.StringIO()
+            exit_code = send_grade_job(socket_path, homework_path, stream=stream)
+            assert exit_code == 3
+            assert "SystemExit: 3" in stream.getvalue()
+
+            # The number of workers is set by the daemon.
+            result = CliRunner().invoke(
+                grade_command,
+                [str(homework_path), "--socket", str(socket_path), "-j", "2"],
+            )
+            assert result.exit_code == 2
+            assert "--jobs cannot be used with --socket" in result.output
+        finally:
+            server.shutdown()
+            thread.join()
+
+    assert not Path(socket_path).exists()
@@ -0,0 +1,165 @@
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from grading_lib.common import COMMAND_TIMED_OUT_TEXT_TEMPLATE
+from grading_lib.executor import (
+    ForkServerExecutor,
+    MemoizedExecutor,
+    fingerprint_inputs,
+)
+
+
+def test_fingerprint_inputs(tmp_path) -> None:
+    (tmp_path / "main.c").write_text("int main() {}")
+    (tmp_path / "notes.txt").write_text("notes")
+
+    key = fingerprint_inputs(tmp_path, ["*.c"])
+    assert key == fingerprint_inputs(str(tmp_path), ["*.c", "main.c"])
+
+    (tmp_path / "notes.txt").write_text("other notes")
+    assert key == fingerprint_inputs(tmp_path, ["*.c"])
+
+    (tmp_path / "main.c").write_text("int main() { return 1; }")
+    assert key != fingerprint_inputs(tmp_path, ["*.c"])
+
+
+def test_MemoizedExecutor(tmp_path, monkeypatch) -> None:
+    (tmp_path / "input.txt").write_text("a")
+    args = [
+        sys.executable,
+        "-c",
+        "import os; print(open('input.txt').read(), os.getpid())",
+    ]
+
+    executor = MemoizedExecutor(inputs=["input.txt"], env_keys=["GRADING_LIB_TEST_ENV"])
+    result = executor.run_executable(args, cwd=tmp_path)
+    assert result.success
+    assert executor.run_executable(args, cwd=tmp_path) == result
+    assert (executor.hits, executor.misses) == (1, 1)
+
+    # A change of an input file.
+    (tmp_path / "input.txt").write_text("b")
+    other_result = executor.run_executable(args, cwd=tmp_path)
+    assert other_result.output.startswith("b")
+    assert (executor.hits, executor.misses) == (1, 2)
+
+    # A change of an environment variable.
+    monkeypatch.setenv("GRADING_LIB_TEST_ENV", "1")
+    assert executor.run_executable(args, cwd=tmp_path) != other_result
+    assert (executor.hits, executor.misses) == (1, 3)
+
+    # The least recently used result is evicted.
+    executor = MemoizedExecutor(max_entries=1)
+    executor.run_executable([sys.executable, "-c", "pass"])
+    executor.run_executable([sys.executable, "-c", "print()"])
+    executor.run_executable([sys.executable, "-c", "pass"])
+    assert (executor.hits, executor.misses) == (0, 3)
+
+    # Time outs are not re-used.
+    executor = MemoizedExecutor()
+    executor.run_executable([sys.executable, "-c", "while True: pass"], timeout=0.5)
+    executor.run_executable([sys.executable, "-c", "while True: pass"], timeout=0.5)
+    assert executor.misses == 2
+
+
+def test_MemoizedExecutor_cache_dir(tmp_path) -> None:
+    args = [sys.executable, "-c", "import os; print(os.getpid())"]
+
+    executor = MemoizedExecutor(cache_dir=tmp_path / "cache", max_entries=2)
+    result = executor.run_executable(args)
+
+    # Another process sees the stored result.
+    other_executor = MemoizedExecutor(cache_dir=str(tmp_path / "cache"), max_entries=2)
+    other_result = other_executor.run_executable(args)
+    assert other_result == result
+    assert other_result.usage == result.usage
+    assert other_executor.hits == 1
+
+    other_executor.run_executable([sys.executable, "-c", "pass"])
+    other_executor.run_executable([sys.executable, "-c", "print()"])
+    assert len(list((tmp_path / "cache").glob("*.json"))) == 2
+
+
+def test_MemoizedExecutor_run_targets(tmp_path) -> None:
+    (tmp_path / "answer.mk").write_text("all:\n\techo $$PPID\n")
+
+    executor = MemoizedExecutor()
+    result = executor.run_targets(["all"], cwd=tmp_path)
+    assert result.success
+    assert executor.run_targets(["all"], cwd=tmp_path) == result
+
+    (tmp_path / "answer.mk").write_text("all:\n\techo $$PPID changed\n")
+    assert executor.run_targets(["all"], cwd=tmp_path) != result
+    assert (executor.hits, executor.misses) == (1, 2)
+
+
+def test_ForkServerExecutor(tmp_path, monkeypatch) -> None:
+    with ForkServerExecutor() as executor:
+        result = executor.run_executable(
+            [
+                sys.executable,
+                "-c",
+                "import os; print(os.getcwd(), os.getenv('GRADING_LIB_TEST_ENV'))",
+            ],
+            cwd=tmp_path,
+        )
+        assert result.success
+        assert result.output.strip() == f"{os.path.realpath(tmp_path)} None"
+        assert result.usage is not None
+
+        # The cwd and the environment variables are the ones at the time of the call.
+        monkeypatch.chdir(tmp_path)
+        monkeypatch.setenv("GRADING_LIB_TEST_ENV", "1")
+        result = executor.run_executable(
+            [
+                sys.executable,
+                "-c",
+                "import os; print(os.getcwd(), os.getenv('GRADING_LIB_TEST_ENV'))",
+            ]
+        )
+        assert result.output.strip() == f"{os.path.realpath(tmp_path)} 1"
+
+        # A relative spill path is relative to the working directory of this process.
+        result = executor.run_executable(["echo", "spilled"], spill_path="spill.txt")
+        assert (tmp_path / "spill.txt").read_text() == "spilled\n"
+
+        result = executor.run_executable(
+            [
+                sys.executable,
+                "-c",
+                "import time; print('a', flush=True); time.sleep(10)",
+            ],
+            timeout=0.5,
+        )
+        assert not result.success
+        assert result.output.startswith(
+            COMMAND_TIMED_OUT_TEXT_TEMPLATE.format(timeout=0.5)
+        )
+
+        # Errors are raised in this process.
+        with pytest.raises(FileNotFoundError):
+            executor.run_executable(["grading-lib-no-such-command"])
+
+        # Commands from several threads.
+        with ThreadPoolExecutor(max_workers=4) as pool:
+            results = list(
+                pool.map(lambda i: executor.run_executable(["echo", str(i)]), range(8))
+            )
+        assert [result.output.strip() for result in results] == [
+            str(i) for i in range(8)
+        ]
+
+        if sys.platform != "win32":
+            executor.run_executable(["sh", "-c", "sleep 30 > /dev/null 2>&1 &"])
+            leaked = executor.reap_process_groups(grace_period=0.1)
+            assert [process.name for process in leaked] == ["sleep"]
+
+        (tmp_path / "answer.mk").write_text("all:\n\techo hello\n")
+        assert executor.run_targets(["all"], cwd=tmp_path).success
+
+    # Restarted on the next use.
+    assert executor.run_executable(["echo", "hi"]).output == "hi\n"
+    executor.close()
@@ -0,0 +1,199 @@
+import hashlib
+import os
+import sys
+import unittest
+
+import pytest
+
+from grading_lib.common import BaseTestCase
+from grading_lib.filesystem import (
+    ExpectedEntry,
+    TreeSnapshot,
+    TreeSpec,
+    find_tree_differences,
+    generate_tree,
+    plan_tree,
+)
+
+
+def test_plan_tree() -> None:
+    spec = TreeSpec(depth=2, dir_fan_out=(1, 3), file_fan_out=(5, 10))
+    manifest = plan_tree(spec, seed=42)
+    assert manifest.seed == 42
+    assert len(manifest) >= 5
+
+    # Same seed, same tree.
+    other = plan_tree(spec, seed=42)
+    assert other.directories == manifest.directories
+    assert other.files == manifest.files
+    assert other.buffer == manifest.buffer
+    assert plan_tree(spec, seed=43).files != manifest.files
+
+    # A folder comes after its parent.
+    seen = {""}
+    for directory in manifest.directories:
+        assert directory.rpartition("/")[0] in seen
+        seen.add(directory)
+    for path in manifest:
+        assert path.rpartition("/")[0] in seen
+        assert path.rsplit(".", 1)[1] in (
+            "cpp",
+            "txt",
+            "md",
+            "zip",
+            "py",
+            "toml",
+            "yml",
+            "yaml",
+        )
+    assert max(path.count("/") for path in manifest) == 2
+
+    sizes = plan_tree(TreeSpec(file_sizes=(7, 100), file_size_weights=(1, 0)), seed=1)
+    assert {entry.size for entry in sizes.files.values()} == {7}
+
+    with pytest.raises(ValueError):
+        plan_tree(TreeSpec(depth=-1), seed=1)
+    with pytest.raises(ValueError):
+        plan_tree(TreeSpec(file_sizes=()), seed=1)
+
+
+def test_generate_tree(tmp_path) -> None:
+    spec = TreeSpec(depth=1, dir_fan_out=2, file_fan_out=3, file_sizes=(0, 10, 5000))
+    manifest = generate_tree(str(tmp_path / "root"), spec, seed=7)
+    root = tmp_path / "root"
+
+    files = sorted(
+        path.relative_to(root).as_posix() for path in root.rglob("*") if path.is_file()
+    )
+    assert files == sorted(manifest)
+    assert len(files) == 9
+    for path in manifest:
+        assert (root / path).read_bytes() == manifest.get_content(path)
+    assert manifest.get_total_size() == sum(
+        (root / path).stat().st_size for path in files
+    )
+
+    # The last word may be cut.
+    words = {word.decode() for word in manifest.buffer.split()[:-1]}
+    assert words == set(spec.name_pool)
+
+    binary = generate_tree(tmp_path / "binary", spec._replace(binary=True), seed=7)
+    assert binary.files == manifest.files
+    assert binary.buffer != manifest.buffer
+
+    # Writing again over the same root overwrites the files.
+    binary.write(root)
+    for path in binary:
+        assert (root / path).read_bytes() == binary.get_content(path)
+
+
+def test_TreeSnapshot(tmp_path) -> None:
+    (tmp_path / "src").mkdir()
+    (tmp_path / "src" / "main.c").write_text("int main() {}")
+    (tmp_path / "notes.txt").write_text("notes")
+    (tmp_path / "touched.txt").write_text("same")
+    (tmp_path / "__pycache__").mkdir()
+    (tmp_path / "__pycache__" / "a.pyc").write_bytes(b"")
+    os.utime(tmp_path / "touched.txt", ns=(10**18, 10**18))
+
+    before = TreeSnapshot.capture(
+        str(tmp_path), ignored_names={"__pycache__"}, checksum="sha256"
+    )
+    assert sorted(before.entries) == ["notes.txt", "src", "src/main.c", "touched.txt"]
+    assert before.entries["src/main.c"].size == len("int main() {}")
+    assert before.entries["src"].mtime_ns == 0
+    assert before.diff(before).is_empty()
+
+    (tmp_path / "notes.txt").unlink()
+    (tmp_path / "src" / "main.c").write_text("int main() { return 0; }")
+    (tmp_path / "src" / "obj").mkdir()
+    (tmp_path / "src" / "obj" / "main.o").write_bytes(b"\0")
+    os.utime(tmp_path / "touched.txt")
+
+    after = TreeSnapshot.capture(tmp_path, ignored_names={"__pycache__"})
+    diff = before.diff(after)
+    assert diff.added == ["src/obj", "src/obj/main.o"]
+    assert diff.removed == ["notes.txt"]
+    assert diff.modified == ["src/main.c", "touched.txt"]
+
+    # With the checksums, a touched file is not modified.
+    after = TreeSnapshot.capture(
+        tmp_path, ignored_names={"__pycache__"}, checksum="sha256"
+    )
+    assert before.diff(after).modified == ["src/main.c"]
+
+    if sys.platform != "win32":
+        (tmp_path / "src" / "main.c").chmod(0o755)
+        assert after.diff(TreeSnapshot.capture(tmp_path)).modified == ["src/main.c"]
+        (tmp_path / "link").symlink_to("missing")
+        assert "link" in TreeSnapshot.capture(tmp_path)
+
+    restored = TreeSnapshot.from_dict(str(tmp_path), after.to_dict())
+    assert restored == after
+    assert restored.root == tmp_path
+
+
+def test_find_tree_differences(tmp_path) -> None:
+    (tmp_path / "bin").mkdir()
+    (tmp_path / "bin" / "run.sh").write_text("#!/bin/sh")
+    (tmp_path / "bin" / "run.sh").chmod(0o644)
+    (tmp_path / "README.md").write_text("readme")
+    (tmp_path / "data").write_text("not a folder")
+    (tmp_path / "extra.txt").write_text("extra")
+
+    expected = {
+        "bin": ExpectedEntry("dir"),
+        "bin/run.sh": ExpectedEntry(mode=0o755),
+        "README.md": ExpectedEntry(
+            size=6, checksum=hashlib.sha512(b"other!").hexdigest()
+        ),
+        "data": ExpectedEntry("dir"),
+        "missing.txt": ExpectedEntry(),
+    }
+    differences = find_tree_differences(str(tmp_path), expected)
+    assert [(difference.path, difference.kind) for difference in differences] == [
+        ("README.md", "checksum"),
+        ("bin/run.sh", "mode"),
+        ("data", "type"),
+        ("missing.txt", "missing"),
+    ]
+    assert differences[2].describe() == "'data' is a file, expected a dir"
+    if sys.platform != "win32":
+        assert (
+            differences[1].describe()
+            == "'bin/run.sh' has permissions 644, expected 755"
+        )
+
+    differences = find_tree_differences(tmp_path, expected, exact=True)
+    assert ("extra.txt", "unexpected") in [
+        (difference.path, difference.kind) for difference in differences
+    ]
+
+    manifest = generate_tree(tmp_path / "generated", TreeSpec(depth=1), seed=3)
+    assert (
+        find_tree_differences(
+            tmp_path / "generated",
+            manifest.get_expected_entries("sha512"),
+            exact=True,
+        )
+        == []
+    )
+
+
+def test_BaseTestCase_assertTreeMatches(tmp_path) -> None:
+    manifest = generate_tree(tmp_path, TreeSpec(depth=2, file_sizes=(10,)), seed=5)
+    expected = manifest.get_expected_entries()
+    removed = sorted(manifest)[:2]
+    for path in removed:
+        (tmp_path / path).unlink()
+
+    class ChildCls(BaseTestCase):
+        def test_tree(self) -> None:
+            self.assertTreeMatches(tmp_path, expected)
+
+    result = unittest.TestResult()
+    ChildCls("test_tree").run(result)
+    message = result.failures[0][1]
+    # Every difference is reported at once.
+    for path in removed:
+        assert f"'{path}' does not exist" in message
@@ -1,6 +1,19 @@
+import asyncio
+import os
+import shutil
+
 import pytest
 
-from grading_lib.makefile import Makefile
+from grading_lib.common import MtimeController
+from grading_lib.makefile import (
+    Makefile,
+    MakefileBaseTestCase,
+    async_run_targets,
+    clear_makefile_cache,
+    dry_run_targets,
+    run_many_targets,
+    run_targets,
+)
 
 
 @pytest.fixture
@@ -132,3 +145,382 @@ def test_makefile_var_defs_parsing(makefile_var_defs) -> None:
         _ = Makefile.from_text(makefile_var_defs)
     except Exception:
         pytest.fail("Exception raises while parsing a makefile.")
+
+
+def test_run_many_targets(tmp_path) -> None:
+    with open(tmp_path / "answer.mk", "w") as f:
+        f.write("a:\n\t@echo a\n\nb:\n\t@echo b\n")
+
+    results = run_many_targets([["a"], ["b"], ["c"]], cwd=tmp_path)
+    assert [result.success for result in results] == [True, True, False]
+    assert results[0].output == "a\n"
+    assert results[1].output == "b\n"
+    assert results[0].command == "make -f answer.mk a"
+
+    result = asyncio.run(async_run_targets(["a", "b"], cwd=tmp_path))
+    assert result.output == "a\nb\n"
+
+
+def test_makefile_from_text_tokenizer() -> None:
+    mk = Makefile.from_text(
+        """
+OBJS = main.o \\
+       util.o
+CMD = git push origin :branch
+
+define RECIPE
+fake: rule
+endef
+
+all : $(OBJS) \\
+      extra.o # The program.
+	@echo "linking: $^"
+	gcc -o prog $(OBJS) \\
+\t    -lm
+
+	# A comment in the recipe.
+	@echo done
+
+clean:: ; rm -f *.o
+clean:: ; rm -f prog
+prog: CFLAGS = -g
+$(OBJS): %.o: %.c
+a b: c
+install: all
+CC = gcc
+install: clean
+"""
+    )
+
+    rule = mk.get_rule("all")
+    assert rule is not None
+    assert rule.prerequisites == ["$(OBJS)", "extra.o"]
+    assert rule.recipe == [
+        '@echo "linking: $^"',
+        "gcc -o prog $(OBJS) \\\n    -lm",
+        "@echo done",
+    ]
+
+    assert not mk.has_rule("fake")
+    assert not mk.has_rule("prog")
+    assert not mk.has_rule("CMD = git push origin")
+
+    assert [rule.recipe for rule in mk.get_rules("clean")] == [
+        ["rm -f *.o"],
+        ["rm -f prog"],
+    ]
+
+    rule = mk.get_rule("$(OBJS)")
+    assert rule is not None
+    assert rule.prerequisites == ["%.c"]
+
+    # Lookups are exact, a rule with several targets is found with all of them.
+    assert not mk.has_rule("a")
+    assert mk.has_rule(["a", "b"])
+    assert mk.get_rules("b") == [mk.get_rule(["a", "b"])]
+
+    # A variable definition ends the rule.
+    rules = mk.get_rules("install")
+    assert [rule.prerequisites for rule in rules] == [["all"], ["clean"]]
+    assert all(rule.is_empty() for rule in rules)
+    assert mk.get_rule("install") is rules[0]
+    assert mk.get_rules("no-such-target") == []
+
+
+def test_makefile_from_path_cached(tmp_path) -> None:
+    clear_makefile_cache()
+    makefile_path = tmp_path / "Makefile"
+    makefile_path.write_text("include common.mk rules/*.mk\n\nall:\n\t@echo all\n")
+    (tmp_path / "rules").mkdir()
+    (tmp_path / "rules" / "a.mk").write_text("-include extra.mk\n")
+
+    mk = Makefile.from_path_cached(makefile_path)
+    assert mk.has_rule("all")
+    assert mk.includes == ["common.mk", "rules/*.mk"]
+    assert mk.path == makefile_path.resolve()
+    assert Makefile.from_path_cached(str(makefile_path)) is mk
+
+    # Same content with a new mtime.
+    os.utime(makefile_path, ns=(0, 0))
+    assert Makefile.from_path_cached(makefile_path) is mk
+
+    # A file included by an included file is created.
+    (tmp_path / "extra.mk").write_text("extra:\n")
+    other_mk = Makefile.from_path_cached(makefile_path)
+    assert other_mk is not mk
+    assert Makefile.from_path_cached(makefile_path) is other_mk
+
+    # An included file changes.
+    (tmp_path / "extra.mk").write_text("extra: all\n")
+    assert Makefile.from_path_cached(makefile_path) is not other_mk
+
+    # The Makefile is replaced.
+    mk = Makefile.from_path_cached(makefile_path)
+    shutil.copy(makefile_path, tmp_path / "new.mk")
+    with open(tmp_path / "new.mk", "a") as f:
+        f.write("clean:\n")
+    os.replace(tmp_path / "new.mk", makefile_path)
+    other_mk = Makefile.from_path_cached(makefile_path)
+    assert other_mk is not mk
+    assert other_mk.has_rule("clean")
+
+
+def test_makefile_from_make_database(tmp_path) -> None:
+    clear_makefile_cache()
+    makefile_path = tmp_path / "Makefile"
+    makefile_path.write_text(
+        """
+RULES_FILE = rules.mk
+include $(RULES_FILE)
+SRC = main.c util.c
+OBJS = $(SRC:.c=.o)
+define MULTI_LINE
+line 1
+line 2
+endef
+
+all: prog
+prog: $(OBJS)
+\t$(CC) -o $@ $^
+prog: CFLAGS = -g
+
+$(OBJS): %.o: %.c
+
+%.o: %.c
+\t$(CC) -c $< -o $@
+"""
+    )
+    (tmp_path / "rules.mk").write_text("CC = gcc\nclean:\n\trm -f *.o prog\n")
+
+    mk = Makefile.from_make_database(makefile_path)
+    assert mk.includes == ["rules.mk"]
+    assert mk.variables["OBJS"] == "main.o util.o"
+    assert mk.variables["CC"] == "gcc"
+    assert mk.variables["MULTI_LINE"] == "line 1\nline 2"
+    # The included rule comes first.
+    assert mk.variables[".DEFAULT_GOAL"] == "clean"
+
+    rule = mk.get_rule("prog")
+    assert rule is not None
+    assert rule.prerequisites == ["main.o", "util.o"]
+    assert rule.recipe == ["$(CC) -o $@ $^"]
+
+    rule = mk.get_rule("main.o")
+    assert rule is not None
+    assert rule.prerequisites == ["main.c"]
+
+    rule = mk.get_rule("%.o")
+    assert rule is not None
+    assert rule.recipe == ["$(CC) -c $< -o $@"]
+
+    assert mk.has_rule("clean")
+    # Files that are not targets and built-in rules are not rules.
+    assert not mk.has_rule("Makefile")
+    assert not mk.has_rule("%.c")
+    assert Makefile.from_make_database(makefile_path) is mk
+
+    # An included file changes.
+    (tmp_path / "rules.mk").write_text("CC = clang\n")
+    other_mk = Makefile.from_make_database(makefile_path)
+    assert other_mk is not mk
+    assert other_mk.variables["CC"] == "clang"
+    assert not other_mk.has_rule("clean")
+
+    makefile_path.write_text("all:\n    echo 'not a tab'\n")
+    with pytest.raises(ValueError):
+        Makefile.from_make_database(makefile_path)
+
+
+def test_makefile_graph() -> None:
+    mk = Makefile.from_text(
+        """
+.PHONY: all clean
+all: prog docs
+prog: main.o util.o
+main.o: main.c common.h
+util.o: util.c common.h
+docs: README.md
+%.o: %.c
+a: b
+b: c
+c: a
+"""
+    )
+    graph = mk.graph()
+    assert graph is mk.graph()
+    assert graph.phony_targets == {"all", "clean"}
+    assert ".PHONY" not in graph
+    assert "%.o" not in graph
+
+    assert graph.get_prerequisites("prog", transitive=False) == {"main.o", "util.o"}
+    assert graph.get_prerequisites("prog") == {
+        "main.o",
+        "util.o",
+        "main.c",
+        "util.c",
+        "common.h",
+    }
+    assert graph.depends_on("all", "common.h")
+    assert not graph.depends_on("all", "common.h", transitive=False)
+    assert not graph.depends_on("docs", "main.c")
+    assert graph.get_prerequisites("no-such-target") == frozenset()
+
+    assert graph.get_dependents("common.h") == {"main.o", "util.o", "prog", "all"}
+    assert graph.get_dependents("util.c", transitive=False) == {"util.o"}
+
+    order = graph.topological_order
+    for target in ["all", "prog", "main.o", "util.o", "docs"]:
+        for prerequisite in graph.get_prerequisites(target):
+            assert order.index(prerequisite) < order.index(target)
+
+    assert [sorted(cycle) for cycle in graph.cycles] == [["a", "b", "c"]]
+    assert graph.get_prerequisites("a") == {"a", "b", "c"}
+
+
+def test_MakefileBaseTestCase_graph_assertions(tmp_path) -> None:
+    makefile_path = tmp_path / "Makefile"
+    makefile_path.write_text("all: prog\nprog: main.o\nmain.o: main.c\n")
+
+    class Test(MakefileBaseTestCase):
+        pass
+
+    Test.makefile_path = makefile_path
+    Test.setUpClass()
+    instance = Test()
+
+    instance.assertTargetDependsOn("all", "main.c")
+    instance.assertTargetDoesNotDependOn("all", "main.c", transitive=False)
+    instance.assertTargetsRebuiltWhenChanged("main.c", ["main.o", "prog", "all"])
+    instance.assertNoCircularDependency()
+    with pytest.raises(AssertionError, match="'main.o' does not depend on 'prog'"):
+        instance.assertTargetDependsOn("main.o", "prog")
+    with pytest.raises(AssertionError, match="Targets 'clean' are not rebuilt"):
+        instance.assertTargetsRebuiltWhenChanged("main.c", ["prog", "clean"])
+
+    makefile_path.write_text("a: b\nb: a\n")
+    Test.setUpClass()
+    with pytest.raises(AssertionError, match="a <-> b"):
+        instance.assertNoCircularDependency()
+
+
+DRY_RUN_MAKEFILE = """
+CC = gcc
+.PHONY: all clean empty
+all: prog
+prog: main.o util.o
+\t$(CC) -o $@ $^
+%.o: %.c
+\t@echo compiling $<
+\t$(CC) -c $< \\
+\t  -o $@
+clean:
+\trm -f *.o prog
+empty:
+broken: no-such-file
+\techo broken
+"""
+
+
+def test_dry_run_targets(tmp_path) -> None:
+    (tmp_path / "answer.mk").write_text(DRY_RUN_MAKEFILE)
+    (tmp_path / "main.c").touch()
+    (tmp_path / "util.c").touch()
+    (tmp_path / "prog").touch()
+
+    result = dry_run_targets(
+        ["all", "clean", "empty", "missing", "broken"], cwd=tmp_path
+    )
+    assert not result.success
+    assert result.missing == ["missing", "no-such-file"]
+    assert result.recipes["prog"] == ["gcc -o prog main.o util.o"]
+    assert result.recipes["main.o"] == [
+        "echo compiling main.c",
+        "gcc -c main.c \\\n  -o main.o",
+    ]
+    assert result.recipes["clean"] == ["rm -f *.o prog"]
+    assert result.recipes["all"] == []
+    assert result.recipes["empty"] == []
+    assert "missing" not in result.recipes
+
+    assert result.errors == []
+
+    # Nothing is run.
+    assert sorted(path.name for path in tmp_path.iterdir()) == [
+        "answer.mk",
+        "main.c",
+        "prog",
+        "util.c",
+    ]
+
+
+def test_MakefileBaseTestCase_dry_run_assertions(tmp_path) -> None:
+    makefile_path = tmp_path / "Makefile"
+    makefile_path.write_text(DRY_RUN_MAKEFILE)
+    (tmp_path / "main.c").touch()
+    (tmp_path / "util.c").touch()
+
+    class Test(MakefileBaseTestCase):
+        pass
+
+    Test.makefile_path = makefile_path
+    Test.setUpClass()
+    instance = Test()
+
+    instance.assertTargetsCanBeMade(["all", "clean", "main.o"])
+    with pytest.raises(AssertionError, match="'missing', 'no-such-file'"):
+        instance.assertTargetsCanBeMade(["all", "missing", "broken"])
+
+    instance.assertTargetRunsCommand("prog", "gcc -o prog")
+    instance.assertTargetRunsCommand("main.o", "-c main.c")
+    with pytest.raises(AssertionError, match="does not run 'rm -rf'"):
+        instance.assertTargetRunsCommand("clean", "rm -rf")
+    with pytest.raises(AssertionError, match="does not exist"):
+        instance.assertTargetRunsCommand("missing", "echo")
+
+    # A recipe indented with spaces instead of a tab.
+    makefile_path.write_text("prog:\n    gcc -o prog main.c\n")
+    result = instance.dry_run_makefile(["prog"])
+    assert result.missing == []
+    assert result.errors == ["Makefile:2: *** missing separator.  Stop."]
+    with pytest.raises(AssertionError, match="missing separator"):
+        instance.assertTargetsCanBeMade(["prog"])
+    with pytest.raises(AssertionError, match="missing separator"):
+        instance.assertTargetRunsCommand("prog", "gcc")
+
+
+def test_MakefileBaseTestCase_rebuilt_assertions(tmp_path) -> None:
+    makefile_path = tmp_path / "Makefile"
+    makefile_path.write_text(
+        "prog: main.o util.o\n\tcat $^ > $@\n%.o: %.c\n\tcp $< $@\n"
+    )
+    (tmp_path / "main.c").write_text("main")
+    (tmp_path / "util.c").write_text("util")
+
+    class Test(MakefileBaseTestCase):
+        pass
+
+    Test.makefile_path = makefile_path
+    Test.setUpClass()
+    instance = Test()
+
+    assert run_targets(["prog"], makefile_name="Makefile", cwd=tmp_path).success
+    controller = MtimeController(tmp_path)
+    controller.settle()
+    controller.touch("util.c")
+
+    # No sleep is needed between the builds.
+    before = controller.snapshot()
+    assert run_targets(["prog"], makefile_name="Makefile", cwd=tmp_path).success
+    after = controller.snapshot()
+    instance.assertTargetsRebuilt(before, after, ["util.o", "prog"])
+    instance.assertTargetsNotRebuilt(before, after, ["main.o"])
+    with pytest.raises(AssertionError, match="'main.o' are not rebuilt"):
+        instance.assertTargetsRebuilt(before, after, ["main.o"])
+    with pytest.raises(AssertionError, match="'prog' are rebuilt"):
+        instance.assertTargetsNotRebuilt(before, after, ["prog"])
+
+    before = after
+    assert run_targets(["prog"], makefile_name="Makefile", cwd=tmp_path).success
+    instance.assertTargetsNotRebuilt(
+        before, controller.snapshot(), ["main.o", "util.o", "prog"]
+    )
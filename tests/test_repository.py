@@ -1,3 +1,4 @@
+import asyncio
 from pathlib import Path
 
 import pytest
@@ -48,3 +49,17 @@ def test_RepositoryBaseTestCase_assertHasOnlyGitCommand(tmp_path) -> None:
 
     finally:
         instance.tearDown()
+
+
+def test_Repository_run_many(tmp_path) -> None:
+    repo = Repository(tmp_path)
+    repo.create_and_add_random_file(name="a.txt")
+    repo.repo.index.commit("Add a.txt")
+
+    results = repo.run_many([["git", "status", "--short"], ["git", "log", "--oneline"]])
+    assert results[0].success
+    assert results[0].output == ""
+    assert "Add a.txt" in results[1].output
+
+    result = asyncio.run(repo.async_run_executable(["git", "log", "--oneline"]))
+    assert result == results[1]